@@ -0,0 +1,156 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import time
+from checkers import BOARD_BACKENDS
+from engine import Engine, WIN_SCORE
+from pdn import read_games, find_move, move_to_pdn
+from replay import initial_checkers
+
+# GAMES ANALYSIS ----------------------------------------------------------------------------------
+# Every turn of the recorded games is compared with the best turn found by a fixed depth search:
+# a turn whose score is lower than the best one by more than the threshold is a blunder.
+# The games are analyzed in a pool of processes, and the analysis of every game is written,
+# as soon as it is done, as a JSON line of the output file. The output file is also the checkpoint:
+# an analysis run again with the same output skips the games already in it.
+
+BLUNDER_THRESHOLD = 100 # the score lost by a blunder (a man, see evaluation.MAN_SCORE)
+
+def pdn_files(directory):
+    # returns the paths of the PDN files of a directory (and its subdirectories), in a fixed order
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths += [os.path.join(root, name) for name in names if name.lower().endswith('.pdn')]
+    return sorted(paths)
+
+def analyze_game(engine, game, threshold=BLUNDER_THRESHOLD, backend='bitboard'):
+    # replays a PdnGame with Checkers.make_move, comparing every turn with the best turn of the engine's search.
+    # Returns the number of analyzed turns, the blunders and the error found in the game (None if it is valid)
+    checkers = initial_checkers(game, backend)
+    blunders = []
+    for ply, text in enumerate(game.moves):
+        move = find_move(checkers, text)
+        if move is None:
+            return ply, blunders, "move %s is not legal in round %d" % (text, checkers.round)
+        best_move, best_score = engine.search(checkers)
+        if move != best_move:
+            played_score = engine.search_turn(checkers, move, engine.depth-1, -WIN_SCORE-1, WIN_SCORE+1, 1)
+            if best_score - played_score > threshold:
+                blunders.append({
+                    'ply': ply,
+                    'round': checkers.round,
+                    'player': checkers.player_turn(),
+                    'move': text,
+                    'best': move_to_pdn(best_move, game.board_shape),
+                    'score': played_score,
+                    'best_score': best_score,
+                })
+        for selected_pos, released_pos in move.steps():
+            checkers.make_move(selected_pos, released_pos)
+        checkers.update_moves()
+        checkers.advance_round()
+    return len(game.moves), blunders, None
+
+# PARALLEL ANALYSIS -------------------------------------------------------------------------------
+
+_worker_engine = None   # the Engine of an analysis process
+_worker_settings = None # the (threshold, backend) of an analysis process
+
+def init_analysis_worker(depth, threshold, backend):
+    # prepares an analysis process
+    global _worker_engine, _worker_settings
+    signal.signal(signal.SIGTERM, signal.SIG_DFL) # (the pool terminates its processes, see engine.run_background_search)
+    _worker_engine = Engine(depth=depth)
+    _worker_settings = (threshold, backend)
+
+def analyze_job(job):
+    # analyzes one game (this function runs inside the pool's worker processes)
+    path, number, game = job
+    threshold, backend = _worker_settings
+    _worker_engine.table.clear()
+    turns, blunders, error = analyze_game(_worker_engine, game, threshold, backend)
+    return {
+        'file': path,
+        'game': number,
+        'event': game.tags.get('Event', "?"),
+        'result': game.result,
+        'turns': turns,
+        'blunders': blunders,
+        'error': error,
+    }
+
+def analyzed_games(output_path):
+    # returns the (file, game number) of the games already in the output file, cutting off
+    # its last line if it was left unfinished (by an analysis that was stopped while writing it)
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'rb+') as output_file:
+        data = output_file.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            output_file.truncate(end)
+    for line in data[:end].splitlines():
+        analysis = json.loads(line)
+        done.add((analysis['file'], analysis['game']))
+    return done
+
+def analysis_jobs(paths, done):
+    # yields the (file, game number, PdnGame) of the games of the files that weren't analyzed yet
+    for path in paths:
+        with open(path) as pdn_file:
+            for number, game in enumerate(read_games(pdn_file)):
+                if (path, number) not in done:
+                    yield path, number, game
+
+def analyze(paths, output_path, depth=4, threshold=BLUNDER_THRESHOLD, backend='bitboard', workers=None):
+    # analyzes the games of the PDN files in a pool of processes, appending every analysis to the output file
+    # as soon as it is done, and yields them (the games already in the output file are skipped)
+    done = analyzed_games(output_path)
+    jobs = analysis_jobs(paths, done)
+    with open(output_path, 'a') as output_file:
+        if workers == 1:
+            init_analysis_worker(depth, threshold, backend)
+            analyses = map(analyze_job, jobs)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(workers, initializer=init_analysis_worker, initargs=(depth, threshold, backend))
+            analyses = pool.imap_unordered(analyze_job, jobs)
+        try:
+            for analysis in analyses:
+                output_file.write(json.dumps(analysis) + '\n')
+                output_file.flush()
+                yield analysis
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Finds the blunders of the recorded games of a directory of PDN files.")
+    parser.add_argument('directory', help="directory of the PDN files")
+    parser.add_argument('-o', '--output', default='analysis.jsonl', help="JSON lines file of the analyses (and checkpoint to resume them)")
+    parser.add_argument('-d', '--depth', type=int, default=4, help="search depth of every turn")
+    parser.add_argument('--threshold', type=int, default=BLUNDER_THRESHOLD, help="score lost by a blunder")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="number of processes (defaults to the number of cpus)")
+    parser.add_argument('--backend', default='bitboard', choices=list(BOARD_BACKENDS))
+    return parser.parse_args(args)
+
+if __name__ == '__main__':
+    args = parse_args()
+    games, turns, blunders, invalid_games = 0, 0, 0, 0
+    start_time = time.time()
+    for analysis in analyze(pdn_files(args.directory), args.output, args.depth, args.threshold, args.backend, args.workers):
+        games += 1
+        turns += analysis['turns']
+        blunders += len(analysis['blunders'])
+        invalid_games += analysis['error'] is not None
+    elapsed_time = time.time() - start_time
+    print("games:       %d in %.2fs" % (games, elapsed_time))
+    print("turns/sec:   %.2f" % (turns/max(elapsed_time, 1e-9)))
+    print("blunders:    %d" % blunders)
+    print("invalid:     %d" % invalid_games)
+    print("analyses in %s" % args.output)
@@ -0,0 +1,78 @@
+import numpy as np
+from bitboard import DIRECTIONS
+
+# BATCHED MOVES -----------------------------------------------------------------------------------
+# The moves of a stack of B positions (a (B, width, height) int8 array of CompactBoard codes:
+# the piece's rank, positive for player1 and negative for player2, and 0 for the empty tiles)
+# are found for every board and every piece at once, by shifting whole arrays along the diagonals.
+#
+# The moves are returned as boolean masks of shape (B, directions, distances, width, height):
+# masks[b, d, k, i, j] tells if the piece in (i, j) of board b can land k+1 tiles away from it in
+# the direction DIRECTIONS[d]. A capture move's captured piece is the only piece between the
+# piece and its landing tile.
+
+def stack_boards(boards):
+    # returns the (B, width, height) stack of the int8 codes of some CompactBoard objects
+    return np.stack([board.tiles for board in boards])
+
+def shifted(padded, pad, dist, direction, board_shape):
+    # returns, for every tile, the value of the tile dist steps away in the given direction
+    # (read from an array padded with pad tiles on both sides of the board)
+    di, dj = direction
+    i, j = pad + di*dist, pad + dj*dist
+    return padded[:, i:i+board_shape[0], j:j+board_shape[1]]
+
+def batch_compute_moves(codes):
+    # returns the masks of the moves without capture and of the moves with capture
+    # of every piece of every board of the stack
+    batch, width, height = codes.shape
+    distances = max(width, height) - 1
+    pad = distances
+    padding = ((0, 0), (pad, pad), (pad, pad))
+    # the tiles outside of the board are neither empty nor have pieces
+    empty = np.pad(codes == 0, padding)
+    white = np.pad(codes > 0, padding)
+    black = np.pad(codes < 0, padding)
+    is_white = codes > 0
+    is_king = (codes == 2) | (codes == -2)
+    is_man = (codes == 1) | (codes == -1)
+
+    no_capture_masks = np.zeros((batch, len(DIRECTIONS), distances, width, height), dtype=bool)
+    capture_masks = np.zeros((batch, len(DIRECTIONS), distances, width, height), dtype=bool)
+    for d, direction in enumerate(DIRECTIONS):
+        # rank1 pieces only move forward without capture (player1 towards j=0 and player2 towards j=height-1)
+        forward_men = is_man & (is_white == (direction[1] == -1))
+        clear = np.ones((batch, width, height), dtype=bool)     # if the tiles up to the current distance are empty
+        after_enemy = np.zeros((batch, width, height), dtype=bool) # if the piece jumped exactly one enemy piece so far
+        for k in range(distances):
+            dist = k + 1
+            empty_at = shifted(empty, pad, dist, direction, (width, height))
+            enemy_at = np.where(is_white, shifted(black, pad, dist, direction, (width, height)),
+                                shifted(white, pad, dist, direction, (width, height)))
+            capture_masks[:, d, k] = empty_at & after_enemy
+            after_enemy = capture_masks[:, d, k] | (clear & enemy_at)
+            clear &= empty_at
+            no_capture_masks[:, d, k] = clear
+        # rank1 pieces move only one tile, and capture only by landing right after the captured piece
+        no_capture_masks[:, d, 1:] &= is_king[:, None]
+        no_capture_masks[:, d, 0] &= is_king | forward_men
+        capture_masks[:, d, 2:] &= is_king[:, None]
+        capture_masks[:, d, 1] &= is_king | is_man
+    return no_capture_masks, capture_masks
+
+def batch_has_legal_moves(codes, no_capture_masks, capture_masks, player):
+    # returns, for every board of the stack, if a certain player has any moves
+    # (moves with and without capture, separately)
+    pieces = codes > 0 if player == 1 else codes < 0
+    has_no_capture_moves = (no_capture_masks.any(axis=(1, 2)) & pieces).any(axis=(1, 2))
+    has_capture_moves = (capture_masks.any(axis=(1, 2)) & pieces).any(axis=(1, 2))
+    return has_no_capture_moves, has_capture_moves
+
+def mask_moves(masks, board_index, pos):
+    # returns the landing positions of the piece in the given position of a board of the stack,
+    # in the same order the Board object finds them (direction by direction, nearest first)
+    moves = []
+    for d, (di, dj) in enumerate(DIRECTIONS):
+        for k in np.flatnonzero(masks[board_index, d, :, pos[0], pos[1]]).tolist():
+            moves.append((pos[0] + di*(k+1), pos[1] + dj*(k+1)))
+    return moves
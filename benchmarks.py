@@ -0,0 +1,242 @@
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from board import Board
+from checkers import Checkers, BOARD_BACKENDS, checkers_from_state
+from game_wrapper import GameWrapper
+from renderer import Renderer
+from harness import NullRenderer, headless_screen, play_turns
+from simulate import play_game
+from policies import RandomPolicy
+from engine import Engine
+
+BASELINES_PATH = 'benchmarks.json'  # the stored timings every run is compared with
+THRESHOLD = 0.25                    # a timing this much slower than its baseline is a regression
+SCREEN_SHAPE = (800, 720)
+BOARD_SHAPE = (8, 8)
+
+# SCRIPTED GAMES ----------------------------------------------------------------------------------
+# Every benchmark plays the same positions: the turns of a few random games of a fixed seed
+
+def scripted_games(board_shape=BOARD_SHAPE, games=8, max_turns=80, seed=0):
+    # returns the whole turns (Move objects) of random games
+    rng = random.Random(seed)
+    all_turns = []
+    for _ in range(games):
+        checkers = Checkers(board_shape, backend='bitboard')
+        checkers.update_moves()
+        checkers.advance_round()
+        turns = []
+        while len(turns) < max_turns:
+            moves = checkers.generate_moves()
+            if moves == []:
+                break
+            turns.append(rng.choice(moves))
+            checkers.push(turns[-1])
+        all_turns.append(turns)
+    return all_turns
+
+def scripted_positions(games_turns, backend, every=4):
+    # returns Checkers objects in every few positions of the scripted games
+    positions = []
+    for turns in games_turns:
+        checkers = Checkers(BOARD_SHAPE, backend=backend)
+        checkers.update_moves()
+        checkers.advance_round()
+        for index, move in enumerate(turns):
+            if index % every == 0:
+                positions.append(checkers_from_state(checkers.compact_state()))
+            checkers.push(move)
+    return positions
+
+# BENCHMARKS --------------------------------------------------------------------------------------
+# Each benchmark does its setup and returns the function that is timed
+
+def compute_all_moves_benchmark(games_turns, backend, loops=10):
+    # computes the moves of every piece from scratch, in many positions
+    boards = [checkers.board for checkers in scripted_positions(games_turns, backend)]
+    def run():
+        for board in boards * loops:
+            if isinstance(board, Board): # the tiles board would reuse the moves of the previous computation
+                board.invalidate_moves()
+            board.compute_all_moves()
+    return run
+
+def make_move_benchmark(games_turns, backend):
+    # makes every step of the scripted games through Checkers.make_move,
+    # following the rounds flow of the GameWrapper states machine
+    def run():
+        for turns in games_turns:
+            checkers = Checkers(BOARD_SHAPE, backend=backend)
+            checkers.update_moves()
+            checkers.advance_round()
+            for move in turns:
+                for selected_pos, released_pos in move.steps():
+                    checkers.make_move(selected_pos, released_pos)
+                checkers.update_moves()
+                checkers.advance_round()
+    return run
+
+def full_game_benchmark(games_turns, backend, games=8):
+    # plays full games between random policies, until their end
+    def run():
+        for seed in range(games):
+            play_game(BOARD_SHAPE, {1: RandomPolicy(2*seed), 2: RandomPolicy(2*seed+1)}, backend)
+    return run
+
+def engine_search_benchmark(backend, depth=8):
+    # searches the initial position with a new Engine (so with an empty transposition table)
+    checkers = Checkers(BOARD_SHAPE, backend=backend)
+    checkers.update_moves()
+    checkers.advance_round()
+    def run():
+        Engine(depth=depth).search(checkers)
+    return run
+
+def game_wrapper_benchmark(games_turns, backend):
+    # plays the scripted games through the GameWrapper states machine, with the synthetic mouse inputs
+    # of the harness and without rendering
+    screen = headless_screen(SCREEN_SHAPE)
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()): # the states print every round
+            for turns in games_turns:
+                game = GameWrapper(BOARD_SHAPE, backend=backend)
+                play_turns(game, NullRenderer(SCREEN_SHAPE, BOARD_SHAPE), screen, turns)
+    return run
+
+def render_benchmark(games_turns, frames=60):
+    # renders whole frames with the Renderer, in SDL's dummy video driver,
+    # and then the (partially redrawn) frames of the scripted games
+    screen = headless_screen(SCREEN_SHAPE)
+    with contextlib.redirect_stdout(io.StringIO()):
+        game = GameWrapper(BOARD_SHAPE)
+    def run():
+        renderer = Renderer(SCREEN_SHAPE, BOARD_SHAPE)
+        for _ in range(frames):
+            renderer.invalidate()
+            renderer.render(screen, game)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for turns in games_turns:
+                play_turns(GameWrapper(BOARD_SHAPE), renderer, screen, turns)
+    return run
+
+def benchmarks():
+    # returns the name and the setup function of every benchmark
+    games_turns = scripted_games()
+    cases = []
+    for backend in BOARD_BACKENDS:
+        cases.append(("compute_all_moves[%s]" % backend, lambda backend=backend: compute_all_moves_benchmark(games_turns, backend)))
+        cases.append(("make_move[%s]" % backend, lambda backend=backend: make_move_benchmark(games_turns, backend)))
+        cases.append(("full_game[%s]" % backend, lambda backend=backend: full_game_benchmark(games_turns, backend)))
+        cases.append(("game_wrapper[%s]" % backend, lambda backend=backend: game_wrapper_benchmark(games_turns, backend)))
+    cases.append(("engine_depth8[bitboard]", lambda: engine_search_benchmark('bitboard')))
+    cases.append(("render", lambda: render_benchmark(games_turns)))
+    return cases
+
+# TIMING ------------------------------------------------------------------------------------------
+# The speed of a machine changes along a run (with the load of the other processes and the cpu clock),
+# so every run of a benchmark is measured relative to a fixed calibration loop timed right before and after it.
+# The baselines keep these relative timings, which also makes them comparable between machines.
+
+def calibration_loop(iterations=200000):
+    # returns the time (in seconds) of a fixed pure python workload
+    start_time = time.perf_counter()
+    counts = {}
+    for value in range(iterations):
+        counts[value % 97] = counts.get(value % 97, 0) + value
+    return time.perf_counter() - start_time
+
+def time_benchmark(run, repeats=7):
+    # returns the best time (in seconds) and the best relative time (in calibration loops) of a few runs,
+    # the least disturbed by the rest of the system
+    timings, relative_timings = [], []
+    for _ in range(repeats):
+        calibration = calibration_loop()
+        start_time = time.perf_counter()
+        run()
+        timing = time.perf_counter() - start_time
+        calibration = (calibration + calibration_loop()) / 2
+        timings.append(timing)
+        relative_timings.append(timing / calibration)
+    return min(timings), min(relative_timings)
+
+def run_benchmarks(name_filter=None, repeats=7):
+    # returns the (time, relative time) of every benchmark (whose name contains name_filter, if given)
+    timings = {}
+    for name, setup in benchmarks():
+        if name_filter is not None and name_filter not in name:
+            continue
+        timings[name] = time_benchmark(setup(), repeats)
+    return timings
+
+def load_baselines(path=BASELINES_PATH):
+    # returns the stored relative timings (an empty dict if there isn't a baselines file)
+    try:
+        with open(path) as baselines_file:
+            return json.load(baselines_file)
+    except FileNotFoundError:
+        return {}
+
+def save_baselines(timings, path=BASELINES_PATH):
+    # stores the relative timings as the new baselines (keeping the baselines of the benchmarks that didn't run)
+    baselines = load_baselines(path)
+    baselines.update({name: round(relative_timing, 4) for name, (_, relative_timing) in timings.items()})
+    with open(path, 'w') as baselines_file:
+        json.dump(dict(sorted(baselines.items())), baselines_file, indent=4)
+        baselines_file.write('\n')
+
+def regressions(timings, baselines, threshold=THRESHOLD):
+    # returns the names of the benchmarks slower than their baselines by more than the threshold
+    return [name for name, (_, relative_timing) in timings.items()
+            if name in baselines and relative_timing > baselines[name]*(1 + threshold)]
+
+def recheck(timings, baselines, threshold=THRESHOLD, retries=2, repeats=7):
+    # times again the benchmarks that look like regressions, keeping their best timings,
+    # so a moment of load in the machine isn't reported as a regression
+    setups = dict(benchmarks())
+    for _ in range(retries):
+        for name in regressions(timings, baselines, threshold):
+            timing, relative_timing = time_benchmark(setups[name](), repeats)
+            timings[name] = (min(timing, timings[name][0]), min(relative_timing, timings[name][1]))
+    return timings
+
+def report(timings, baselines, threshold=THRESHOLD):
+    # returns the timings and their changes from the baselines as text
+    slow = regressions(timings, baselines, threshold)
+    lines = []
+    for name, (timing, relative_timing) in timings.items():
+        if name in baselines:
+            change = "%+.1f%%" % (100*(relative_timing/baselines[name] - 1))
+        else:
+            change = "(no baseline)"
+        lines.append("%-28s %9.2fms %8.3f  %-14s %s" % (name, 1000*timing, relative_timing, change, "REGRESSION" if name in slow else ""))
+    return "\n".join(line.rstrip() for line in lines)
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Times the game's hot paths and compares them with the stored baselines.")
+    parser.add_argument('-k', '--filter', default=None, help="only runs the benchmarks whose names contain this text")
+    parser.add_argument('-r', '--repeats', type=int, default=7, help="runs of each benchmark (the best one counts)")
+    parser.add_argument('--retries', type=int, default=2, help="times a regression is timed again before failing the run")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="slowdown fraction that fails the run")
+    parser.add_argument('--baselines', default=BASELINES_PATH, help="json file of the baselines")
+    parser.add_argument('--update', action='store_true', help="stores the timings as the new baselines")
+    return parser.parse_args(args)
+
+if __name__ == '__main__':
+    args = parse_args()
+    timings = run_benchmarks(args.filter, args.repeats)
+    baselines = load_baselines(args.baselines)
+    if not args.update:
+        timings = recheck(timings, baselines, args.threshold, args.retries, args.repeats)
+    print(report(timings, baselines, args.threshold))
+    if args.update:
+        save_baselines(timings, args.baselines)
+        print("baselines stored in %s" % args.baselines)
+    elif regressions(timings, baselines, args.threshold) != []:
+        sys.exit(1)
@@ -0,0 +1,297 @@
+from piece import Piece
+from board import initial_tiles, tile_is_empty
+from zobrist import zobrist_table
+
+DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1)] # in the same order Board.compute_piece_moves walks them
+
+_shape_tables = {}
+
+def shape_tables(board_shape):
+    # returns (computing it only once per board shape) the precomputed data of the bit layout:
+    # the square position of every bit, the shift of every direction, the masks of the squares
+    # that can take one and two steps in every direction without leaving the board,
+    # and the rays (lists of bits) from every square in every direction
+    if board_shape not in _shape_tables:
+        width, height = board_shape
+        positions = [divmod(bit, height) for bit in range(width*height)] # bit = i*height + j
+        shifts = [di*height + dj for di, dj in DIRECTIONS]
+        one_step_masks = [0]*len(DIRECTIONS)
+        two_steps_masks = [0]*len(DIRECTIONS)
+        rays = [[] for _ in positions]
+        for bit, (i, j) in enumerate(positions):
+            for d, (di, dj) in enumerate(DIRECTIONS):
+                ray = []
+                dist = 1
+                while 0 <= i+di*dist < width and 0 <= j+dj*dist < height:
+                    ray.append(bit + shifts[d]*dist)
+                    dist += 1
+                if len(ray) >= 1:
+                    one_step_masks[d] |= 1 << bit
+                if len(ray) >= 2:
+                    two_steps_masks[d] |= 1 << bit
+                rays[bit].append(ray)
+        _shape_tables[board_shape] = (positions, shifts, one_step_masks, two_steps_masks, rays)
+    return _shape_tables[board_shape]
+
+def shift(bits, amount):
+    # shifts the bits to the left for positive amounts and to the right for negative ones
+    if amount > 0:
+        return bits << amount
+    return bits >> -amount
+
+def iterate_bits(bits):
+    # yields the index of every set bit
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+class BitBoard:
+    """
+    BIT BOARD
+    ---------
+    This object is a drop-in replacement of the Board object
+    that stores the position as three integers used as bit sets
+    (the white pieces, the black pieces and the queens), instead
+    of a matrix of Piece objects.
+
+    The moves of the normal pieces are found for all of them at once
+    by shifting the bit sets along the diagonals, and only the queens,
+    whose moves have no distance limit, walk the diagonals square by square.
+
+    The found moves are the same (and in the same order) as the ones
+    found by the Board object, and they are handed to the Checkers object
+    inside Piece objects built on demand by the piece_at method.
+    The Zobrist key (zobrist_key) is also the same as the Board's one.
+    """
+
+    def __init__(self, board_shape, initial_arrangement=[]):
+        if len(initial_arrangement) == 0:
+            initial_arrangement = initial_tiles(board_shape)
+
+        self.shape = tuple(board_shape)
+        self.positions, self.shifts, self.one_step_masks, self.two_steps_masks, self.rays = shape_tables(self.shape)
+        self.full_mask = (1 << (self.shape[0]*self.shape[1])) - 1
+        self.white = 0  # bits of the player1 pieces
+        self.black = 0  # bits of the player2 pieces
+        self.kings = 0  # bits of the rank2 pieces (of both players)
+        self.zobrist = zobrist_table(self.shape)    # the keys of the Zobrist hashing
+        self.zobrist_key = 0    # the Zobrist key of the pieces arrangement
+        for i in range(self.shape[0]):
+            for j in range(self.shape[1]):
+                piece = initial_arrangement[i, j]
+                if not tile_is_empty(piece):
+                    self.place_piece((i, j), piece)
+        self.moves = {} # maps a piece position to its (no_capture_moves, capture_moves, captured_capture_moves)
+
+    def __deepcopy__(self, memo):
+        # copies the position and the moves, but shares the precomputed tables (which never change)
+        board = BitBoard.__new__(BitBoard)
+        board.__dict__.update(self.__dict__)
+        board.moves = {pos: (list(no_capture_moves), list(capture_moves), list(captured_capture_moves))
+                       for pos, (no_capture_moves, capture_moves, captured_capture_moves) in self.moves.items()}
+        return board
+
+    def bit(self, pos):
+        # returns the bit of a given position
+        return 1 << (pos[0]*self.shape[1] + pos[1])
+
+    def place_piece(self, pos, piece):
+        # puts a piece (with the player and rank of the given Piece object) in the given (free) position
+        bit = self.bit(pos)
+        if piece.player == 1:
+            self.white |= bit
+        elif piece.player == 2:
+            self.black |= bit
+        if piece.rank == 2:
+            self.kings |= bit
+        self.zobrist_key ^= self.zobrist.piece_key(pos, piece.player, piece.rank)
+
+    def piece_at(self, pos):
+        # returns a Piece object that represents the piece in a given position, with its moves
+        piece = Piece(player=self.player_at(pos), rank=self.rank_at(pos))
+        if pos in self.moves:
+            piece.no_capture_moves, piece.capture_moves, piece.captured_capture_moves = self.moves[pos]
+        return piece
+
+    def player_at(self, pos):
+        # returns the player number of the piece in a given position
+        bit = self.bit(pos)
+        if self.white & bit:
+            return 1
+        elif self.black & bit:
+            return 2
+        return 0
+
+    def rank_at(self, pos):
+        # returns the rank number of the piece in a given position
+        return 2 if self.kings & self.bit(pos) else 1
+
+    def player_bits(self, player):
+        # returns the bits of the pieces of a given player
+        if player == 1:
+            return self.white
+        elif player == 2:
+            return self.black
+        return self.full_mask & ~(self.white | self.black)
+
+    def pieces_pos(self, player):
+        # returns the positions of all the pieces of a given player
+        return [self.positions[bit] for bit in iterate_bits(self.player_bits(player))]
+
+    def is_in_bounds(self, pos):
+        # returns if the pos is inside the board
+        return (pos[0]<self.shape[0] and pos[0]>=0 and pos[1]<self.shape[1] and pos[1]>=0)
+
+    def has_piece_in(self, pos, player):
+        # returns if the given position has a piece of a given player
+        return (self.is_in_bounds(pos) and self.player_at(pos) == player)
+
+    def is_free_in(self, pos):
+        # returns if the given position doesn't have any piece of player1 or player2
+        return (self.is_in_bounds(pos) and self.player_at(pos) == 0)
+
+    def oponents_homeline(self, player):
+        # returns if the line value of the oponet's home line
+        if player == 1:
+            return 0
+        elif player == 2:
+            return self.shape[1]-1
+
+    def moves_of(self, bit):
+        # returns the move lists of the piece in a given bit, creating them if needed
+        pos = self.positions[bit]
+        if pos not in self.moves:
+            self.moves[pos] = ([], [], [])
+        return self.moves[pos]
+
+    def compute_men_moves(self, men, enemy, empty, forward):
+        # finds the moves of all the given rank1 pieces at once, direction by direction,
+        # by shifting their bits one step (moves without capture, only forward)
+        # or two steps over an enemy piece (moves with capture, in both directions)
+        for d, (di, dj) in enumerate(DIRECTIONS):
+            amount = self.shifts[d]
+            if dj == forward:
+                for bit in iterate_bits(shift(men & self.one_step_masks[d], amount) & empty):
+                    self.moves_of(bit - amount)[0].append(self.positions[bit])
+            jumped = shift(men & self.two_steps_masks[d], amount) & enemy
+            for bit in iterate_bits(shift(jumped, amount) & empty):
+                no_capture_moves, capture_moves, captured_capture_moves = self.moves_of(bit - 2*amount)
+                capture_moves.append(self.positions[bit])
+                captured_capture_moves.append(self.positions[bit - amount])
+
+    def compute_king_moves(self, bit, enemy, empty):
+        # finds the moves of a rank2 piece by walking its rays: every free tile before
+        # the first obstacle is a move without capture, and if that obstacle is an enemy piece,
+        # every free tile after it (until the next obstacle) is a move with capture
+        no_capture_moves, capture_moves, captured_capture_moves = self.moves_of(bit)
+        for ray in self.rays[bit]:
+            dist = 0
+            while dist < len(ray) and (empty >> ray[dist]) & 1:
+                no_capture_moves.append(self.positions[ray[dist]])
+                dist += 1
+            if dist < len(ray) and (enemy >> ray[dist]) & 1:
+                captured_pos = self.positions[ray[dist]]
+                dist += 1
+                while dist < len(ray) and (empty >> ray[dist]) & 1:
+                    capture_moves.append(self.positions[ray[dist]])
+                    captured_capture_moves.append(captured_pos)
+                    dist += 1
+
+    def piece_capture_moves(self, piece_pos):
+        # returns the (capture move, captured piece position) pairs of the piece in the given position,
+        # without storing them
+        bit = piece_pos[0]*self.shape[1] + piece_pos[1]
+        empty = self.full_mask & ~(self.white | self.black)
+        enemy = self.black if (self.white >> bit) & 1 else self.white
+        is_king = (self.kings >> bit) & 1
+        capture_moves = []
+        for ray in self.rays[bit]:
+            dist = 0
+            if is_king: # a rank2 piece can capture pieces at any distance
+                while dist < len(ray) and (empty >> ray[dist]) & 1:
+                    dist += 1
+            if dist < len(ray) and (enemy >> ray[dist]) & 1:
+                captured_pos = self.positions[ray[dist]]
+                dist += 1
+                while dist < len(ray) and (empty >> ray[dist]) & 1:
+                    capture_moves.append((self.positions[ray[dist]], captured_pos))
+                    if not is_king: # and land at any distance after them
+                        break
+                    dist += 1
+        return capture_moves
+
+    def compute_all_moves(self):
+        # find and stores the moves for every piece
+        self.moves = {}
+        empty = self.full_mask & ~(self.white | self.black)
+        for own, enemy, forward in ((self.white, self.black, -1), (self.black, self.white, 1)):
+            for bit in iterate_bits(own):
+                self.moves_of(bit)
+            self.compute_men_moves(own & ~self.kings, enemy, empty, forward)
+            for bit in iterate_bits(own & self.kings):
+                self.compute_king_moves(bit, enemy, empty)
+
+    def moves_snapshot(self):
+        # returns the current moves of every piece, so they can be restored after the pieces are moved back
+        # (compute_all_moves replaces the move lists instead of changing them, so they can be shared)
+        return dict(self.moves)
+
+    def restore_moves(self, snapshot):
+        # gives back to the pieces the moves of a snapshot (which can't be restored again)
+        self.moves = snapshot
+
+    def has_legal_moves(self, player):
+        # returns if a certain player has any moves (moves with and without capture, separately)
+        has_legal_capture_moves = False
+        has_legal_no_capture_moves = False
+        for pos, (no_capture_moves, capture_moves, _) in self.moves.items():
+            if self.player_at(pos) == player:
+                has_legal_capture_moves = has_legal_capture_moves or capture_moves != []
+                has_legal_no_capture_moves = has_legal_no_capture_moves or no_capture_moves != []
+        return has_legal_no_capture_moves, has_legal_capture_moves
+
+    def compute_zobrist_key(self):
+        # computes the Zobrist key of the pieces arrangement from scratch
+        zobrist_key = 0
+        for player in [1, 2]:
+            for pos in self.pieces_pos(player):
+                zobrist_key ^= self.zobrist.piece_key(pos, player, self.rank_at(pos))
+        return zobrist_key
+
+    def move_piece(self, old_pos, new_pos, captured_pos=None):
+        # executes a move of a piece from the old position to a new one
+        # and captures the piece in the specified position (if there is one)
+        old_bit, new_bit = self.bit(old_pos), self.bit(new_pos)
+        player, rank = self.player_at(old_pos), self.rank_at(old_pos)
+        self.zobrist_key ^= self.zobrist.piece_key(old_pos, player, rank) ^ self.zobrist.piece_key(new_pos, player, rank)
+        if old_bit != new_bit: # (a whole capture turn can end in the tile it started, and then be undone)
+            if self.white & old_bit:
+                self.white ^= old_bit | new_bit
+            else:
+                self.black ^= old_bit | new_bit
+            if self.kings & old_bit:
+                self.kings ^= old_bit | new_bit
+        if old_pos in self.moves: # the move lists travel with the piece, like they do inside a Piece object
+            self.moves[new_pos] = self.moves.pop(old_pos)
+        if captured_pos != None:
+            captured_bit = self.bit(captured_pos)
+            self.zobrist_key ^= self.zobrist.piece_key(captured_pos, self.player_at(captured_pos), self.rank_at(captured_pos))
+            self.white &= ~captured_bit
+            self.black &= ~captured_bit
+            self.kings &= ~captured_bit
+            self.moves.pop(captured_pos, None)
+
+    def promote(self, pos):
+        # turns the piece in the given position into a queen
+        if self.rank_at(pos) == 1:
+            player = self.player_at(pos)
+            self.zobrist_key ^= self.zobrist.piece_key(pos, player, 1) ^ self.zobrist.piece_key(pos, player, 2)
+        self.kings |= self.bit(pos)
+
+    def demote(self, pos):
+        # turns the queen in the given position back into a normal piece
+        if self.rank_at(pos) == 2:
+            player = self.player_at(pos)
+            self.zobrist_key ^= self.zobrist.piece_key(pos, player, 2) ^ self.zobrist.piece_key(pos, player, 1)
+        self.kings &= ~self.bit(pos)
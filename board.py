@@ -1,5 +1,6 @@
 import numpy as np
 from piece import Piece
+from zobrist import zobrist_table
 
 def empty_tile():
     # Empty tiles are represented by player0 pieces
@@ -13,6 +14,119 @@ def empty_tiles(board_shape):
     tiles = np.array([[empty_tile()]*board_shape[1]]*board_shape[0], dtype=Piece.__class__)
     return tiles
 
+def initial_tiles(board_shape):
+    # returns the tiles with the pieces in their starting positions
+    tiles = empty_tiles(board_shape)
+    for i in range(tiles.shape[0]): # initialize the pieces positions
+    #for i in range(2): # initialize the pieces positions with less pieces for tests
+        if i%2 == 0:
+            tiles[i, 1] = Piece(player=2)
+            tiles[i, -1] = Piece(player=1)
+            tiles[i, -3] = Piece(player=1)
+        else:
+            tiles[i, 0] = Piece(player=2)
+            tiles[i, 2] = Piece(player=2)
+            tiles[i, -2] = Piece(player=1)
+    return tiles
+
+# POSITION FORMATS ---------------------------------------------------------------------------------
+# The dark tiles are numbered from 1, row by row from the row j=0 (black's home line), and every row from i=0.
+# A position can be written as a FEN text, like "W:W21,22,K30:B1,5,K9" (the player with the turn,
+# and the squares of the white and black pieces, with a K before the queens), or packed in
+# position_size(board_shape) bytes: the player with the turn, and then a nibble per dark tile
+# (in the squares order, the lowest nibble first) with the code of its piece (see PIECE_NIBBLES).
+
+PIECE_NIBBLES = {(1, 1): 1, (1, 2): 2, (2, 1): 3, (2, 2): 4}    # the nibble of every (player, rank) piece (0 for the empty tiles)
+NIBBLE_PIECES = {nibble: piece for piece, nibble in PIECE_NIBBLES.items()}
+
+_square_tables = {}
+
+
+def square_tables(board_shape):
+    # returns (computing it only once per board shape) the tile of every square number (from 1),
+    # and the square number of every dark tile
+    board_shape = tuple(board_shape)
+    if board_shape not in _square_tables:
+        tiles = [(i, j) for j in range(board_shape[1]) for i in range(board_shape[0]) if (i+j)%2 == 1]
+        _square_tables[board_shape] = ([None] + tiles, {pos: square for square, pos in enumerate(tiles, 1)})
+    return _square_tables[board_shape]
+
+def position_size(board_shape):
+    # returns the number of bytes of a packed position
+    squares_count = board_shape[0]*board_shape[1]//2
+    return 1 + (squares_count+1)//2
+
+def board_to_fen(board, player=1):
+    # returns the FEN text of the pieces of a board (of any backend), with the given player having the turn
+    _, squares = square_tables(board.shape)
+    fields = ['W' if player == 1 else 'B']
+    for color, piece_player in [('W', 1), ('B', 2)]:
+        pieces = sorted(board.pieces_pos(piece_player), key=lambda pos: squares[pos])
+        fields.append(color + ",".join(('K' if board.rank_at(pos) == 2 else '') + str(squares[pos]) for pos in pieces))
+    return ":".join(fields)
+
+def fen_to_tiles(fen, board_shape):
+    # returns the tiles (of Piece objects) of a FEN text, and the player with the turn
+    tiles, _ = square_tables(board_shape)
+    fen_tiles = empty_tiles(board_shape)
+    fields = fen.strip().rstrip('.').split(':')
+    player = 1 if fields[0].strip().upper() == 'W' else 2
+    for field in fields[1:]:
+        field = field.strip()
+        if field == "":
+            continue
+        piece_player = 1 if field[0].upper() == 'W' else 2
+        for square in field[1:].split(','):
+            square = square.strip()
+            if square == "":
+                continue
+            rank = 2 if square[0].upper() == 'K' else 1
+            fen_tiles[tiles[int(square.lstrip('Kk'))]] = Piece(player=piece_player, rank=rank)
+    return fen_tiles, player
+
+def board_to_bytes(board, player=1):
+    # returns the packed position of the pieces of a board (of any backend), with the given player having the turn
+    _, squares = square_tables(board.shape)
+    data = bytearray(position_size(board.shape))
+    data[0] = player
+    for piece_player in [1, 2]:
+        for pos in board.pieces_pos(piece_player):
+            square = squares[pos] - 1
+            data[1 + square//2] |= PIECE_NIBBLES[(piece_player, board.rank_at(pos))] << (4*(square%2))
+    return bytes(data)
+
+def bytes_to_tiles(data, board_shape):
+    # returns the tiles (of Piece objects) of a packed position, and the player with the turn
+    tiles, _ = square_tables(board_shape)
+    packed_tiles = empty_tiles(board_shape)
+    for square in range(1, len(tiles)):
+        nibble = (data[1 + (square-1)//2] >> (4*((square-1)%2))) & 0xF
+        if nibble != 0:
+            player, rank = NIBBLE_PIECES[nibble]
+            packed_tiles[tiles[square]] = Piece(player=player, rank=rank)
+    return packed_tiles, data[0]
+
+_diagonal_rays = {}
+
+def diagonal_rays(board_shape):
+    # returns (computing it only once per board shape) the (di, dj, ray) diagonals of every tile, 
+    # where ray is the tuple of the tiles in the direction (di,dj), ordered by their distance to the tile
+    board_shape = tuple(board_shape)
+    if board_shape not in _diagonal_rays:
+        rays = [[[] for j in range(board_shape[1])] for i in range(board_shape[0])]
+        for i in range(board_shape[0]):
+            for j in range(board_shape[1]):
+                for di in [1, -1]: # for all directions
+                    for dj in [1, -1]:
+                        ray = []
+                        dist = 1
+                        while 0 <= i+di*dist < board_shape[0] and 0 <= j+dj*dist < board_shape[1]:
+                            ray.append((i+di*dist, j+dj*dist))
+                            dist += 1
+                        rays[i][j].append((di, dj, tuple(ray)))
+        _diagonal_rays[board_shape] = rays
+    return _diagonal_rays[board_shape]
+
 class Board:
     """
     BOARD
@@ -26,25 +140,58 @@ class Board:
     Observation: the Board does not consider rules such as 
     the forcefull captures or players turn, but only more 
     'physical' rules like certifying the move ends up in a free tile.
+
+    Since a piece's moves only depend on the tiles of its diagonals,
+    the Board notes the tiles changed by each move, and compute_all_moves
+    only recomputes the moves of the pieces that share a diagonal with them.
+    The recomputed_pieces and reused_pieces counters tell how many pieces
+    had their moves recomputed and kept, respectively.
+
+    A Board can be written and read as a FEN text or as packed bytes
+    (see the position formats above, and compact_board.load_positions
+    for reading many packed positions at once).
+
+    The Board also keeps the 64 bits Zobrist key of its pieces arrangement
+    (zobrist_key), updated by every move, capture and promotion, so positions
+    can be compared and cached without walking the tiles.
     """
 
     def __init__(self, board_shape, initial_arrangement=[]):
-        if initial_arrangement == []:
-            tiles = empty_tiles(board_shape)
-            for i in range(tiles.shape[0]): # initialize the pieces positions
-            #for i in range(2): # initialize the pieces positions with less pieces for tests
-                if i%2 == 0:
-                    tiles[i, 1] = Piece(player=2)
-                    tiles[i, -1] = Piece(player=1)
-                    tiles[i, -3] = Piece(player=1)
-                else:
-                    tiles[i, 0] = Piece(player=2)
-                    tiles[i, 2] = Piece(player=2)
-                    tiles[i, -2] = Piece(player=1)
+        if len(initial_arrangement) == 0:
+            tiles = initial_tiles(board_shape)
         else:
             tiles = initial_arrangement
 
         self.tiles = tiles  # a matrix that maps a Piece with a tile position
+        self.shape = tuple(tiles.shape) # the board shape
+        self.max_distance = max(self.tiles.shape)   # the longest distance a queen can move
+        self.rays = diagonal_rays(self.tiles.shape) # the tiles of every diagonal from every tile (shared by all boards of a shape)
+        self.changed_tiles = None   # the tiles changed since the last moves computation (None if all moves must be computed)
+        self.recomputed_pieces = 0  # the number of pieces that had their moves computed
+        self.reused_pieces = 0      # the number of pieces that kept their moves from the last computation
+        self.zobrist = zobrist_table(self.tiles.shape)      # the keys of the Zobrist hashing
+        self.zobrist_key = self.compute_zobrist_key()   # the Zobrist key of the pieces arrangement
+
+    def piece_at(self, pos):
+        # returns the piece object in a given position
+        return self.tiles[pos]
+
+    def player_at(self, pos):
+        # returns the player number of the piece in a given position
+        return self.tiles[pos].player
+
+    def rank_at(self, pos):
+        # returns the rank number of the piece in a given position
+        return self.tiles[pos].rank
+
+    def pieces_pos(self, player):
+        # returns the positions of all the pieces of a given player
+        pieces_pos = []
+        for i in range(self.tiles.shape[0]):
+            for j in range(self.tiles.shape[1]):
+                if self.tiles[(i,j)].player == player:
+                    pieces_pos.append((i,j))
+        return pieces_pos
 
     def is_in_bounds(self, pos):
         # returns if the pos is inside the board
@@ -69,77 +216,100 @@ class Board:
         elif player == 2:
             return self.tiles.shape[1]-1
 
-    def try_no_capture_given_dist(self, piece, piece_pos, di, dj, dist):
-        # analyzes if a piece can make a move without capture if it moves in the direction (di,dj)
-        # by a number of 'dist' of tiles.
-        # It returns where it would end up in
-        new_piece_position = (piece_pos[0]+di*dist, piece_pos[1]+dj*dist)
-        if self.is_free_in(new_piece_position):
-            return new_piece_position
-        return None
-
-    def compute_no_captures_in_direction(self, piece, piece_pos, di, dj):
-        # given the direction (di,dj), for all distances of the piece to a 
-        # not free tile (a tile outside the board, that is already occupied or that is
-        # outside the piece's range), we can store the move as a move without capture
+    def compute_no_captures_in_direction(self, piece, dj, ray):
+        # given the ray of tiles in the direction (di,dj), for all distances of the piece to a 
+        # not free tile (a tile that is already occupied or that is outside the piece's range),
+        # we can store the move as a move without capture.
+        # It returns the distance to that tile (which is past the ray's end if it is outside the board)
         dist_to_obstacle = 1
         if dj in piece.no_capture_directions: # if the direction is valid
-            while dist_to_obstacle <= piece.distance_range(np.max([self.tiles.shape])): # for the dists in the piece's range
-                new_piece_pos = self.try_no_capture_given_dist(piece, piece_pos, di, dj, dist_to_obstacle)
-            
-                if (new_piece_pos is not None): # if found no obstacle, append move and continue loop
-                    piece.no_capture_moves.append(new_piece_pos)
-                else: # if found some obstacle, we've reached the limit
+            for new_piece_pos in ray[:piece.distance_range(self.max_distance)]: # for the tiles in the piece's range
+                if not tile_is_empty(self.tiles[new_piece_pos]): # if found some obstacle, we've reached the limit
                     break
+                piece.no_capture_moves.append(new_piece_pos) # if found no obstacle, append move and continue loop
                 dist_to_obstacle += 1
         return dist_to_obstacle
 
-    def try_capture_given_dist(self, piece, piece_pos, di, dj, dist_to_enemy, dist_after_enemy):
-        # analyzes if a piece can make a move with capture if it captures a piece in the direction (di,dj)
-        # and by a distance of tiles 'dist_to_enemy'; and also ends up in the direction (di,dj) by a
-        # distance of 'dist_after_enemy'.
-        # It returns where it would end up in and the captured piece position
-        new_piece_pos = (piece_pos[0]+di*dist_to_enemy+di*dist_after_enemy,piece_pos[1]+dj*dist_to_enemy+dj*dist_after_enemy)
-        if self.is_free_in(new_piece_pos):
-            return new_piece_pos
-        return None
-
-    def compute_captures_in_direction(self, piece, piece_pos, di, dj, dist_to_obstacle):
-        # given the direction (di,dj) and the distance to an obstacle, if the obstacle is an
-        # enemy piece, for all distances after the capture of the piece to a 
+    def compute_captures_in_direction(self, piece, dj, ray, dist_to_obstacle):
+        # given the ray of tiles in the direction (di,dj) and the distance to an obstacle, if the obstacle
+        # is an enemy piece, for all distances after the capture of the piece to a 
         # not free tile (a tile outside the board, that is already occupied or that is
         # outside the piece's range of capture), we can store the move as a move with capture
-        dist_after_obstacle = 1
-        obstacle_pos = (piece_pos[0]+di*dist_to_obstacle, piece_pos[1]+dj*dist_to_obstacle)
-        enemy_player = piece.oponent_player
-        if self.has_piece_in(obstacle_pos, enemy_player):
+        if dist_to_obstacle > len(ray): # the obstacle is outside the board
+            return
+        obstacle_pos = ray[dist_to_obstacle-1]
+        if self.tiles[obstacle_pos].player == piece.oponent_player:
             if dj in piece.capture_directions: # if the direction is valid
-                while dist_after_obstacle <= piece.distance_range(np.max([self.tiles.shape])): # for the dists in the piece's range
-                    new_piece_pos = self.try_capture_given_dist(piece, piece_pos, di, dj, dist_to_obstacle, dist_after_obstacle)
-                
-                    if (new_piece_pos is not None): # if found no obstacle after enemy, append move and continue loop
-                        piece.capture_moves.append(new_piece_pos)
-                        piece.captured_capture_moves.append(obstacle_pos)
-                    else: # if found some obstacle, we've reached the limit
+                for new_piece_pos in ray[dist_to_obstacle:dist_to_obstacle+piece.distance_range(self.max_distance)]: # for the tiles in the piece's range
+                    if not tile_is_empty(self.tiles[new_piece_pos]): # if found some obstacle after enemy, we've reached the limit
                         break
-                    dist_after_obstacle += 1
+                    piece.capture_moves.append(new_piece_pos) # if found no obstacle after enemy, append move and continue loop
+                    piece.captured_capture_moves.append(obstacle_pos)
 
     def compute_piece_moves(self, piece, piece_pos):
         # finds and stores the piece's moves, checking in every direction
-        for di in [1, -1]: # for all directions
-            for dj in [1, -1]:
-                dist_to_obstacle = self.compute_no_captures_in_direction(piece, piece_pos, di, dj)
-                if dist_to_obstacle <= piece.distance_range(np.max([self.tiles.shape])): # condition of distance TO enemy in captures
-                    self.compute_captures_in_direction(piece, piece_pos, di, dj, dist_to_obstacle)                   
+        distance_range = piece.distance_range(self.max_distance)
+        for di, dj, ray in self.rays[piece_pos[0]][piece_pos[1]]: # for all directions
+            dist_to_obstacle = self.compute_no_captures_in_direction(piece, dj, ray)
+            if dist_to_obstacle <= distance_range: # condition of distance TO enemy in captures
+                self.compute_captures_in_direction(piece, dj, ray, dist_to_obstacle)
+
+    def piece_capture_moves(self, piece_pos):
+        # returns the (capture move, captured piece position) pairs of the piece in the given position,
+        # without storing them inside the piece object
+        piece = self.tiles[piece_pos]
+        probe = Piece(piece.player, piece.rank)
+        self.compute_piece_moves(probe, piece_pos)
+        return list(zip(probe.capture_moves, probe.captured_capture_moves))
+
+    def note_changed_tile(self, pos):
+        # notes that the tile in the given position changed, so the moves through it must be recomputed
+        if self.changed_tiles is not None:
+            self.changed_tiles.add(pos)
+
+    def invalidate_moves(self):
+        # forces the next moves computation to recompute the moves of every piece
+        # (necessary if the tiles are changed without the Board methods)
+        self.changed_tiles = None
+
+    def is_affected_by_changes(self, piece, piece_pos):
+        # returns if a changed tile is in a diagonal of the piece, within the piece's reach
+        # (a rank1 piece only reaches 2 tiles away, which is where it lands after a capture)
+        reach = max(2, piece.distance_range(self.max_distance))
+        for changed_pos in self.changed_tiles:
+            di = changed_pos[0] - piece_pos[0]
+            dj = changed_pos[1] - piece_pos[1]
+            if abs(di) == abs(dj) and abs(di) <= reach:
+                return True
+        return False
 
     def compute_all_moves(self):
         # find and stores (inside the piece object) the moves for every piece
+        # whose diagonals had any changes since the last computation
         for i in range(self.tiles.shape[0]):
             for j in range(self.tiles.shape[1]):
                 piece = self.tiles[(i,j)]
                 if not tile_is_empty(piece):
-                    piece.no_capture_moves, piece.capture_moves, piece.captured_capture_moves = [],[],[]
-                    self.compute_piece_moves(piece, (i,j))
+                    if self.changed_tiles is None or self.is_affected_by_changes(piece, (i,j)):
+                        piece.no_capture_moves, piece.capture_moves, piece.captured_capture_moves = [],[],[]
+                        self.compute_piece_moves(piece, (i,j))
+                        self.recomputed_pieces += 1
+                    else:
+                        self.reused_pieces += 1
+        self.changed_tiles = set()
+
+    def moves_snapshot(self):
+        # returns the current moves of every piece, so they can be restored after the pieces are moved back
+        # (compute_all_moves replaces the move lists instead of changing them, so they can be shared)
+        snapshot = [(piece, piece.no_capture_moves, piece.capture_moves, piece.captured_capture_moves)
+                    for piece in self.tiles.flat if not tile_is_empty(piece)]
+        return snapshot, None if self.changed_tiles is None else set(self.changed_tiles)
+
+    def restore_moves(self, snapshot):
+        # gives back to the pieces the moves of a snapshot
+        pieces_moves, self.changed_tiles = snapshot
+        for piece, no_capture_moves, capture_moves, captured_capture_moves in pieces_moves:
+            piece.no_capture_moves, piece.capture_moves, piece.captured_capture_moves = no_capture_moves, capture_moves, captured_capture_moves
 
     def has_legal_moves(self, player):
         # returns if a certain player has any moves (moves with and without capture, separately)
@@ -153,11 +323,71 @@ class Board:
                     has_legal_no_capture_moves = has_legal_no_capture_moves or piece.has_legal_no_capture_moves()
         return has_legal_no_capture_moves, has_legal_capture_moves
 
+    def compute_zobrist_key(self):
+        # computes the Zobrist key of the pieces arrangement from scratch
+        zobrist_key = 0
+        for i in range(self.tiles.shape[0]):
+            for j in range(self.tiles.shape[1]):
+                piece = self.tiles[(i,j)]
+                zobrist_key ^= self.zobrist.piece_key((i,j), piece.player, piece.rank)
+        return zobrist_key
+
     def move_piece(self, old_pos, new_pos, captured_pos=None):
         # executes a move of a piece from the old position to a new one 
         # and captures the piece in the specified position (if there is one)
         piece = self.tiles[old_pos]
         self.tiles[old_pos] = empty_tile()
         self.tiles[new_pos] = piece
+        self.zobrist_key ^= self.zobrist.piece_key(old_pos, piece.player, piece.rank)
+        self.zobrist_key ^= self.zobrist.piece_key(new_pos, piece.player, piece.rank)
+        self.note_changed_tile(old_pos)
+        self.note_changed_tile(new_pos)
         if captured_pos != None:
-            self.tiles[captured_pos] = empty_tile()
\ No newline at end of file
+            captured_piece = self.tiles[captured_pos]
+            self.zobrist_key ^= self.zobrist.piece_key(captured_pos, captured_piece.player, captured_piece.rank)
+            self.tiles[captured_pos] = empty_tile()
+            self.note_changed_tile(captured_pos)
+
+    def place_piece(self, pos, piece):
+        # puts a piece object in the given (free) position
+        self.tiles[pos] = piece
+        self.zobrist_key ^= self.zobrist.piece_key(pos, piece.player, piece.rank)
+        self.note_changed_tile(pos)
+
+    def promote(self, pos):
+        # turns the piece in the given position into a queen
+        piece = self.tiles[pos]
+        if piece.rank == 1:
+            self.zobrist_key ^= self.zobrist.piece_key(pos, piece.player, 1)
+            self.zobrist_key ^= self.zobrist.piece_key(pos, piece.player, 2)
+        piece.rank = 2
+        self.note_changed_tile(pos)
+
+    def demote(self, pos):
+        # turns the queen in the given position back into a normal piece
+        piece = self.tiles[pos]
+        if piece.rank == 2:
+            self.zobrist_key ^= self.zobrist.piece_key(pos, piece.player, 2)
+            self.zobrist_key ^= self.zobrist.piece_key(pos, piece.player, 1)
+        piece.rank = 1
+        self.note_changed_tile(pos)
+
+    def to_fen(self, player=1):
+        # returns the FEN text of the pieces, with the given player having the turn
+        return board_to_fen(self, player)
+
+    def to_bytes(self, player=1):
+        # returns the packed position of the pieces, with the given player having the turn
+        return board_to_bytes(self, player)
+
+    @staticmethod
+    def from_fen(fen, board_shape=(8,8)):
+        # returns a Board with the pieces of a FEN text (the player with the turn is read by fen_to_tiles)
+        fen_tiles, _ = fen_to_tiles(fen, board_shape)
+        return Board(board_shape, fen_tiles)
+
+    @staticmethod
+    def from_bytes(data, board_shape=(8,8)):
+        # returns a Board with the pieces of a packed position (the player with the turn is its first byte)
+        packed_tiles, _ = bytes_to_tiles(data, board_shape)
+        return Board(board_shape, packed_tiles)
@@ -1,4 +1,12 @@
+import numpy as np
 from board import Board
+from bitboard import BitBoard
+from compact_board import CompactBoard, board_codes, decode_tiles
+from move import Move
+
+BOARD_BACKENDS = {'tiles': Board, 'bitboard': BitBoard, 'int8': CompactBoard} # the objects that can represent the game's board
+DRAW_ROUNDS = 80    # the rounds without a capture or a man move after which the game is a draw (40 moves of each player)
+REPETITIONS = 3     # the times a position must happen for the game to be a draw
 
 class Checkers:
     """
@@ -12,24 +20,50 @@ class Checkers:
     components, the Checkers object mannages the 'non physical'
     aspects of checkers, like the round count and rules like the
     forcefull captures.
+
+    The board can be represented by a Board object (the 'tiles' backend),
+    by a BitBoard object (the 'bitboard' backend) or by a CompactBoard
+    object (the 'int8' backend), which find the same moves.
+
+    Every executed move can be undone with the pop method, so the moves
+    can be explored (push, search, pop) without copying the board.
+    And the generate_moves method returns the whole turns a player can make
+    as Move objects, which push executes at once.
+
+    The legal moves of a round are computed only once, when first needed,
+    and are forgotten whenever a move is made (see turn_legal_moves).
+
+    A position can be sent to other processes as a compact state
+    (see compact_state and checkers_from_state), with the pieces
+    as int8 codes instead of Piece objects.
+
+    The game is a draw when a position happens for the third time,
+    or after draw_rounds rounds without a capture or a man move
+    (see is_draw). For that, the position key of every round is kept
+    in a history, which pop undoes along with the moves.
     """
 
-    def __init__(self, board_shape, initial_arrangement=[]):
-        self.board = Board(board_shape, initial_arrangement)    # the game's board
+    def __init__(self, board_shape, initial_arrangement=[], backend='tiles', draw_rounds=DRAW_ROUNDS):
+        self.board = BOARD_BACKENDS[backend](board_shape, initial_arrangement)    # the game's board
+        self.backend = backend  # the name of the board's backend
         self.round = 0  # the round/turn number
         self.mid_move_piece = None  # an overwrite to the available movable pieces, necessary for moves with +1 captures
+        self.moves_history = []     # the undo information of the executed moves, used by pop
+        self.turn_cache = None      # the legal moves of the round (see turn_legal_moves)
+        self.draw_rounds = draw_rounds  # the rounds without a capture or a man move after which the game is a draw (None for no limit)
+        self.position_history = []  # the (round, position key, quiet rounds) of every round, see advance_round
 
     def piece_in_pos(self, pos):
         # returns the piece object given a tile position
-        return self.board.tiles[pos]
+        return self.board.piece_at(pos)
 
     def player_in_pos(self, pos):
         # return the player number of a piece given a tile position
-        return self.piece_in_pos(pos).player
+        return self.board.player_at(pos)
 
     def rank_in_pos(self, pos):
         # return the rank number of a piece given a tile position
-        return self.piece_in_pos(pos).rank
+        return self.board.rank_at(pos)
 
     def player_turn(self):
         # returns white's turn for odd rounds, and black's turn for even rounds
@@ -45,22 +79,40 @@ class Checkers:
         else:
             return 2
 
+    def turn_legal_moves(self):
+        # returns the legal moves of the round, computing them only once per round (since they only
+        # change when a move is made): the positions of the movable pieces, if the capture is obligatory,
+        # and a dict that maps each movable piece position to its legal moves without and with capture
+        if self.turn_cache is None:
+            if self.mid_move_piece != None: # obligatory capture continuation
+                movable_pos = self.mid_move_piece
+            else: # the pieces of the player with the turn
+                movable_pos = self.board.pieces_pos(self.player_turn())
+            _, is_capture_obligatory = self.board.has_legal_moves(self.player_turn())
+            pieces_legal_moves = {}
+            for pos in movable_pos:
+                piece = self.piece_in_pos(pos)
+                if is_capture_obligatory: # there aren't any legal moves without captures if the capture is obligatory
+                    pieces_legal_moves[pos] = ([], piece.capture_moves)
+                else:
+                    pieces_legal_moves[pos] = (piece.no_capture_moves, piece.capture_moves)
+            self.turn_cache = (movable_pos, is_capture_obligatory, pieces_legal_moves)
+        return self.turn_cache
+
+    def invalidate_turn_cache(self):
+        # forgets the legal moves of the round, so they are computed again when needed
+        self.turn_cache = None
+
     def movable_pieces_pos(self):
         # returns the pieces that can be moved by a player in the round, that is,
-        # the pieces of the player with the turn
-        if self.mid_move_piece != None: # obligatory capture continuation 
-            return self.mid_move_piece
-
-        movable_pos = []
-        for i in range(self.board.tiles.shape[0]):
-            for j in range(self.board.tiles.shape[1]):
-                if self.player_in_pos((i,j)) == self.player_turn():
-                    movable_pos.append((i,j))
+        # the pieces of the player with the turn (or the piece in a capture continuation)
+        movable_pos, _, _ = self.turn_legal_moves()
         return movable_pos
 
     def update_moves(self):
         # find and stores (inside the piece object) the moves for every piece
         self.board.compute_all_moves()
+        self.invalidate_turn_cache()
 
     def has_legal_moves(self):
         # returns if a certain player has any moves at all (moves with and without capture together)
@@ -70,19 +122,15 @@ class Checkers:
     def is_capture_obligatory(self):
         # returns if there are any moves with capture to do,
         # (if there is, it is obligatory to make one of them)
-        _, has_legal_capture_moves = self.board.has_legal_moves(self.player_turn())
-        return has_legal_capture_moves
+        _, is_capture_obligatory, _ = self.turn_legal_moves()
+        return is_capture_obligatory
 
     def get_piece_legal_moves(self, selected_pos, concat=False):
         # returns the legal moves a given piece can make,
         # (can return the moves with and without capture separately or as one single concatenated list)
-        if selected_pos in self.movable_pieces_pos(): # the piece can't have legal moves if it can't be moved
-            piece = self.piece_in_pos(selected_pos)
-            if self.is_capture_obligatory(): # there aren't any legal moves without captures if the capture is obligatory
-                legal_no_capture_moves = []
-            else:
-                legal_no_capture_moves = piece.no_capture_moves
-            legal_capture_moves = piece.capture_moves # but the moves with captures have no restrictions
+        _, _, pieces_legal_moves = self.turn_legal_moves()
+        if selected_pos in pieces_legal_moves: # the piece can't have legal moves if it can't be moved
+            legal_no_capture_moves, legal_capture_moves = pieces_legal_moves[selected_pos]
         else:
             legal_no_capture_moves = []
             legal_capture_moves = []
@@ -92,36 +140,221 @@ class Checkers:
         else:
             return legal_no_capture_moves, legal_capture_moves
 
+    def legal_moves(self):
+        # returns all the legal moves of the round as (selected_pos, released_pos) pairs
+        # (when a capture has a continuation, only the continuations are returned)
+        _, _, pieces_legal_moves = self.turn_legal_moves()
+        legal_moves = []
+        for selected_pos, (legal_no_capture_moves, legal_capture_moves) in pieces_legal_moves.items():
+            legal_moves += [(selected_pos, released_pos) for released_pos in legal_no_capture_moves]
+            legal_moves += [(selected_pos, released_pos) for released_pos in legal_capture_moves]
+        return legal_moves
+
     def promote_if_needed(self, piece, piece_pos):
+        # promotes the piece if it reached the oponent's home line (and returns if it did)
         if piece_pos[1] == self.board.oponents_homeline(piece.player) and piece.rank == 1:
-            piece.rank = 2
+            self.board.promote(piece_pos)
+            return True
+        return False
 
-    def make_move(self, selected_pos, released_pos):
-        # executes a move of a piece having the game rules in mind
-        # in case the move is illegal or not finished (has another step continuation),
-        # then this function returns False
-        legal_piece_no_capture_moves, legal_piece_capture_moves = self.get_piece_legal_moves(selected_pos)
+    def execute_move(self, selected_pos, released_pos):
+        # executes a move of a piece, without checking if it is legal, and notes how to undo it
+        # in case the move is not finished (has another step continuation), then this function returns False
         piece = self.piece_in_pos(selected_pos)
-        if released_pos in legal_piece_capture_moves: # is it a legal move with capture?
-            captured_piece_pos = piece.get_captured_piece_pos(released_pos)
-            self.board.move_piece(selected_pos, released_pos, captured_piece_pos) # then make the move
+        captured_piece_pos = piece.get_captured_piece_pos(released_pos)
+        captured_pieces = [self.piece_in_pos(captured_piece_pos)] if captured_piece_pos != None else []
+        previous_mid_move_piece = self.mid_move_piece
+        moves_snapshot = self.board.moves_snapshot()
+        self.board.move_piece(selected_pos, released_pos, captured_piece_pos) # make the move
+        promoted = False
+        if captured_piece_pos != None: # is it a move with capture?
             self.board.compute_all_moves()
-            _, next_legal_piece_capture_moves = self.get_piece_legal_moves(released_pos)
-            if next_legal_piece_capture_moves != []: # and is there any capture continuations?
+            next_piece_capture_moves = self.piece_in_pos(released_pos).capture_moves
+            if next_piece_capture_moves != []: # and is there any capture continuations?
                 self.mid_move_piece = [released_pos] # if so, ask for a move continuation
-                return False
             else:
                 self.mid_move_piece = None # if not, don't ask for a move continuation
-                self.promote_if_needed(piece, released_pos) # and promote piece if needed
-                return True
-        elif released_pos in legal_piece_no_capture_moves: # is it a legal move without capture?
-            self.board.move_piece(selected_pos, released_pos) # then make the move
-            self.mid_move_piece = None # and don't ask for a move continuation
-            self.promote_if_needed(piece, released_pos) # and promote piece if needed
-            return True
+                promoted = self.promote_if_needed(piece, released_pos) # and promote piece if needed
+        else:
+            self.mid_move_piece = None # don't ask for a move continuation
+            promoted = self.promote_if_needed(piece, released_pos) # and promote piece if needed
+        step = Move(selected_pos, [released_pos], [captured_piece_pos] if captured_piece_pos != None else [], promoted)
+        self.moves_history.append((step, captured_pieces, previous_mid_move_piece, moves_snapshot, self.round))
+        self.invalidate_turn_cache()
+        return self.mid_move_piece == None
+
+    def execute_whole_move(self, move):
+        # executes all the steps of a Move object (a whole turn) at once, without checking if it is legal,
+        # and without computing any moves in between the steps, and notes how to undo it
+        captured_pieces = [self.piece_in_pos(captured_pos) for captured_pos in move.captures]
+        previous_mid_move_piece = self.mid_move_piece
+        moves_snapshot = self.board.moves_snapshot()
+        pos = move.from_pos
+        for step, landing in enumerate(move.landings):
+            self.board.move_piece(pos, landing, move.captures[step] if move.is_capture() else None)
+            pos = landing
+        if move.promotes:
+            self.board.promote(pos)
+        self.mid_move_piece = None
+        self.moves_history.append((move, captured_pieces, previous_mid_move_piece, moves_snapshot, self.round))
+        self.invalidate_turn_cache()
+        return True
+
+    def make_move(self, selected_pos, released_pos):
+        # executes a move of a piece having the game rules in mind
+        # in case the move is illegal or not finished (has another step continuation),
+        # then this function returns False
+        legal_piece_no_capture_moves, legal_piece_capture_moves = self.get_piece_legal_moves(selected_pos)
+        if released_pos in legal_piece_capture_moves or released_pos in legal_piece_no_capture_moves: # is it a legal move?
+            return self.execute_move(selected_pos, released_pos) # then make the move
         else:
             return False
 
+    def push(self, move):
+        # executes a legal move, without checking it, so it can be undone by pop.
+        # The move can be either a (selected_pos, released_pos) step or a Move object (a whole turn).
+        # If the move ends the turn, the round is advanced (like in the GameWrapper's new_round state),
+        # and this function returns True
+        if isinstance(move, Move):
+            ended_turn = self.execute_whole_move(move)
+        else:
+            ended_turn = self.execute_move(*move)
+        if ended_turn:
+            self.update_moves()
+            self.advance_round()
+        return ended_turn
+
+    def pop(self):
+        # undoes the last executed move (by push or make_move), restoring the captured pieces,
+        # the piece's rank, the pieces' moves, the capture continuation and the round,
+        # and returns the undone move as a Move object
+        move, captured_pieces, mid_move_piece, moves_snapshot, round = self.moves_history.pop()
+        if move.promotes:
+            self.board.demote(move.to_pos)
+        self.board.move_piece(move.to_pos, move.from_pos)
+        for captured_pos, captured_piece in zip(move.captures, captured_pieces):
+            self.board.place_piece(captured_pos, captured_piece)
+        self.board.restore_moves(moves_snapshot)
+        self.mid_move_piece = mid_move_piece
+        self.round = round
+        while self.position_history != [] and self.position_history[-1][0] > round: # the rounds that were undone
+            self.position_history.pop()
+        self.invalidate_turn_cache()
+        return move
+
+    # WHOLE MOVES GENERATION ----------------------------------------------------------------------------------
+
+    def promotes_in(self, piece, pos):
+        # returns if the piece would be promoted by ending its move in the given position
+        return piece.rank == 1 and pos[1] == self.board.oponents_homeline(piece.player)
+
+    def add_capture_sequences(self, piece, from_pos, landings, captures, moves):
+        # adds to the moves list every capture sequence that continues the given one
+        # (whose piece is already moved to its last landing, with the captured pieces removed)
+        pos = landings[-1]
+        next_captures = self.board.piece_capture_moves(pos)
+        if next_captures == []: # the sequence is over
+            moves.append(Move(from_pos, landings, captures, self.promotes_in(piece, pos)))
+            return
+        for landing, captured_pos in next_captures:
+            captured_piece = self.piece_in_pos(captured_pos)
+            self.board.move_piece(pos, landing, captured_pos)
+            self.add_capture_sequences(piece, from_pos, landings + [landing], captures + [captured_pos], moves)
+            self.board.move_piece(landing, pos)
+            self.board.place_piece(captured_pos, captured_piece)
+
+    def generate_moves(self, majority_capture=False):
+        # returns the legal moves of the round as Move objects, that is, with every capture
+        # continuation already included (so a Move is a whole turn).
+        # With majority_capture, only the moves that capture the most pieces are legal
+        moves = []
+        is_capture_obligatory = self.is_capture_obligatory()
+        moves_snapshot = self.board.moves_snapshot()
+        for from_pos in self.movable_pieces_pos():
+            piece = self.piece_in_pos(from_pos)
+            if is_capture_obligatory:
+                for landing, captured_pos in zip(piece.capture_moves, piece.captured_capture_moves):
+                    captured_piece = self.piece_in_pos(captured_pos)
+                    self.board.move_piece(from_pos, landing, captured_pos)
+                    self.add_capture_sequences(piece, from_pos, [landing], [captured_pos], moves)
+                    self.board.move_piece(landing, from_pos)
+                    self.board.place_piece(captured_pos, captured_piece)
+            else:
+                moves += [Move(from_pos, [to_pos], [], self.promotes_in(piece, to_pos)) for to_pos in piece.no_capture_moves]
+        self.board.restore_moves(moves_snapshot) # the pieces were moved back, so their moves are the same as before
+        if majority_capture and moves != []:
+            most_captures = max(len(move.captures) for move in moves)
+            moves = [move for move in moves if len(move.captures) == most_captures]
+        return moves
+
     def advance_round(self):
-        # advances the round by 1
-        self.round += 1
\ No newline at end of file
+        # advances the round by 1, and notes the new position in the position history, with the number
+        # of rounds since the last capture or man move (a turn that ends in one of them is irreversible)
+        position_history, moves_history = self.position_history, self.moves_history
+        quiet_rounds = 0
+        if position_history:
+            quiet_rounds = position_history[-1][2] + 1
+            if moves_history and moves_history[-1][-1] == self.round: # the last move ended this round's turn
+                move = moves_history[-1][0]
+                if move.captures or move.promotes or self.board.rank_at(move.to_pos) == 1:
+                    quiet_rounds = 0
+        self.round += 1
+        self.invalidate_turn_cache()
+        position_history.append((self.round, self.position_key(), quiet_rounds))
+
+    # DRAWS ----------------------------------------------------------------------------------
+
+    def quiet_rounds(self):
+        # returns the number of rounds since the last capture or man move
+        return self.position_history[-1][2] if self.position_history != [] else 0
+
+    def repetitions(self):
+        # returns how many times the position of the round happened (only the positions since the last
+        # capture or man move can be the same, and only every other round has the same player with the turn)
+        if self.position_history == []:
+            return 0
+        _, position_key, quiet_rounds = self.position_history[-1]
+        return sum(1 for _, key, _ in self.position_history[-1:-2-quiet_rounds:-2] if key == position_key)
+
+    def is_draw(self):
+        # returns if the game is a draw, by repetition or by the rounds without a capture or a man move
+        # (a position can only happen again 4 rounds later, after both players went and came back)
+        quiet_rounds = self.quiet_rounds()
+        if self.draw_rounds is not None and quiet_rounds >= self.draw_rounds:
+            return True
+        return quiet_rounds >= 4*(REPETITIONS-1) and self.repetitions() >= REPETITIONS
+
+    def forget_history(self):
+        # forgets the undo information of the executed moves, and the positions that can't happen again
+        # (the ones before the last capture or man move), for a game whose moves won't be undone
+        self.moves_history.clear()
+        del self.position_history[:-1-self.quiet_rounds()]
+
+    def position_key(self):
+        # returns the 64 bits Zobrist key of the game position, that is, the board's key
+        # folded with who has the turn (and with the piece in the middle of a capture continuation)
+        position_key = self.board.zobrist_key
+        if self.player_turn() == 2:
+            position_key ^= self.board.zobrist.second_player_key
+        if self.mid_move_piece != None:
+            pos = self.mid_move_piece[0]
+            position_key ^= self.board.zobrist.mid_move_keys[pos[0]][pos[1]]
+        return position_key
+
+    # COMPACT STATE ----------------------------------------------------------------------------------
+
+    def compact_state(self):
+        # returns the position as a small tuple: the board shape, the bytes of the int8 codes of the pieces
+        # (see compact_board.py), the round, the piece in the middle of a capture continuation and the backend
+        codes = board_codes(self.board)
+        return (self.board.shape, codes.tobytes(), self.round, self.mid_move_piece, self.backend)
+
+def checkers_from_state(state):
+    # returns a Checkers object in the position of a compact state, with the pieces' moves already computed
+    board_shape, codes_bytes, round, mid_move_piece, backend = state
+    codes = np.frombuffer(codes_bytes, dtype=np.int8).reshape(board_shape)
+    checkers = Checkers(board_shape, codes.copy() if backend == 'int8' else decode_tiles(codes), backend)
+    checkers.round = round
+    checkers.mid_move_piece = mid_move_piece
+    checkers.update_moves()
+    return checkers
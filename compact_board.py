@@ -0,0 +1,329 @@
+import numpy as np
+from piece import Piece
+from board import initial_tiles, empty_tiles, square_tables, position_size, PIECE_NIBBLES
+from bitboard import shape_tables
+from zobrist import zobrist_table
+
+def piece_code(player, rank):
+    # returns the int8 code of a piece: its rank, positive for player1 and negative for player2
+    # (empty tiles are coded as 0)
+    if player == 1:
+        return rank
+    elif player == 2:
+        return -rank
+    return 0
+
+def code_player(code):
+    # returns the player number of a piece code
+    if code > 0:
+        return 1
+    elif code < 0:
+        return 2
+    return 0
+
+def code_rank(code):
+    # returns the rank number of a piece code (empty tiles have rank1, like the player0 pieces)
+    return abs(int(code)) if code != 0 else 1
+
+def encode_tiles(tiles):
+    # returns the int8 codes of a matrix of Piece objects
+    codes = np.zeros(tiles.shape, dtype=np.int8)
+    for i in range(tiles.shape[0]):
+        for j in range(tiles.shape[1]):
+            codes[i, j] = piece_code(tiles[i, j].player, tiles[i, j].rank)
+    return codes
+
+def decode_tiles(codes):
+    # returns the matrix of Piece objects of some int8 codes
+    tiles = empty_tiles(codes.shape)
+    for i in range(codes.shape[0]):
+        for j in range(codes.shape[1]):
+            if codes[i, j] != 0:
+                tiles[i, j] = Piece(player=code_player(codes[i, j]), rank=code_rank(codes[i, j]))
+    return tiles
+
+def board_codes(board):
+    # returns the int8 codes of the pieces of a board of any backend
+    if isinstance(board, CompactBoard):
+        return board.tiles.copy()
+    codes = np.zeros(board.shape, dtype=np.int8)
+    for player in [1, 2]:
+        for pos in board.pieces_pos(player):
+            codes[pos] = piece_code(player, board.rank_at(pos))
+    return codes
+
+NIBBLE_CODES = np.zeros(16, dtype=np.int8)   # the int8 code of every nibble of a packed position (see board.PIECE_NIBBLES)
+CODE_NIBBLES = np.zeros(5, dtype=np.uint8)   # the nibble of every int8 code (plus 2)
+for (player, rank), nibble in PIECE_NIBBLES.items():
+    NIBBLE_CODES[nibble] = piece_code(player, rank)
+    CODE_NIBBLES[piece_code(player, rank) + 2] = nibble
+
+def unpack_positions(records, board_shape):
+    # returns the (N, width, height) stack of the int8 codes of a (N, position_size) array of packed positions,
+    # and the (N,) array of the players with the turn, unpacking all of them at once
+    tiles, _ = square_tables(board_shape)
+    squares_count = len(tiles) - 1
+    nibbles = np.empty((len(records), 2*(records.shape[1]-1)), dtype=np.uint8)
+    nibbles[:, 0::2] = records[:, 1:] & 0xF
+    nibbles[:, 1::2] = records[:, 1:] >> 4
+    codes = np.zeros((len(records),) + tuple(board_shape), dtype=np.int8)
+    columns, rows = zip(*tiles[1:])
+    codes[:, columns, rows] = NIBBLE_CODES[nibbles[:, :squares_count]]
+    return codes, records[:, 0].copy()
+
+def pack_positions(codes, players):
+    # returns the (N, position_size) array of the packed positions of a stack of int8 codes
+    # and of the players with the turn
+    board_shape = codes.shape[1:]
+    tiles, _ = square_tables(board_shape)
+    columns, rows = zip(*tiles[1:])
+    nibbles = CODE_NIBBLES[codes[:, columns, rows].astype(np.int16) + 2]
+    if nibbles.shape[1] % 2 == 1:
+        nibbles = np.concatenate([nibbles, np.zeros((len(codes), 1), dtype=np.uint8)], axis=1)
+    records = np.empty((len(codes), position_size(board_shape)), dtype=np.uint8)
+    records[:, 0] = players
+    records[:, 1:] = nibbles[:, 0::2] | (nibbles[:, 1::2] << 4)
+    return records
+
+def load_positions(path, board_shape=(8,8)):
+    # reads a file of packed positions (see board.board_to_bytes) as a stack of int8 codes
+    # and the players with the turn, without building any Piece objects
+    # (a CompactBoard can be built from every position of the stack)
+    records = np.fromfile(path, dtype=np.uint8).reshape(-1, position_size(board_shape))
+    return unpack_positions(records, board_shape)
+
+def save_positions(path, codes, players):
+    # writes a stack of int8 codes and the players with the turn as a file of packed positions
+    pack_positions(codes, players).tofile(path)
+
+class CompactBoard:
+    """
+    COMPACT BOARD
+    -------------
+    This object is a drop-in replacement of the Board object
+    that stores the position as an int8 matrix of piece codes
+    (the piece's rank, positive for player1 and negative for player2,
+    and 0 for the empty tiles), instead of a matrix of Piece objects.
+
+    The pieces' moves are also kept in int16 matrices (one row of
+    flat tile indexes per tile, with the number of moves of each row
+    in separate count arrays), so the whole position and its moves
+    are copied with a few array copies (see copy), and hashed
+    with tiles.tobytes() (see key).
+
+    The found moves are the same (and in the same order) as the ones
+    found by the Board object, and they are handed to the Checkers object
+    inside Piece objects built on demand by the piece_at method.
+    """
+
+    def __init__(self, board_shape, initial_arrangement=[]):
+        if len(initial_arrangement) == 0:
+            initial_arrangement = initial_tiles(board_shape)
+
+        self.shape = tuple(board_shape)
+        self.positions, _, _, _, self.rays = shape_tables(self.shape)  # flat tile index = i*height + j, like in the BitBoard
+        if initial_arrangement.dtype == np.int8:
+            self.tiles = initial_arrangement.copy()
+        else:
+            self.tiles = encode_tiles(initial_arrangement)     # a matrix with the code of the piece of every tile
+        tiles_count = self.shape[0]*self.shape[1]
+        max_moves = 2*max(self.shape)
+        self.no_capture_moves = np.zeros((tiles_count, max_moves), dtype=np.int16)     # the moves without capture of the piece in each tile
+        self.capture_moves = np.zeros((tiles_count, max_moves), dtype=np.int16)        # the moves with capture of the piece in each tile
+        self.captured_capture_moves = np.zeros((tiles_count, max_moves), dtype=np.int16)   # the captured pieces of those moves
+        self.no_capture_counts = np.zeros(tiles_count, dtype=np.int8)  # the number of moves without capture of each tile
+        self.capture_counts = np.zeros(tiles_count, dtype=np.int8)     # the number of moves with capture of each tile
+        self.zobrist = zobrist_table(self.shape)    # the keys of the Zobrist hashing
+        self.zobrist_key = self.compute_zobrist_key()   # the Zobrist key of the pieces arrangement
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def copy(self):
+        # returns a copy of the position and its moves (sharing the precomputed tables, which never change)
+        board = CompactBoard.__new__(CompactBoard)
+        board.__dict__.update(self.__dict__)
+        board.tiles = self.tiles.copy()
+        board.restore_moves(self.moves_snapshot())
+        return board
+
+    def key(self):
+        # returns the bytes of the pieces arrangement
+        return self.tiles.tobytes()
+
+    def flat_index(self, pos):
+        # returns the flat index of a given position
+        return pos[0]*self.shape[1] + pos[1]
+
+    def piece_at(self, pos):
+        # returns a Piece object that represents the piece in a given position, with its moves
+        code = self.tiles[pos]
+        piece = Piece(player=code_player(code), rank=code_rank(code))
+        if code != 0:
+            index = self.flat_index(pos)
+            positions = self.positions
+            piece.no_capture_moves = [positions[tile] for tile in self.no_capture_moves[index, :self.no_capture_counts[index]].tolist()]
+            piece.capture_moves = [positions[tile] for tile in self.capture_moves[index, :self.capture_counts[index]].tolist()]
+            piece.captured_capture_moves = [positions[tile] for tile in self.captured_capture_moves[index, :self.capture_counts[index]].tolist()]
+        return piece
+
+    def player_at(self, pos):
+        # returns the player number of the piece in a given position
+        return code_player(self.tiles[pos])
+
+    def rank_at(self, pos):
+        # returns the rank number of the piece in a given position
+        return code_rank(self.tiles[pos])
+
+    def player_mask(self, player):
+        # returns the flat boolean mask of the tiles with pieces of a given player
+        if player == 1:
+            return self.tiles.ravel() > 0
+        elif player == 2:
+            return self.tiles.ravel() < 0
+        return self.tiles.ravel() == 0
+
+    def pieces_pos(self, player):
+        # returns the positions of all the pieces of a given player
+        return [self.positions[index] for index in np.flatnonzero(self.player_mask(player)).tolist()]
+
+    def is_in_bounds(self, pos):
+        # returns if the pos is inside the board
+        return (pos[0]<self.shape[0] and pos[0]>=0 and pos[1]<self.shape[1] and pos[1]>=0)
+
+    def has_piece_in(self, pos, player):
+        # returns if the given position has a piece of a given player
+        return (self.is_in_bounds(pos) and self.player_at(pos) == player)
+
+    def is_free_in(self, pos):
+        # returns if the given position doesn't have any piece of player1 or player2
+        return (self.is_in_bounds(pos) and self.tiles[pos] == 0)
+
+    def oponents_homeline(self, player):
+        # returns if the line value of the oponet's home line
+        if player == 1:
+            return 0
+        elif player == 2:
+            return self.shape[1]-1
+
+    def tile_moves(self, cells, index):
+        # returns the moves without capture, the moves with capture and the captured pieces
+        # of the piece in a flat tile index (as flat tile indexes), given the flat list of the tiles codes
+        code = cells[index]
+        no_capture_moves, capture_moves, captured_capture_moves = [], [], []
+        is_king = code == 2 or code == -2
+        forward = -1 if code > 0 else 1 # rank1 pieces only move forward without capture
+        for d, ray in enumerate(self.rays[index]):
+            if ray == []:
+                continue
+            dj = self.positions[ray[0]][1] - self.positions[index][1]
+            dist = 0
+            if is_king or dj == forward:
+                while dist < len(ray) and cells[ray[dist]] == 0:
+                    no_capture_moves.append(ray[dist])
+                    dist += 1
+                    if not is_king:
+                        break
+            if not is_king and dist > 0: # a rank1 piece that moved in this direction has found no obstacle
+                continue
+            if dist < len(ray) and cells[ray[dist]] * code < 0: # the obstacle is an enemy piece
+                captured = ray[dist]
+                dist += 1
+                while dist < len(ray) and cells[ray[dist]] == 0:
+                    capture_moves.append(ray[dist])
+                    captured_capture_moves.append(captured)
+                    dist += 1
+                    if not is_king:
+                        break
+        return no_capture_moves, capture_moves, captured_capture_moves
+
+    def compute_all_moves(self):
+        # find and stores the moves for every piece
+        cells = self.tiles.ravel().tolist()
+        self.no_capture_counts[:] = 0
+        self.capture_counts[:] = 0
+        for index in np.flatnonzero(self.tiles.ravel()).tolist():
+            no_capture_moves, capture_moves, captured_capture_moves = self.tile_moves(cells, index)
+            if no_capture_moves != []:
+                self.no_capture_moves[index, :len(no_capture_moves)] = no_capture_moves
+                self.no_capture_counts[index] = len(no_capture_moves)
+            if capture_moves != []:
+                self.capture_moves[index, :len(capture_moves)] = capture_moves
+                self.captured_capture_moves[index, :len(capture_moves)] = captured_capture_moves
+                self.capture_counts[index] = len(capture_moves)
+
+    def piece_capture_moves(self, piece_pos):
+        # returns the (capture move, captured piece position) pairs of the piece in the given position,
+        # without storing them
+        _, capture_moves, captured_capture_moves = self.tile_moves(self.tiles.ravel().tolist(), self.flat_index(piece_pos))
+        return [(self.positions[move], self.positions[captured]) for move, captured in zip(capture_moves, captured_capture_moves)]
+
+    def moves_snapshot(self):
+        # returns a copy of the current moves of every piece, so they can be restored after the pieces are moved back
+        return (self.no_capture_moves.copy(), self.capture_moves.copy(), self.captured_capture_moves.copy(),
+                self.no_capture_counts.copy(), self.capture_counts.copy())
+
+    def restore_moves(self, snapshot):
+        # gives back to the pieces the moves of a snapshot (which can't be restored again)
+        self.no_capture_moves, self.capture_moves, self.captured_capture_moves, self.no_capture_counts, self.capture_counts = snapshot
+
+    def has_legal_moves(self, player):
+        # returns if a certain player has any moves (moves with and without capture, separately)
+        mask = self.player_mask(player)
+        return bool(self.no_capture_counts[mask].any()), bool(self.capture_counts[mask].any())
+
+    def compute_zobrist_key(self):
+        # computes the Zobrist key of the pieces arrangement from scratch
+        zobrist_key = 0
+        for index in np.flatnonzero(self.tiles.ravel()).tolist():
+            code = self.tiles.flat[index]
+            zobrist_key ^= self.zobrist.piece_key(self.positions[index], code_player(code), code_rank(code))
+        return zobrist_key
+
+    def move_tile_moves(self, old_index, new_index):
+        # moves the moves of a tile to another one (the moves travel with the piece, like they do inside a Piece object)
+        if old_index == new_index:
+            return
+        for moves in [self.no_capture_moves, self.capture_moves, self.captured_capture_moves]:
+            moves[new_index] = moves[old_index]
+        for counts in [self.no_capture_counts, self.capture_counts]:
+            counts[new_index] = counts[old_index]
+            counts[old_index] = 0
+
+    def move_piece(self, old_pos, new_pos, captured_pos=None):
+        # executes a move of a piece from the old position to a new one
+        # and captures the piece in the specified position (if there is one)
+        code = self.tiles[old_pos]
+        player, rank = code_player(code), code_rank(code)
+        self.zobrist_key ^= self.zobrist.piece_key(old_pos, player, rank) ^ self.zobrist.piece_key(new_pos, player, rank)
+        self.tiles[old_pos] = 0
+        self.tiles[new_pos] = code
+        self.move_tile_moves(self.flat_index(old_pos), self.flat_index(new_pos))
+        if captured_pos != None:
+            captured_code = self.tiles[captured_pos]
+            self.zobrist_key ^= self.zobrist.piece_key(captured_pos, code_player(captured_code), code_rank(captured_code))
+            self.tiles[captured_pos] = 0
+            captured_index = self.flat_index(captured_pos)
+            self.no_capture_counts[captured_index] = 0
+            self.capture_counts[captured_index] = 0
+
+    def place_piece(self, pos, piece):
+        # puts a piece (with the player and rank of the given Piece object) in the given (free) position
+        self.tiles[pos] = piece_code(piece.player, piece.rank)
+        self.zobrist_key ^= self.zobrist.piece_key(pos, piece.player, piece.rank)
+
+    def promote(self, pos):
+        # turns the piece in the given position into a queen
+        code = self.tiles[pos]
+        if abs(code) == 1:
+            player = code_player(code)
+            self.zobrist_key ^= self.zobrist.piece_key(pos, player, 1) ^ self.zobrist.piece_key(pos, player, 2)
+            self.tiles[pos] = 2*code
+
+    def demote(self, pos):
+        # turns the queen in the given position back into a normal piece
+        code = self.tiles[pos]
+        if abs(code) == 2:
+            player = code_player(code)
+            self.zobrist_key ^= self.zobrist.piece_key(pos, player, 2) ^ self.zobrist.piece_key(pos, player, 1)
+            self.tiles[pos] = code//2
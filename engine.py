@@ -0,0 +1,388 @@
+import multiprocessing
+import queue
+import signal
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from tablebase import WIN, LOSS, Tablebase
+from checkers import checkers_from_state
+from compact_board import board_codes
+from evaluation import evaluate, batch_evaluate
+
+WIN_SCORE = 1000000 # the score of a won position (minus the plies it takes to win)
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2 # the kinds of scores stored in the transposition table
+
+MAX_DEPTH = 64          # the deepest search of an iterative deepening without depth limit
+DEADLINE_CHECKS = 256   # the number of searched positions between the checks of the deadline
+DEADLINE_MARGIN = 0.8   # the part of the time budget the background search uses (the rest is for starting and answering)
+STOP_TIMEOUT = 0.1      # the seconds a stopped background search has to end before it is killed
+
+class SearchTimeout(Exception):
+    # raised inside a search that ran out of time
+    pass
+
+def table_score(score, ply):
+    # returns the score to store in the transposition table: the scores of won or lost positions count
+    # the plies from the root of the search, so they are stored counting the plies from the position instead
+    if score > WIN_SCORE // 2:
+        return score + ply
+    elif score < -WIN_SCORE // 2:
+        return score - ply
+    return score
+
+def probed_score(score, ply):
+    # returns the score of a transposition table entry probed at a ply (the reverse of table_score)
+    if score > WIN_SCORE // 2:
+        return score - ply
+    elif score < -WIN_SCORE // 2:
+        return score + ply
+    return score
+
+def tablebase_score(result, distance, ply):
+    # returns the score of a tablebase result (won or lost in distance turns), from the point of view of the player with the turn
+    if result == WIN:
+        return WIN_SCORE - (ply + distance)
+    elif result == LOSS:
+        return -WIN_SCORE + ply + distance
+    return 0
+
+class Engine:
+    """
+    ENGINE
+    ------
+    This object is a computer player. Given a Checkers object,
+    it searches for the best move of the player with the turn with
+    a negamax alpha-beta search of a given depth (in plies), exploring
+    the positions with the Checkers push and pop methods.
+
+    A move of the search is a whole turn (a Move object, with all the
+    capture continuations), and the turns with more captures are searched first.
+    The scores of the searched positions are kept in a transposition table,
+    keyed by Checkers.position_key, so positions reached by different
+    move orders are searched only once (with the won and lost scores
+    stored as plies from the position, see table_score).
+
+    In pure python, a depth 8 search of the initial 8x8 position takes
+    about 5 seconds with the bitboard backend (about 25 thousand positions),
+    far from a reply in 100 ms: benchmarks.py tracks it (engine_depth8).
+
+    The positions at the end of the search are scored by evaluation.py:
+    the children of a position searched one ply deep are all scored
+    at once, by a single batch evaluation (see score_leaves).
+
+    Given a Tablebase object, the positions with few enough pieces are
+    scored by looking up their result instead of searching them.
+
+    With a time budget, the search deepens one ply at a time until
+    the time is over (see iterative_search), and it can run in another
+    process while the game goes on (see BackgroundSearch).
+
+    With more than one worker, the turns of the searched position are
+    split across a pool of processes (see the parallel root search below).
+
+    The Engine can also be used as a policy (see policies.py), since it
+    has a choose_move method.
+    """
+
+    def __init__(self, depth=4, max_table_size=1000000, majority_capture=False, tablebase=None, workers=1, time_budget=None):
+        self.depth = depth                      # the number of plies searched (the maximum one, with a time budget)
+        self.time_budget = time_budget          # the seconds the engine thinks per turn (None to always search the whole depth)
+        self.deadline = None                    # the time when the current search must stop (None for no limit)
+        self.tablebase = tablebase              # the Tablebase with the results of the positions with few pieces (if any)
+        self.majority_capture = majority_capture    # if only the turns that capture the most pieces are legal
+        self.max_table_size = max_table_size    # the table is cleared when it reaches this size
+        self.table = {}                         # the transposition table: position key -> (depth, score, kind, best turn index)
+        self.searched_nodes = 0                 # the number of positions searched by the last search
+        self.planned_moves = []                 # the remaining steps of the turn chosen by choose_move
+        self.workers = workers                  # the number of processes of the root search
+        self.pool = None                        # the pool of processes of the root search (created when first needed)
+        self.shared_alpha = None                # the best score found by the pool's processes in the current search
+
+    def turns(self, checkers):
+        # returns every turn the player with the turn can make, as Move objects,
+        # with the turns with more captures first
+        turns = checkers.generate_moves(self.majority_capture)
+        turns.sort(key=lambda move: -len(move.captures))
+        return turns
+
+    def search_turn(self, checkers, move, depth, alpha, beta, ply):
+        # makes a turn, searches the resulting position and undoes the turn
+        checkers.push(move)
+        score = -self.negamax(checkers, depth, alpha, beta, ply)
+        checkers.pop()
+        return score
+
+    def negamax(self, checkers, depth, alpha, beta, ply):
+        # returns the score of the position from the point of view of the player with the turn
+        self.searched_nodes += 1
+        if self.deadline is not None and self.searched_nodes % DEADLINE_CHECKS == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+        if self.tablebase is not None:
+            entry = self.tablebase.probe(checkers)
+            if entry is not None:
+                return tablebase_score(*entry, ply)
+        original_alpha = alpha
+        key = checkers.position_key()
+        entry = self.table.get(key)
+        best_index = 0
+        if entry is not None:
+            entry_depth, entry_score, entry_kind, best_index = entry
+            entry_score = probed_score(entry_score, ply)
+            if entry_depth >= depth:
+                if entry_kind == EXACT:
+                    return entry_score
+                elif entry_kind == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                elif entry_kind == UPPER_BOUND:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        if depth == 0:
+            if checkers.legal_moves() == []: # the player with the turn can't move, so it lost
+                return -WIN_SCORE + ply
+            return evaluate(checkers)
+        turns = self.turns(checkers)
+        if turns == []:
+            return -WIN_SCORE + ply
+
+        if depth == 1:
+            best_score, best_index = self.score_leaves(checkers, turns, ply)
+        else:
+            order = list(range(len(turns)))
+            if best_index < len(turns): # the best turn of a previous search is searched first
+                order.insert(0, order.pop(best_index))
+            best_score = -WIN_SCORE - 1
+            for index in order:
+                score = self.search_turn(checkers, turns[index], depth-1, -beta, -alpha, ply+1)
+                if score > best_score:
+                    best_score = score
+                    best_index = index
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    break
+
+        if len(self.table) >= self.max_table_size:
+            self.table.clear()
+        if best_score <= original_alpha:
+            kind = UPPER_BOUND
+        elif best_score >= beta:
+            kind = LOWER_BOUND
+        else:
+            kind = EXACT
+        self.table[key] = (depth, table_score(best_score, ply), kind, best_index)
+        return best_score
+
+    def score_leaves(self, checkers, turns, ply):
+        # returns the best score (and the index of its turn) of a position whose children are the end of the search.
+        # Every child is made and undone once, to find if it is over (or in the tablebase),
+        # and the others are scored together by one batch evaluation
+        scores = [0] * len(turns)
+        codes, leaves = [], []
+        for index, move in enumerate(turns):
+            self.searched_nodes += 1
+            if self.deadline is not None and self.searched_nodes % DEADLINE_CHECKS == 0 and time.time() > self.deadline:
+                raise SearchTimeout()
+            checkers.push(move)
+            entry = self.tablebase.probe(checkers) if self.tablebase is not None else None
+            if entry is not None:
+                scores[index] = -tablebase_score(*entry, ply+1)
+            elif checkers.legal_moves() == []: # the oponent can't move, so it lost
+                scores[index] = WIN_SCORE - (ply+1)
+            else:
+                codes.append(board_codes(checkers.board))
+                leaves.append(index)
+            checkers.pop()
+        if leaves != []:
+            for index, score in zip(leaves, batch_evaluate(np.stack(codes), checkers.turn_oponent()).tolist()):
+                scores[index] = -score
+        best_index = max(range(len(turns)), key=scores.__getitem__)
+        return scores[best_index], best_index
+
+    def search(self, checkers, depth=None):
+        # returns the best turn (Move object) for the player with the turn and its score,
+        # or (None, score) if the player has no moves
+        depth = self.depth if depth is None else depth
+        self.searched_nodes = 0
+        turns = self.turns(checkers)
+        if turns == []:
+            return None, -WIN_SCORE
+        if self.workers > 1 and len(turns) > 1:
+            return self.parallel_search(checkers, turns, depth)
+        best_move, best_score = turns[0], -WIN_SCORE - 1
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        for move in turns:
+            score = self.search_turn(checkers, move, depth-1, -beta, -alpha, 1)
+            if score > best_score:
+                best_move, best_score = move, score
+            alpha = max(alpha, score)
+        return best_move, best_score
+
+    def iterative_search(self, checkers, time_budget=None, max_depth=None):
+        # yields the (depth, best turn, score) of searches one ply deeper each time, until the maximum depth,
+        # a forced win or loss, or the end of the time budget (which stops the search in progress).
+        # The transposition table keeps the best turns of every depth, so they are searched first in the next one
+        max_depth = max_depth if max_depth is not None else (MAX_DEPTH if time_budget is not None else self.depth)
+        self.deadline = time.time() + time_budget if time_budget is not None else None
+        try:
+            for depth in range(1, max_depth+1):
+                move, score = self.search(checkers, depth)
+                yield depth, move, score
+                if move is None or abs(score) > WIN_SCORE - MAX_DEPTH:
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline = None
+
+    def best_move(self, checkers):
+        # returns the best turn (Move object) for the player with the turn
+        # (the best one found within the time budget, if the engine has one)
+        if self.time_budget is not None:
+            best_move = self.turns(checkers)[0]
+            for _, move, _ in self.iterative_search(checkers, self.time_budget, self.depth):
+                best_move = move if move is not None else best_move
+            return best_move
+        best_move, _ = self.search(checkers)
+        return best_move
+
+    def choose_move(self, checkers, legal_moves):
+        # returns the next step of the best turn (so the Engine can be used as a policy)
+        if checkers.mid_move_piece == None or self.planned_moves == [] or self.planned_moves[0] not in legal_moves:
+            self.planned_moves = self.best_move(checkers).steps()
+        return self.planned_moves.pop(0)
+
+    # PARALLEL ROOT SEARCH ---------------------------------------------------------------------------
+    # The first turn is searched alone, and then the other turns are searched at the same time, one per
+    # process. The processes share the best score found so far (alpha), so every turn is searched
+    # with the narrowest window known when it starts. The position is sent to the processes as
+    # a compact state (see Checkers.compact_state), and every process keeps its own transposition table.
+
+    def process_pool(self):
+        # returns the pool of processes of the root search, creating it if needed
+        if self.pool is None:
+            self.shared_alpha = multiprocessing.Value('q', -WIN_SCORE - 1)
+            tablebase_path = self.tablebase.path if self.tablebase is not None else None
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_search_worker,
+                                            initargs=(self.shared_alpha, self.max_table_size, self.majority_capture, tablebase_path))
+        return self.pool
+
+    def parallel_search(self, checkers, turns, depth):
+        # returns the best turn and its score, searching the turns in the pool of processes
+        pool = self.process_pool()
+        self.shared_alpha.value = -WIN_SCORE - 1
+        state = checkers.compact_state()
+        first_result = pool.submit(search_root_turn, state, turns[0], depth).result()
+        futures = [pool.submit(search_root_turn, state, move, depth) for move in turns[1:]]
+        results = [first_result] + [future.result() for future in futures]
+        self.searched_nodes = sum(searched_nodes for _, _, searched_nodes in results)
+        # only the scores above the window's alpha are exact, the others are upper bounds
+        best_move, best_score = turns[0], first_result[0]
+        for move, (score, is_exact, _) in zip(turns, results):
+            if is_exact and score > best_score:
+                best_move, best_score = move, score
+        return best_move, best_score
+
+    def close(self):
+        # stops the pool of processes of the root search (if there is one)
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __getstate__(self):
+        # the pool of processes can't be sent to other processes
+        state = dict(self.__dict__)
+        state['pool'], state['shared_alpha'] = None, None
+        return state
+
+_worker_engine = None   # the Engine of a root search process
+_shared_alpha = None    # the best score found by all the root search processes
+
+def init_search_worker(shared_alpha, max_table_size, majority_capture, tablebase_path):
+    # prepares a root search process
+    global _worker_engine, _shared_alpha
+    signal.signal(signal.SIGTERM, signal.SIG_DFL) # (see run_background_search)
+    tablebase = Tablebase(tablebase_path) if tablebase_path is not None else None
+    _worker_engine = Engine(max_table_size=max_table_size, majority_capture=majority_capture, tablebase=tablebase)
+    _shared_alpha = shared_alpha
+
+def search_root_turn(state, move, depth):
+    # searches a turn of the position of a compact state with the best score found so far as alpha,
+    # and returns its score, if the score is exact and the number of searched positions
+    checkers = checkers_from_state(state)
+    alpha, beta = _shared_alpha.value, WIN_SCORE + 1
+    _worker_engine.searched_nodes = 0
+    score = _worker_engine.search_turn(checkers, move, depth-1, -beta, -alpha, 1)
+    with _shared_alpha.get_lock():
+        if score > _shared_alpha.value:
+            _shared_alpha.value = score
+    return score, score > alpha, _worker_engine.searched_nodes
+
+# BACKGROUND SEARCH ----------------------------------------------------------------------------------
+
+class BackgroundSearch:
+    """
+    BACKGROUND SEARCH
+    -----------------
+    This object runs the iterative deepening search of an Engine
+    in another process, so the game loop doesn't stop while the
+    engine thinks. The process sends the best turn of every finished depth,
+    and the poll method, which never waits, collects them.
+
+    When the engine's time budget is over, poll returns the best turn
+    found so far (or the first turn, if not even the first depth
+    was searched), so the engine always answers within the budget.
+    """
+
+    def __init__(self, engine, checkers):
+        self.time_budget = engine.time_budget   # the seconds the search can take
+        self.started_at = time.time()           # when the search started
+        self.fallback_move = engine.turns(checkers)[0] # the answer if no depth is searched in time
+        self.best_move = None                   # the best turn of the deepest finished search
+        self.best_score = None                  # its score
+        self.depth = 0                          # the deepest finished search
+        self.finished = False                   # if the process has no deeper search to make
+        self.results = multiprocessing.Queue()
+        tablebase_path = engine.tablebase.path if engine.tablebase is not None else None
+        settings = (engine.depth, engine.max_table_size, engine.majority_capture, tablebase_path)
+        self.process = multiprocessing.Process(target=run_background_search, daemon=True,
+                                               args=(checkers.compact_state(), settings, self.time_budget*DEADLINE_MARGIN, self.results))
+        self.process.start()
+
+    def poll(self):
+        # returns the chosen turn if the search is over (or out of time), or None if it is still going on
+        while True:
+            try:
+                depth, move, score = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if depth is None:
+                self.finished = True
+            else:
+                self.depth, self.best_move, self.best_score = depth, move, score
+        if self.finished or time.time() - self.started_at >= self.time_budget:
+            self.stop()
+            return self.best_move if self.best_move is not None else self.fallback_move
+        return None
+
+    def stop(self):
+        # stops the process of the search (killing it, if it didn't restore the default SIGTERM handler yet)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(STOP_TIMEOUT)
+            if self.process.is_alive():
+                self.process.kill()
+        self.process.join()
+
+def run_background_search(state, settings, time_budget, results):
+    # searches the position of a compact state, deeper and deeper, sending the results of every depth
+    # (a process forked from the game inherits its SIGTERM handler, which may not end the process,
+    # like the one of SDL that only queues a quit event, so the default one is restored for stop to end it)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    max_depth, max_table_size, majority_capture, tablebase_path = settings
+    tablebase = Tablebase(tablebase_path) if tablebase_path is not None else None
+    engine = Engine(max_table_size=max_table_size, majority_capture=majority_capture, tablebase=tablebase)
+    for depth, move, score in engine.iterative_search(checkers_from_state(state), time_budget, max_depth):
+        results.put((depth, move, score))
+    results.put((None, None, None))
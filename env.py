@@ -0,0 +1,178 @@
+import random
+import numpy as np
+from checkers import Checkers, DRAW_ROUNDS
+from compact_board import CompactBoard, board_codes
+from bitboard import DIRECTIONS
+
+# VECTORIZED ENVIRONMENT --------------------------------------------------------------------------
+# N games played at once by a learning agent, with a gym-like interface (reset and step).
+#
+# An action is a step (selected_pos, released_pos) given to Checkers.make_move, encoded as a fixed index:
+# the dark tile of the piece, the direction (see bitboard.DIRECTIONS) and the distance of the landing tile,
+#   action = (dark tile index * directions + direction) * max distance + distance - 1
+# so the same index is always the same step, and the legal steps of a game are given as a mask of the indexes.
+#
+# An observation is a stack of (width, height) planes: white's men, white's kings, black's men,
+# black's kings, the piece that must continue a capture and the player with the turn (ones if it is white).
+# The observations of the N games are written in one buffer, allocated only once.
+
+PLANES = 6
+WHITE_MEN, WHITE_KINGS, BLACK_MEN, BLACK_KINGS, MID_MOVE, WHITE_TURN = range(PLANES)
+
+WIN_REWARD = 1.0        # the reward of the step that wins the game
+ILLEGAL_REWARD = -1.0   # the reward of an illegal step (which loses the game)
+
+_action_tables = {}
+
+def action_tables(board_shape):
+    # returns (computing it only once per board shape) the (from, to) step of every action index
+    # (as two (A, 2) arrays, with landing tiles outside of the board for the actions that are never legal),
+    # and the dict of the action index of every step
+    board_shape = tuple(board_shape)
+    if board_shape not in _action_tables:
+        distances = max(board_shape) - 1
+        steps_from, steps_to, indexes = [], [], {}
+        dark_tiles = [(i, j) for j in range(board_shape[1]) for i in range(board_shape[0]) if (i+j)%2 == 1]
+        for pos in dark_tiles:
+            for di, dj in DIRECTIONS:
+                for dist in range(1, distances+1):
+                    to_pos = (pos[0] + di*dist, pos[1] + dj*dist)
+                    indexes[(pos, to_pos)] = len(steps_from)
+                    steps_from.append(pos)
+                    steps_to.append(to_pos)
+        _action_tables[board_shape] = (np.array(steps_from), np.array(steps_to), indexes)
+    return _action_tables[board_shape]
+
+def encode_action(board_shape, selected_pos, released_pos):
+    # returns the action index of a step
+    return action_tables(board_shape)[2][(tuple(selected_pos), tuple(released_pos))]
+
+def decode_action(board_shape, action):
+    # returns the (selected_pos, released_pos) step of an action index
+    steps_from, steps_to, _ = action_tables(board_shape)
+    return tuple(steps_from[action].tolist()), tuple(steps_to[action].tolist())
+
+class CheckersEnv:
+    """
+    CHECKERS ENVIRONMENT
+    --------------------
+    This object plays N games of checkers at once, for a learning agent.
+    step takes an action index for every game, makes its steps with
+    Checkers.make_move (following the round flow of the GameWrapper
+    states machine), and returns the observations, the rewards of the
+    players that made the steps, and which games ended. A game that ends
+    starts again right away, so every game always has a step to make
+    (the final position and the winner are in the info of that step).
+
+    The observations, the legal actions masks, the rewards and the ends
+    are buffers allocated only once, and every step overwrites them
+    (so they must be copied to be kept). Its int8 backend keeps the
+    pieces as the codes the observations are computed from, so a step
+    allocates nothing for them. And since the steps are never undone, the
+    undo information of the finished turns is forgotten (like in the
+    game server), so the games don't grow along the rounds.
+
+    A game that is a draw by the draw rules (see Checkers.is_draw) ends
+    in a draw (terminated, with no reward), a game that reaches max_rounds
+    ends in a draw too (truncated), and an illegal step loses the game.
+    """
+
+    def __init__(self, num_envs, board_shape=(8,8), backend='int8', max_rounds=500, seed=None, draw_rounds=DRAW_ROUNDS):
+        self.num_envs = num_envs
+        self.board_shape = board_shape
+        self.backend = backend
+        self.max_rounds = max_rounds    # the rounds after which a game is a draw
+        self.draw_rounds = draw_rounds  # the rounds without a capture or a man move after which a game is a draw
+        self.random = random.Random(seed)
+        steps_from, _, _ = action_tables(board_shape)
+        self.num_actions = len(steps_from)
+        self.games = [None] * num_envs  # the Checkers object of every game
+        # buffers
+        self.codes = np.zeros((num_envs,) + tuple(board_shape), dtype=np.int8)                  # the pieces of every game
+        self.observations = np.zeros((num_envs, PLANES) + tuple(board_shape), dtype=np.float32)
+        self.action_masks = np.zeros((num_envs, self.num_actions), dtype=bool)                  # the legal actions of every game
+        self.players = np.zeros(num_envs, dtype=np.int8)                                        # the player with the turn of every game
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.terminated = np.zeros(num_envs, dtype=bool)
+        self.truncated = np.zeros(num_envs, dtype=bool)
+
+    def reset(self, seed=None):
+        # starts every game again, returning the observations and the infos
+        if seed is not None:
+            self.random.seed(seed)
+        for index in range(self.num_envs):
+            self.reset_game(index)
+        self.write_observations()
+        return self.observations, [{} for _ in range(self.num_envs)]
+
+    def reset_game(self, index):
+        # starts a game again
+        checkers = Checkers(self.board_shape, backend=self.backend, draw_rounds=self.draw_rounds)
+        checkers.update_moves()
+        checkers.advance_round()
+        self.games[index] = checkers
+        self.update_game(index)
+
+    def update_game(self, index):
+        # copies the pieces, the player with the turn and the legal actions of a game to the buffers
+        checkers = self.games[index]
+        if isinstance(checkers.board, CompactBoard):
+            self.codes[index] = checkers.board.tiles
+        else:
+            self.codes[index] = board_codes(checkers.board)
+        self.players[index] = checkers.player_turn()
+        _, _, indexes = action_tables(self.board_shape)
+        self.action_masks[index] = False
+        for step in checkers.legal_moves():
+            self.action_masks[index, indexes[step]] = True
+
+    def write_observations(self):
+        # writes the planes of every game in the observations buffer, from the codes and players buffers
+        observations = self.observations
+        for plane, code in [(WHITE_MEN, 1), (WHITE_KINGS, 2), (BLACK_MEN, -1), (BLACK_KINGS, -2)]:
+            np.equal(self.codes, code, out=observations[:, plane], casting='unsafe')
+        observations[:, MID_MOVE] = 0
+        for index, checkers in enumerate(self.games):
+            if checkers.mid_move_piece is not None:
+                observations[(index, MID_MOVE) + tuple(checkers.mid_move_piece[0])] = 1
+        observations[:, WHITE_TURN] = (self.players == 1)[:, None, None]
+
+    def step(self, actions):
+        # makes a step (an action index) in every game, returning the observations, the rewards of the players
+        # that made the steps, which games ended (terminated, by a win or a draw, or truncated, by the rounds limit) and the infos
+        self.rewards[:] = 0
+        self.terminated[:] = False
+        self.truncated[:] = False
+        infos = [{} for _ in range(self.num_envs)]
+        for index, action in enumerate(actions):
+            checkers = self.games[index]
+            player = checkers.player_turn()
+            if not self.action_masks[index, action]: # the illegal step loses the game
+                self.rewards[index] = ILLEGAL_REWARD
+                self.terminated[index] = True
+                infos[index] = {'winner': 3 - player, 'illegal': True}
+            elif checkers.make_move(*decode_action(self.board_shape, action)): # the turn ended, so a new round starts
+                checkers.update_moves()
+                checkers.advance_round()
+                checkers.forget_history() # the steps are never undone, so a game doesn't grow along the rounds
+                if checkers.legal_moves() == []: # the oponent can't move, so the player won
+                    self.rewards[index] = WIN_REWARD
+                    self.terminated[index] = True
+                    infos[index] = {'winner': player}
+                elif checkers.is_draw():
+                    self.terminated[index] = True
+                    infos[index] = {'winner': 0, 'draw': True}
+                elif checkers.round >= self.max_rounds:
+                    self.truncated[index] = True
+                    infos[index] = {'winner': 0}
+            if self.terminated[index] or self.truncated[index]:
+                infos[index]['final_codes'] = board_codes(checkers.board)
+                self.reset_game(index)
+            else:
+                self.update_game(index)
+        self.write_observations()
+        return self.observations, self.rewards, self.terminated, self.truncated, infos
+
+    def sample_actions(self):
+        # returns a random legal action for every game
+        return [self.random.choice(np.flatnonzero(mask).tolist()) for mask in self.action_masks]
@@ -0,0 +1,67 @@
+import numpy as np
+from compact_board import board_codes
+
+# STATIC EVALUATION -------------------------------------------------------------------------------
+# A position is scored from the int8 codes of its pieces (see compact_board.py), in batches:
+# the codes of many positions are stacked in a (B, width, height) array and scored at once,
+# so a search scores all the children of a position with a single call.
+# The score of a piece is its value (material and king count) plus the value of its tile
+# in the piece-square table of its kind (advancement and center control), and the mobility
+# adds a few points per step a piece can make to an empty neighbour tile (the captures are left to the search).
+# The scores are from the point of view of the player with the turn.
+
+MAN_SCORE = 100         # the score of a rank1 piece
+KING_SCORE = 300        # the score of a rank2 piece
+ADVANCEMENT_SCORE = 3   # the score of every row a rank1 piece advanced toward the oponent's home line
+CENTER_SCORE = 5        # the score of a piece in the center of the board
+MOBILITY_SCORE = 1      # the score of every step to an empty tile a player can make
+
+_piece_square_tables = {}
+
+def piece_square_tables(board_shape):
+    # returns (computing it only once per board shape) the (5, width, height) table of the score of every
+    # piece code (plus 2) in every tile, from white's point of view (so black's pieces have negative scores)
+    board_shape = tuple(board_shape)
+    if board_shape not in _piece_square_tables:
+        width, height = board_shape
+        i, j = np.meshgrid(np.arange(width), np.arange(height), indexing='ij')
+        center = ((i >= width//4) & (i < width - width//4) & (j >= height//4) & (j < height - height//4)) * CENTER_SCORE
+        # white's home line is the last row, and it advances toward the oponent's home line (row 0)
+        white_man = MAN_SCORE + ADVANCEMENT_SCORE*(height-1 - j) + center
+        white_king = KING_SCORE + center
+        tables = np.zeros((5, width, height), dtype=np.int32)
+        tables[1 + 2] = white_man
+        tables[2 + 2] = white_king
+        tables[-1 + 2] = -white_man[:, ::-1]  # black's tables are white's ones upside down
+        tables[-2 + 2] = -white_king[:, ::-1]
+        _piece_square_tables[board_shape] = tables
+    return _piece_square_tables[board_shape]
+
+def batch_mobility(codes):
+    # returns, for every position of a (B, width, height) stack of int8 codes, the number of steps
+    # white's pieces can make to an empty neighbour tile minus the number of black's ones
+    batch, width, height = codes.shape
+    empty = np.pad(codes == 0, ((0, 0), (1, 1), (1, 1))) # the tiles outside of the board aren't empty
+    kings = (codes == 2) | (codes == -2)
+    signs = np.sign(codes).astype(np.int32)
+    mobility = np.zeros(batch, dtype=np.int32)
+    for dj, men in [(-1, codes == 1), (1, codes == -1)]: # white's men move toward row 0, and black's toward the last row
+        movers = men | kings
+        for di in [1, -1]:
+            steps = empty[:, 1+di:1+di+width, 1+dj:1+dj+height] & movers
+            mobility += (steps * signs).sum(axis=(1, 2))
+    return mobility
+
+def batch_evaluate(codes, players, mobility=True):
+    # returns the scores of a (B, width, height) stack of int8 codes, from the point of view
+    # of each position's player with the turn (a (B,) array of 1 or 2)
+    batch, width, height = codes.shape
+    tables = piece_square_tables((width, height))
+    scores = tables[codes.astype(np.intp) + 2, np.arange(width)[:, None], np.arange(height)[None, :]].sum(axis=(1, 2))
+    if mobility:
+        scores += MOBILITY_SCORE * batch_mobility(codes)
+    return np.where(np.asarray(players) == 1, scores, -scores)
+
+def evaluate(checkers, mobility=True):
+    # returns the score of the position of a Checkers object, from the point of view of the player with the turn
+    return int(batch_evaluate(board_codes(checkers.board)[None], [checkers.player_turn()], mobility)[0])
@@ -1,4 +1,7 @@
 from checkers import Checkers
+from engine import BackgroundSearch
+from board import board_to_fen
+from pdn import append_game, turns_of_history
 
 class GameWrapper:
     """
@@ -6,20 +9,40 @@ class GameWrapper:
     ------------
     This object controles the Checker object to play out checkers.
     It does that with a number of game states, them being:
-    [new_game, new_round, waiting_for_move, selection, drag_and_place, click_and_place, end_round, game_over, end_game]
+    [new_game, new_round, waiting_for_move, selection, drag_and_place, click_and_place, computer_move, computer_thinking, end_round, game_over, end_game]
 
     Using this game states machine, this object determines when each method
     from the Checkers object should be executed. And finally, with that, 
     eventual alterations to the game's functions related to the playability
     (like adding a menu screen or a starting screen) are facilitated.
+
+    The backend argument chooses how the Checkers object represents its board
+    (see checkers.BOARD_BACKENDS), and the computer_players argument maps
+    the players (1 or 2) that are played by a computer to their Engine objects,
+    which choose their moves instead of the mouse. An Engine with a time budget
+    thinks in another process (the computer_thinking state), so the game
+    loop goes on while it searches.
+
+    Given a record_path, the game is appended to that PDN file by
+    save_record, once the session ends: a game that is over can still
+    be taken back and go on, and then it is the continuation that counts.
+
+    A game is also over when it is a draw (see Checkers.is_draw): then
+    draw is True and the winner is 0, like in the PDN results.
     """
 
-    def __init__(self, board_shape, initial_arrangement=[]):
+    def __init__(self, board_shape, initial_arrangement=[], backend='tiles', computer_players=None, record_path=None):
         self.running = True
         self.board_shape = board_shape
+        self.backend = backend
+        self.computer_players = computer_players if computer_players is not None else {}
+        self.background_search = None   # the search of the computer player that is thinking (if any)
+        self.record_path = record_path  # the PDN file where the games are recorded (None to not record them)
+        self.record_saved = False       # if the current game was already recorded
         self.game_state = self.new_game # initial game state
         self.update(initial_arrangement) # a first update
         self.winner = None
+        self.draw = False   # if the game ended in a draw
 
     @property
     def glowing_tiles(self):
@@ -29,6 +52,10 @@ class GameWrapper:
             glowing_tiles = []
         return glowing_tiles
 
+    def is_waiting_for_input(self):
+        # returns if the game state only changes with new mouse inputs
+        return self.game_state in [self.waiting_for_move, self.selection, self.click_and_place, self.end_game]
+
     def take_inputs(self, mouse_did_pressdown, mouse_did_pressup, mouse_tile_pos):
         self.mouse_did_pressdown = mouse_did_pressdown
         self.mouse_did_pressup = mouse_did_pressup
@@ -41,7 +68,10 @@ class GameWrapper:
 
     def new_game(self, initial_arrangement=None):
         # Starts a new game and game board
-        self.checkers = Checkers(self.board_shape, initial_arrangement)
+        self.checkers = Checkers(self.board_shape, initial_arrangement, self.backend)
+        self.record_saved = False
+        self.draw = False
+        self.initial_fen = board_to_fen(self.checkers.board) if initial_arrangement is not None and len(initial_arrangement) != 0 else None # the first position (if not the initial one)
         self.game_state = self.new_round
         self.selected_tile = None
         self.released_tile = None
@@ -58,7 +88,14 @@ class GameWrapper:
         self.selected_tile2 = None
         self.checkers.update_moves()
         self.checkers.advance_round()
-        self.game_state = self.waiting_for_move
+        if self.checkers.is_draw(): # (end_round already checked that the player with the turn can move)
+            self.draw = True
+            self.game_state = self.game_over
+            return
+        if self.checkers.player_turn() in self.computer_players:
+            self.game_state = self.computer_move
+        else:
+            self.game_state = self.waiting_for_move
         # Prints--------------------------------
         if self.checkers.player_turn() == 1:
             print("--> white's turn")
@@ -116,6 +153,29 @@ class GameWrapper:
                         self.released_tile = None
                         self.game_state = self.waiting_for_move
 
+    def computer_move(self):
+        # The computer player chooses its moves (a whole turn) and makes them,
+        # or starts thinking about them in the background (if it has a time budget)
+        engine = self.computer_players[self.checkers.player_turn()]
+        if engine.time_budget is not None:
+            self.background_search = BackgroundSearch(engine, self.checkers)
+            self.game_state = self.computer_thinking
+        else:
+            self.make_computer_turn(engine.best_move(self.checkers))
+
+    def computer_thinking(self):
+        # Checks (without waiting) if the computer player finished thinking, and if so, makes its moves
+        move = self.background_search.poll()
+        if move is not None:
+            self.background_search = None
+            self.make_computer_turn(move)
+
+    def make_computer_turn(self, move):
+        # Makes the moves of a whole turn chosen by the computer player
+        for selected_pos, released_pos in move.steps():
+            self.checkers.make_move(selected_pos, released_pos)
+        self.game_state = self.end_round
+
     def end_round(self):
         # Finishes the round and checks if the game if over
         if not self.checkers.has_legal_moves():
@@ -125,8 +185,10 @@ class GameWrapper:
 
     def game_over(self):
         # Game over state
-        self.winner = self.checkers.player_turn()
-        if self.checkers.player_turn() == 1:
+        self.winner = 0 if self.draw else self.checkers.player_turn()
+        if self.draw:
+            print("DRAW")
+        elif self.checkers.player_turn() == 1:
             print("WHITE WINS")
         else:
             print("BLACK WINS")
@@ -138,6 +200,43 @@ class GameWrapper:
         #self.game_state = self.new_game
         pass
 
+    # RECORDING ----------------------------------------------------------------------------------
+
+    def save_record(self):
+        # appends the game (finished or not) to the PDN file of the records, once per game
+        if self.record_path is None or self.record_saved:
+            return
+        players = {player: ("Computer" if player in self.computer_players else "Human") for player in [1, 2]}
+        tags = {'Event': "Casual game", 'White': players[1], 'Black': players[2]}
+        if self.initial_fen is not None:
+            tags['FEN'] = self.initial_fen
+        append_game(self.record_path, turns_of_history(self.checkers.moves_history), self.board_shape, self.winner, tags)
+        self.record_saved = True
+
+    # TAKEBACK ----------------------------------------------------------------------------------
+
+    def takeback(self):
+        # Undoes the last turn (and the computer players' turns before it, if any),
+        # and waits again for the move of the player that made it
+        if self.background_search is not None:
+            self.background_search.stop()
+            self.background_search = None
+        while self.checkers.moves_history != []:
+            turn_round = self.checkers.moves_history[-1][-1]
+            while self.checkers.moves_history != [] and self.checkers.moves_history[-1][-1] == turn_round:
+                self.checkers.pop()
+            if self.checkers.player_turn() not in self.computer_players:
+                break
+        self.selected_tile = None
+        self.released_tile = None
+        self.selected_tile2 = None
+        self.winner = None
+        self.draw = False
+        if self.checkers.player_turn() in self.computer_players:
+            self.game_state = self.computer_move
+        else:
+            self.game_state = self.waiting_for_move
+
     # DEBUGGING ----------------------------------------------------------------------------------
 
     def print_debugs(self):
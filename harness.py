@@ -0,0 +1,111 @@
+import os
+import pygame
+
+# HEADLESS HARNESS --------------------------------------------------------------------------------
+# Drives the GameWrapper states machine the same way as the game loop of main.py, but without a
+# window: the mouse events come from a synthetic input stream, and the frames are rendered by a
+# NullRenderer (or by the real Renderer in a screen of SDL's dummy video driver).
+# An input stream is a list of (mouse_did_pressdown, mouse_did_pressup, mouse_tile_pos) frames.
+
+def headless_screen(screen_shape):
+    # returns a screen that isn't shown, using SDL's dummy video driver
+    # (unless another driver was chosen in the SDL_VIDEODRIVER environment variable)
+    if not os.environ.get('SDL_VIDEODRIVER'):
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pygame.init()
+    return pygame.display.set_mode(screen_shape)
+
+class NullRenderer:
+    """
+    NULL RENDERER
+    -------------
+    This object takes the place of the Renderer when nothing needs to be
+    drawn: it maps the mouse positions to tiles in the same way,
+    but its frames only count themselves.
+    """
+
+    def __init__(self, screen_shape, board_shape):
+        self.board_shape = board_shape
+        self.tile_width = int(screen_shape[0]/self.board_shape[0])
+        self.tile_height = int(screen_shape[1]/self.board_shape[1])
+        self.frames = 0     # the number of rendered frames
+
+    def map_tile(self, mouse_pos):
+        # This function maps a mouse position to a tile position
+        i = int(mouse_pos[0]/self.tile_width)
+        j = int(mouse_pos[1]/self.tile_height)
+        return (i, j)
+
+    def invalidate(self):
+        pass
+
+    def render(self, screen, game):
+        # counts the frame, without drawing anything (and so without updated rectangles)
+        self.frames += 1
+        return []
+
+# SYNTHETIC INPUTS --------------------------------------------------------------------------------
+
+def press(pos, frames=1):
+    # the frames of a mouse button press in the tile pos
+    return [(True, False, pos)] * frames
+
+def release(pos, frames=1):
+    # the frames of a mouse button release in the tile pos
+    return [(False, True, pos)] * frames
+
+def idle(pos, frames=1):
+    # the frames without mouse events, with the mouse in the tile pos
+    return [(False, False, pos)] * frames
+
+def click(pos, frames=1):
+    # the frames of a quick click in the tile pos
+    return press(pos, frames) + release(pos, frames)
+
+def move_inputs(from_pos, to_pos, frames=1, wait_frames=0):
+    # the frames of a move made with two clicks: in the piece at from_pos and in the tile to_pos
+    return click(from_pos, frames) + idle(from_pos, wait_frames) + click(to_pos, frames) + idle(to_pos, wait_frames)
+
+def drag_inputs(from_pos, to_pos, frames=1, wait_frames=0):
+    # the frames of a move made by dragging the piece at from_pos to the tile to_pos
+    return press(from_pos, frames) + release(to_pos, frames) + idle(to_pos, wait_frames)
+
+def turn_inputs(move, frames=1, wait_frames=0):
+    # the frames of every move of a whole turn (Move object)
+    inputs = []
+    for selected_pos, released_pos in move.steps():
+        inputs += move_inputs(selected_pos, released_pos, frames, wait_frames)
+    return inputs
+
+# DRIVING -----------------------------------------------------------------------------------------
+
+def step(game, renderer, screen, inputs_frame):
+    # runs one frame of the game loop with the given inputs
+    game.take_inputs(*inputs_frame)
+    game.update()
+    renderer.render(screen, game)
+
+def drive(game, renderer, screen, inputs):
+    # runs one frame of the game loop for each frame of an input stream,
+    # returning the number of frames
+    for inputs_frame in inputs:
+        step(game, renderer, screen, inputs_frame)
+    return len(inputs)
+
+def settle(game, renderer, screen, max_frames=100):
+    # runs frames without mouse events until the game waits for the mouse (or for max_frames frames),
+    # returning the number of frames
+    frames = 0
+    while not game.is_waiting_for_input() and frames < max_frames:
+        step(game, renderer, screen, (False, False, (0, 0)))
+        frames += 1
+    return frames
+
+def play_turns(game, renderer, screen, turns):
+    # plays whole turns (Move objects) through the mouse inputs, settling the game before each one,
+    # and returns the number of frames
+    frames = settle(game, renderer, screen)
+    for move in turns:
+        frames += drive(game, renderer, screen, turn_inputs(move))
+        frames += settle(game, renderer, screen)
+    return frames
@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import signal
+import time
+import tracemalloc
+from server import GameServer
+
+# LOAD TEST ---------------------------------------------------------------------------------------
+# Many clients play random games at once in a game server (one started in its own process,
+# unless a port of another one is given), timing every move from its request to its answer.
+# The server runs apart from the clients so its event loop only serves the moves.
+
+async def request(reader, writer, message):
+    # sends a request to the server and returns its answer (skipping the events of the other players)
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    while True:
+        answer = json.loads(await reader.readline())
+        if 'event' not in answer:
+            return answer
+
+async def play_client(host, port, games, max_rounds, seed, latencies):
+    # a client that plays both players of random games, one after the other,
+    # appending the latency of every move to latencies
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    moves = 0
+    for _ in range(games):
+        state = await request(reader, writer, {'op': 'new', 'solo': True})
+        while state['winner'] is None and state['round'] < max_rounds:
+            selected_pos, released_pos = rng.choice(state['moves'])
+            start_time = time.perf_counter()
+            state = await request(reader, writer, {'op': 'move', 'from': selected_pos, 'to': released_pos})
+            latencies.append(time.perf_counter() - start_time)
+            if not state['ok']:
+                raise RuntimeError(state['error'])
+            moves += 1
+    await request(reader, writer, {'op': 'leave'})
+    writer.close()
+    await writer.wait_closed()
+    return moves
+
+def percentile(values, fraction):
+    # returns the value below which the given fraction of the values are
+    ordered = sorted(values)
+    return ordered[min(len(ordered)-1, int(fraction*len(ordered)))]
+
+def session_memory(server, sessions, rounds, seed=0):
+    # returns the memory (in bytes) taken by each session of the server, after a few rounds of random moves
+    rng = random.Random(seed)
+    tracemalloc.start()
+    start_memory, _ = tracemalloc.get_traced_memory()
+    new_sessions = [server.new_session() for _ in range(sessions)]
+    for session in new_sessions:
+        while session.winner is None and session.checkers.round < rounds:
+            session.make_move(session.checkers.player_turn(), *rng.choice(session.checkers.legal_moves()))
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for session in new_sessions:
+        del server.sessions[session.game_id]
+    return (memory - start_memory) / sessions
+
+async def serve_in_any_port(host, ports):
+    # serves forever in any free port, putting the port in the ports queue
+    server = await GameServer().start(host, 0)
+    ports.put(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+def run_server(host, ports):
+    # the server process: a process forked from one with pygame inherits its SIGTERM handler,
+    # which ignores terminate, so the default one is restored
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    asyncio.run(serve_in_any_port(host, ports))
+
+async def load_test(clients, games, max_rounds, host='127.0.0.1', port=None, seed=0):
+    # runs the clients at once, returning the latencies of their moves, the number of moves and the elapsed time
+    server_process = None
+    if port is None: # a server in its own process, in any free port
+        ports = multiprocessing.Queue()
+        server_process = multiprocessing.Process(target=run_server, args=(host, ports), daemon=True)
+        server_process.start()
+        port = await asyncio.get_running_loop().run_in_executor(None, ports.get)
+    try:
+        latencies = []
+        start_time = time.perf_counter()
+        moves = await asyncio.gather(*[play_client(host, port, games, max_rounds, seed + client, latencies) for client in range(clients)])
+        elapsed_time = time.perf_counter() - start_time
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.join()
+    return latencies, sum(moves), elapsed_time
+
+def report(latencies, moves, elapsed_time, clients, memory=None):
+    # returns the throughput, the latencies and the memory per session as text
+    lines = [
+        "sessions:    %d" % clients,
+        "moves:       %d in %.2fs" % (moves, elapsed_time),
+        "moves/sec:   %.2f" % (moves/max(elapsed_time, 1e-9)),
+        "p50:         %.3fms" % (1000*percentile(latencies, 0.50)),
+        "p99:         %.3fms" % (1000*percentile(latencies, 0.99)),
+    ]
+    if memory is not None:
+        lines.append("memory:      %.1fKB per session" % (memory/1024))
+    return "\n".join(lines)
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Plays random games in many concurrent sessions of a game server, and reports the moves latency.")
+    parser.add_argument('-c', '--clients', type=int, default=200, help="number of concurrent clients (a session each)")
+    parser.add_argument('-n', '--games', type=int, default=1, help="games played by each client")
+    parser.add_argument('--max-rounds', type=int, default=200, help="rounds after which a game is left")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help="port of a running server (by default, a server is started in its own process)")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(args)
+
+if __name__ == '__main__':
+    args = parse_args()
+    latencies, moves, elapsed_time = asyncio.run(load_test(args.clients, args.games, args.max_rounds, args.host, args.port, args.seed))
+    memory = session_memory(GameServer(), args.clients, 40, args.seed) if args.port is None else None
+    print(report(latencies, moves, elapsed_time, args.clients, memory))
@@ -1,6 +1,24 @@
+import argparse
 import pygame
 from game_wrapper import GameWrapper
 from renderer import Renderer
+from checkers import BOARD_BACKENDS
+from engine import Engine
+from profiling import Profiler
+
+# Settings
+parser = argparse.ArgumentParser(description="Plays checkers in a desktop window.")
+parser.add_argument('--fps', type=int, default=60, help="maximum frames per second")
+parser.add_argument('--no-idle-wait', action='store_true', help="keep running frames while the game waits for the mouse")
+parser.add_argument('--record', default=None, help="PDN file where the games are recorded")
+parser.add_argument('--backend', default='tiles', choices=list(BOARD_BACKENDS), help="representation of the board")
+parser.add_argument('--computer', default=None, choices=['white', 'black', 'both'], help="players played by the computer")
+parser.add_argument('--think', type=float, default=1.0, help="seconds the computer thinks per turn")
+parser.add_argument('--profile', default=None, help="profiles the game, writing PROFILE.json and PROFILE.folded (for a flame graph) at the end")
+args = parser.parse_args()
+
+# Profiling (installed before the game objects are created)
+profiler = Profiler().install() if args.profile is not None else None
 
 pygame.init()
 
@@ -15,16 +33,27 @@ pygame.display.set_icon(icon)
 
 # Game loop objects
 board_shape = (8,8)
-game = GameWrapper(board_shape) # game state machine
+computer_players = {player: Engine(depth=30, time_budget=args.think) for player, name in [(1, 'white'), (2, 'black')] if args.computer in [name, 'both']}
+game = GameWrapper(board_shape, backend=args.backend, computer_players=computer_players, record_path=args.record) # game state machine
 renderer = Renderer(screen_shape, board_shape) # render objects
 
 # GAME LOOP
+clock = pygame.time.Clock()
+mouse_did_pressdown, mouse_did_pressup, mouse_tile_pos = False, False, (0, 0)
 running = True
 while running:
     # EVENTS
-    for event in pygame.event.get():
+    if game.is_waiting_for_input() and not args.no_idle_wait:
+        events = [pygame.event.wait()] + pygame.event.get() # sleep until something happens
+    else:
+        events = pygame.event.get()
+    for event in events:
         if event.type == pygame.QUIT:
             running = False
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE:
+            game.takeback()
+        if event.type in [pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWSHOWN, pygame.WINDOWRESTORED]:
+            renderer.invalidate() # the window was covered or minimized, so its contents are redrawn
         mouse_did_pressdown = (event.type == pygame.MOUSEBUTTONDOWN)
         mouse_did_pressup = (event.type == pygame.MOUSEBUTTONUP)
         mouse_tile_pos = renderer.map_tile(pygame.mouse.get_pos())
@@ -37,4 +66,20 @@ while running:
         running = False
 
     # RENDERING   
-    renderer.render(screen, game)
\ No newline at end of file
+    renderer.render(screen, game)
+    clock.tick(args.fps)
+
+# the game is recorded when the window is closed, finished or not (it could be taken back after its end)
+game.save_record()
+
+# the processes of the computer players are stopped
+if game.background_search is not None:
+    game.background_search.stop()
+for engine in computer_players.values():
+    engine.close()
+
+if profiler is not None:
+    profiler.uninstall()
+    print(profiler.report())
+    profiler.save_json(args.profile + '.json')
+    profiler.save_folded(args.profile + '.folded')
@@ -0,0 +1,46 @@
+class Move:
+    """
+    MOVE
+    ----
+    This object represents a whole turn of a player, that is,
+    the moves of a piece until it has no capture continuations.
+
+    It is defined by the piece's starting position (from_pos),
+    the positions where the piece lands after each step (landings),
+    the positions of the pieces captured in each step (captures, empty
+    for a move without capture), and if the piece is promoted at the end (promotes).
+    """
+
+    __slots__ = ('from_pos', 'landings', 'captures', 'promotes')
+
+    def __init__(self, from_pos, landings, captures=(), promotes=False):
+        self.from_pos = from_pos            # the starting position of the piece
+        self.landings = tuple(landings)     # the positions the piece lands in, step by step
+        self.captures = tuple(captures)     # the positions of the captured pieces, step by step
+        self.promotes = promotes            # if the piece is promoted at the end of the move
+
+    @property
+    def to_pos(self):
+        # returns the final position of the piece
+        return self.landings[-1]
+
+    def is_capture(self):
+        # returns if the move captures any piece
+        return self.captures != ()
+
+    def steps(self):
+        # returns the move as a list of (selected_pos, released_pos) steps,
+        # the way they are given to Checkers.make_move
+        starts = (self.from_pos,) + self.landings[:-1]
+        return list(zip(starts, self.landings))
+
+    def __eq__(self, other):
+        return (isinstance(other, Move) and self.from_pos == other.from_pos and self.landings == other.landings
+                and self.captures == other.captures and self.promotes == other.promotes)
+
+    def __hash__(self):
+        return hash((self.from_pos, self.landings, self.captures, self.promotes))
+
+    def __repr__(self):
+        return "Move(%s -> %s, captures=%s%s)" % (self.from_pos, " -> ".join(str(pos) for pos in self.landings),
+                                                  list(self.captures), ", promotes" if self.promotes else "")
@@ -0,0 +1,146 @@
+import re
+from move import Move
+from board import square_tables
+
+# Portable Draughts Notation (PDN) ----------------------------------------------------------------
+# The dark tiles are numbered from 1, row by row from the row j=0 (black's home line),
+# and every row from i=0. A move without capture is written as 'from-to', and a move with
+# capture as every tile it lands in, separated by 'x' ('from x landing x landing ...').
+# White (player1) makes the first move of the game, so it makes the first move of every numbered pair.
+# The board shape is kept in a 'BoardSize' tag ("8x8", if there isn't one), and a game that doesn't start
+# in the initial position keeps its first position in a 'FEN' tag (see board.board_to_fen).
+
+RESULTS = {1: "1-0", 2: "0-1", 0: "1/2-1/2", None: "*"}   # the PDN result of every winner (0 for a draw, None for unfinished games)
+WINNERS = {"1-0": 1, "0-1": 2, "1/2-1/2": 0, "*": None, "2-0": 1, "0-2": 2, "1-1": 0} # (with the results of the 2 points games)
+
+TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}|\([^)]*\)|(?:1-0|0-1|2-0|0-2|1-1|1/2-1/2)(?![-x\d])|\*|\d+\.+|\d+(?:[-x]\d+)+|\S')
+
+def move_to_pdn(move, board_shape):
+    # returns the PDN text of a whole turn (Move object)
+    _, squares = square_tables(board_shape)
+    separator = 'x' if move.is_capture() else '-'
+    return separator.join(str(squares[pos]) for pos in (move.from_pos,) + move.landings)
+
+def pdn_squares(text):
+    # returns the square numbers of a PDN move, and if it is a capture
+    return [int(square) for square in re.split('[-x]', text)], 'x' in text
+
+def find_move(checkers, text):
+    # returns the legal turn (Move object) of the player with the turn written by a PDN move,
+    # or None if there isn't one. A capture can be written with only some of its landings
+    # (like just its first and last tiles), as long as only one legal turn has them
+    tiles, _ = square_tables(checkers.board.shape)
+    squares, is_capture = pdn_squares(text)
+    if any(square < 1 or square >= len(tiles) for square in squares):
+        return None
+    positions = [tiles[square] for square in squares]
+    found = []
+    for move in checkers.generate_moves():
+        if move.from_pos != positions[0] or move.to_pos != positions[-1] or move.is_capture() != is_capture:
+            continue
+        landings = iter(move.landings)
+        if all(pos in landings for pos in positions[1:]): # the written landings are in the move, in order
+            found.append(move)
+    return found[0] if len(found) == 1 else None
+
+def turns_of_history(moves_history):
+    # returns the whole turns (Move objects) of a Checkers.moves_history, joining the steps of each round
+    turns = []
+    last_round = None
+    for move, _, _, _, round in moves_history:
+        if round == last_round:
+            last = turns[-1]
+            turns[-1] = Move(last.from_pos, last.landings + move.landings, last.captures + move.captures, move.promotes)
+        else:
+            turns.append(move)
+        last_round = round
+    return turns
+
+# WRITING -----------------------------------------------------------------------------------------
+
+def game_to_pdn(moves, board_shape, winner=None, tags=None):
+    # returns the PDN text of a game, given its whole turns (Move objects), its winner and its tags
+    tags = dict(tags) if tags is not None else {}
+    tags.setdefault('BoardSize', "%dx%d" % tuple(board_shape))
+    tags['Result'] = RESULTS[winner]
+    lines = ['[%s "%s"]' % (name, str(value).replace('"', '\\"')) for name, value in tags.items()]
+    tokens = []
+    for index, move in enumerate(moves):
+        if index % 2 == 0:
+            tokens.append("%d." % (index//2 + 1))
+        tokens.append(move_to_pdn(move, board_shape))
+    tokens.append(RESULTS[winner])
+    line = ""
+    movetext = []
+    for token in tokens: # lines of at most 80 characters
+        if line != "" and len(line) + 1 + len(token) > 80:
+            movetext.append(line)
+            line = token
+        else:
+            line = token if line == "" else line + " " + token
+    movetext.append(line)
+    return "\n".join(lines + [""] + movetext) + "\n\n"
+
+def append_game(path, moves, board_shape, winner=None, tags=None):
+    # appends the PDN text of a game to a file
+    with open(path, 'a') as pdn_file:
+        pdn_file.write(game_to_pdn(moves, board_shape, winner, tags))
+
+# READING -----------------------------------------------------------------------------------------
+
+class PdnGame:
+    """
+    PDN GAME
+    --------
+    This object is a game read from a PDN file: its tags (a dict),
+    its moves (as the PDN texts of the whole turns, since they can only
+    be turned into Move objects along a replay, see find_move)
+    and its result (a key of WINNERS).
+    """
+
+    def __init__(self, tags, moves, result):
+        self.tags = tags        # the tags of the game, like {'Event': ..., 'BoardSize': '8x8'}
+        self.moves = moves      # the PDN texts of the whole turns
+        self.result = result    # the PDN result ('1-0', '0-1', '1/2-1/2' or '*')
+
+    @property
+    def board_shape(self):
+        # returns the board shape of the game
+        width, height = self.tags.get('BoardSize', "8x8").lower().split('x')
+        return (int(width), int(height))
+
+    @property
+    def winner(self):
+        # returns the winner of the game (0 for a draw, and None for an unfinished game)
+        return WINNERS.get(self.result)
+
+def read_games(pdn_file):
+    # yields the games of a PDN file (or of any iterable of lines), one at a time,
+    # reading only the lines of the current game
+    tags, moves, comment = {}, [], ""
+    for line in pdn_file:
+        if comment != "": # a comment that spans many lines
+            line = comment + " " + line
+            comment = ""
+        if line.count('{') > line.count('}'):
+            comment = line.rstrip('\n')
+            continue
+        stripped = line.strip()
+        if stripped.startswith('['):
+            if moves != []: # a game without a result token
+                yield PdnGame(tags, moves, tags.get('Result', "*"))
+                tags, moves = {}, []
+            for name, value in TAG_PATTERN.findall(stripped):
+                tags[name] = value.replace('\\"', '"')
+            continue
+        for token in TOKEN_PATTERN.findall(stripped):
+            if token[0] in '{(' or token.endswith('.'): # comments, variations and move numbers
+                continue
+            if token in WINNERS:
+                yield PdnGame(tags, moves, token)
+                tags, moves = {}, []
+            elif token[0].isdigit():
+                moves.append(token)
+    if moves != [] or tags != {}:
+        yield PdnGame(tags, moves, tags.get('Result', "*"))
@@ -0,0 +1,113 @@
+import argparse
+import sys
+import time
+from checkers import Checkers, BOARD_BACKENDS
+from board import fen_to_tiles
+from policies import read_script
+
+# The number of leaf positions (after whole turns) from the initial position of a board shape,
+# for every depth starting at 0. They follow this game's rules (rank1 pieces capture backwards,
+# queens fly, captures are obligatory but any capture sequence can be chosen),
+# so they differ from the published counts of other checkers variants
+REFERENCE_COUNTS = {
+    (8, 8): [1, 7, 49, 302, 1469, 7482, 37986, 190146],
+    (10, 10): [1, 9, 81, 810, 8100, 88900, 957965],
+}
+
+# PERFT -----------------------------------------------------------------------------------------
+
+def start_position(board_shape, initial_arrangement=[], backend='tiles', moves=[], player=1):
+    # returns a Checkers object in the first round (like the GameWrapper's first new_round state),
+    # with the given player to move, after playing the given (selected_pos, released_pos) steps
+    checkers = Checkers(board_shape, initial_arrangement, backend)
+    checkers.round = 0 if player == 1 else 1
+    checkers.update_moves()
+    checkers.advance_round()
+    for move in moves:
+        if move not in checkers.legal_moves():
+            raise ValueError("move %s -> %s is not legal in round %d" % (move[0], move[1], checkers.round))
+        checkers.push(move)
+    return checkers
+
+def perft(checkers, depth):
+    # returns the number of positions reached after depth whole turns (a turn with capture
+    # continuations counts once), generating the turns as Move objects
+    if depth == 0:
+        return 1
+    moves = checkers.generate_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        checkers.push(move)
+        nodes += perft(checkers, depth-1)
+        checkers.pop()
+    return nodes
+
+def perft_steps(checkers, depth):
+    # returns the same count as perft, but exploring the turns step by step,
+    # through the capture continuations asked by Checkers.mid_move_piece
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in checkers.legal_moves():
+        ended_turn = checkers.push(move)
+        nodes += perft_steps(checkers, depth-1 if ended_turn else depth)
+        checkers.pop()
+    return nodes
+
+def divide(checkers, depth, steps=False):
+    # returns the (whole turn, count) pairs of every turn from the position
+    count = perft_steps if steps else perft
+    counts = []
+    for move in checkers.generate_moves():
+        checkers.push(move)
+        counts.append((move, count(checkers, depth-1)))
+        checkers.pop()
+    return counts
+
+def reference_count(board_shape, depth):
+    # returns the stored count of the initial position of a board shape (or None, if there isn't one)
+    counts = REFERENCE_COUNTS.get(tuple(board_shape), [])
+    return counts[depth] if depth < len(counts) else None
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Counts the positions reached after a number of turns.")
+    parser.add_argument('-d', '--depth', type=int, default=5, help="number of whole turns")
+    parser.add_argument('--board-size', type=int, nargs=2, default=[8, 8], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--backend', default='tiles', choices=list(BOARD_BACKENDS))
+    parser.add_argument('--fen', default=None, help="FEN text of the position to count from (instead of the initial one)")
+    parser.add_argument('--moves', default=None, help="file of 'i j i j' steps played before counting")
+    parser.add_argument('--divide', action='store_true', help="print the count of every first turn")
+    parser.add_argument('--steps', action='store_true', help="explore the turns step by step")
+    return parser.parse_args(args)
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.divide and args.depth < 1:
+        sys.exit("the divide needs a depth of at least 1")
+    board_shape = tuple(args.board_size)
+    moves = read_script(args.moves) if args.moves is not None else []
+    initial_arrangement, player = fen_to_tiles(args.fen, board_shape) if args.fen is not None else ([], 1)
+    checkers = start_position(board_shape, initial_arrangement, args.backend, moves, player)
+
+    start_time = time.time()
+    if args.divide:
+        counts = divide(checkers, args.depth, args.steps)
+        for move, count in counts:
+            print("%-60s %d" % (move, count))
+        nodes = sum(count for _, count in counts)
+    else:
+        nodes = (perft_steps if args.steps else perft)(checkers, args.depth)
+    elapsed_time = time.time() - start_time
+
+    print("nodes:       %d" % nodes)
+    print("time:        %.2fs" % elapsed_time)
+    print("nodes/sec:   %.0f" % (nodes/max(elapsed_time, 1e-9)))
+    expected = reference_count(board_shape, args.depth) if moves == [] and args.fen is None else None
+    if expected is not None:
+        print("reference:   %d (%s)" % (expected, "ok" if nodes == expected else "MISMATCH"))
+        if nodes != expected:
+            sys.exit(1)
@@ -0,0 +1,74 @@
+import random
+from engine import Engine
+
+class RandomPolicy:
+    """
+    RANDOM POLICY
+    -------------
+    This object chooses a random move among the legal ones.
+    """
+
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def choose_move(self, checkers, legal_moves):
+        # returns one of the legal moves, chosen at random
+        return self.random.choice(legal_moves)
+
+class FirstLegalPolicy:
+    """
+    FIRST LEGAL POLICY
+    ------------------
+    This object always chooses the first legal move, which makes
+    its games completely deterministic.
+    """
+
+    def choose_move(self, checkers, legal_moves):
+        # returns the first of the legal moves
+        return legal_moves[0]
+
+class ScriptedPolicy:
+    """
+    SCRIPTED POLICY
+    ---------------
+    This object plays a given list of (selected_pos, released_pos) moves,
+    in order, and after the list is over, it lets a fallback policy choose
+    the moves (the FirstLegalPolicy by default).
+    """
+
+    def __init__(self, moves, fallback=None):
+        self.moves = list(moves)
+        self.next_move = 0
+        self.fallback = fallback if fallback is not None else FirstLegalPolicy()
+
+    def choose_move(self, checkers, legal_moves):
+        # returns the next scripted move (or the fallback's move, if the script is over)
+        if self.next_move >= len(self.moves):
+            return self.fallback.choose_move(checkers, legal_moves)
+        move = self.moves[self.next_move]
+        self.next_move += 1
+        if move not in legal_moves:
+            raise ValueError("scripted move %s -> %s is not legal in round %d" % (move[0], move[1], checkers.round))
+        return move
+
+def read_script(path):
+    # reads a script of moves, one 'i j i j' move (selected tile, then released tile) per line
+    moves = []
+    with open(path) as script:
+        for line in script:
+            values = [int(value) for value in line.replace(',', ' ').split()]
+            if values != []:
+                moves.append(((values[0], values[1]), (values[2], values[3])))
+    return moves
+
+def make_policy(name, seed=None, script_path=None, depth=4):
+    # builds a policy given its name ('random', 'first', 'scripted' or 'engine')
+    if name == 'random':
+        return RandomPolicy(seed)
+    elif name == 'first':
+        return FirstLegalPolicy()
+    elif name == 'scripted':
+        return ScriptedPolicy(read_script(script_path))
+    elif name == 'engine':
+        return Engine(depth)
+    raise ValueError("unknown policy: %s" % name)
@@ -0,0 +1,177 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import random
+import time
+from checkers import Checkers, BOARD_BACKENDS
+from game_wrapper import GameWrapper
+from renderer import Renderer
+from harness import headless_screen, play_turns
+
+# PROFILING ---------------------------------------------------------------------------------------
+# The instrumented functions are wrapped only while a Profiler is installed, so the game
+# doesn't pay anything for the instrumentation when it isn't profiled.
+# Every call of a GameWrapper state is recorded as 'GameWrapper.<state>', and every frame as 'Renderer.render'.
+
+class Profiler:
+    """
+    PROFILER
+    --------
+    This object records the number of calls and the time spent in the
+    hot paths of the game: each state of the GameWrapper states machine,
+    the moves computation of the boards (of every backend), the movable
+    pieces of the Checkers object and the frames of the Renderer.
+
+    The calls are also recorded by their stack of instrumented calls,
+    with the time spent in each call without its instrumented inner calls,
+    which can be saved as the folded stacks of a flame graph.
+
+    It is installed with install() (or in a with block) and removed
+    with uninstall(), which gives back the original functions.
+    """
+
+    def __init__(self):
+        self.calls = {}     # name -> number of calls
+        self.times = {}     # name -> time (in seconds) spent in the calls, with their inner calls
+        self.stacks = {}    # folded stack ('outer;inner') -> time (in seconds) spent in the inner call itself
+        self.stack = []     # [name, time of the inner calls] of the instrumented calls running
+        self.patched = []   # (class, attribute, original function) of the instrumented functions
+
+    # INSTRUMENTATION ------------------------------------------------------------------------------
+
+    def instrument(self, cls, attribute, name=None):
+        # wraps a function of a class so its calls are recorded, with the given name
+        # (or a function of the instance that returns the name, or 'Class.function' by default)
+        if any(patched_cls is cls and patched_attribute == attribute for patched_cls, patched_attribute, _ in self.patched):
+            return
+        function = cls.__dict__[attribute]
+        name = name if name is not None else "%s.%s" % (cls.__name__, attribute)
+        profiler = self
+        @functools.wraps(function)
+        def instrumented(instance, *args, **kwargs):
+            return profiler.record(name(instance) if callable(name) else name, function, instance, args, kwargs)
+        self.patched.append((cls, attribute, function))
+        setattr(cls, attribute, instrumented)
+
+    def install(self):
+        # instruments the hot paths of the game
+        self.instrument(GameWrapper, 'update', lambda game: "GameWrapper.%s" % game.game_state.__name__)
+        for board_class in BOARD_BACKENDS.values():
+            self.instrument(board_class, 'compute_all_moves')
+            self.instrument(board_class, 'has_legal_moves')
+        self.instrument(Checkers, 'movable_pieces_pos')
+        self.instrument(Renderer, 'render')
+        return self
+
+    def uninstall(self):
+        # gives back the original functions
+        for cls, attribute, function in reversed(self.patched):
+            setattr(cls, attribute, function)
+        self.patched = []
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exception):
+        self.uninstall()
+
+    def record(self, name, function, instance, args, kwargs):
+        # calls the function, recording its time under the given name and under its stack
+        self.stack.append([name, 0.0])
+        start_time = time.perf_counter()
+        try:
+            return function(instance, *args, **kwargs)
+        finally:
+            elapsed_time = time.perf_counter() - start_time
+            folded_stack = ";".join(stack_name for stack_name, _ in self.stack)
+            _, inner_time = self.stack.pop()
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.times[name] = self.times.get(name, 0.0) + elapsed_time
+            self.stacks[folded_stack] = self.stacks.get(folded_stack, 0.0) + elapsed_time - inner_time
+            if self.stack != []:
+                self.stack[-1][1] += elapsed_time
+
+    def reset(self):
+        # forgets the recorded calls
+        self.calls, self.times, self.stacks = {}, {}, {}
+
+    # EXPORTING -----------------------------------------------------------------------------------
+
+    def stats(self):
+        # returns the calls, the total time and the mean time (in milliseconds) of every instrumented name,
+        # from the most to the least time consuming
+        stats = {}
+        for name in sorted(self.times, key=self.times.get, reverse=True):
+            stats[name] = {
+                'calls': self.calls[name],
+                'total_ms': 1000*self.times[name],
+                'mean_ms': 1000*self.times[name]/self.calls[name],
+            }
+        return stats
+
+    def save_json(self, path):
+        # writes the stats as a JSON file
+        with open(path, 'w') as json_file:
+            json.dump(self.stats(), json_file, indent=4)
+            json_file.write('\n')
+
+    def folded_stacks(self):
+        # returns the folded stacks of a flame graph (as read by flamegraph.pl or speedscope):
+        # a line per stack, with the time spent in its last call in microseconds
+        return "".join("%s %d\n" % (stack, round(1e6*stack_time)) for stack, stack_time in sorted(self.stacks.items()))
+
+    def save_folded(self, path):
+        # writes the folded stacks file
+        with open(path, 'w') as folded_file:
+            folded_file.write(self.folded_stacks())
+
+    def report(self):
+        # returns the stats as text
+        lines = ["%-36s %9s %12s %10s" % ("", "calls", "total ms", "mean ms")]
+        for name, name_stats in self.stats().items():
+            lines.append("%-36s %9d %12.2f %10.4f" % (name, name_stats['calls'], name_stats['total_ms'], name_stats['mean_ms']))
+        return "\n".join(lines)
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Profiles random games played through the game states machine and the renderer, without a window.")
+    parser.add_argument('-n', '--games', type=int, default=5, help="number of games to play")
+    parser.add_argument('--board-size', type=int, nargs=2, default=[8, 8], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--backend', default='tiles', choices=list(BOARD_BACKENDS))
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random games")
+    parser.add_argument('--json', default=None, help="JSON file of the stats")
+    parser.add_argument('--folded', default=None, help="folded stacks file (for a flame graph)")
+    return parser.parse_args(args)
+
+if __name__ == '__main__':
+    args = parse_args()
+    board_shape = tuple(args.board_size)
+    screen_shape = (800, 720)
+    screen = headless_screen(screen_shape)
+    # the turns of random games (found before the profiling, so they aren't profiled)
+    rng = random.Random(args.seed)
+    games_turns = []
+    for _ in range(args.games):
+        checkers = Checkers(board_shape, backend=args.backend)
+        checkers.update_moves()
+        checkers.advance_round()
+        turns = []
+        moves = checkers.generate_moves()
+        while checkers.round < 500 and moves != []:
+            turns.append(rng.choice(moves))
+            checkers.push(turns[-1])
+            moves = checkers.generate_moves()
+        games_turns.append(turns)
+    # the same turns played by mouse clicks in the game states machine
+    with Profiler() as profiler, contextlib.redirect_stdout(io.StringIO()): # the states print every round
+        for turns in games_turns:
+            game = GameWrapper(board_shape, backend=args.backend)
+            play_turns(game, Renderer(screen_shape, board_shape), screen, turns)
+    print(profiler.report())
+    if args.json is not None:
+        profiler.save_json(args.json)
+    if args.folded is not None:
+        profiler.save_folded(args.folded)
@@ -11,6 +11,10 @@ class Renderer:
     the tiles (varies with 4 colors) and the pieces (varies with 2 colors).
 
     They are both rendered in various positions to show in screen.
+
+    The tiles without glow are drawn only once, in a cached background
+    surface, and each frame only redraws (and updates in the screen) the
+    tiles whose piece or glow changed since the previous frame.
     """
 
     def __init__(self, screen_shape, board_shape):
@@ -45,6 +49,17 @@ class Renderer:
         self.queen2Img = pygame.image.load('assets/queen2.png')
         self.queen2Img = pygame.transform.scale(self.queen2Img, (self.piece_width, self.piece_height))
 
+        # Cached background with the tiles without glow
+        self.background = pygame.Surface(screen_shape)
+        self.background.fill([255,255,255])
+        for i in range(self.board_shape[0]):
+            for j in range(self.board_shape[1]):
+                self.draw_tile_rect(self.background, (i,j), [])
+
+        # What was drawn in the previous frame
+        self.previous_frame_key = None  # the position key and glowing tiles of the previous frame
+        self.previous_tiles = None      # the (player, rank, glowing) of every tile in the previous frame
+
     def map_tile(self, mouse_pos):
         # This function maps a mouse position to a tile position
         i = int(mouse_pos[0]/self.tile_width)
@@ -82,15 +97,50 @@ class Renderer:
             elif player == 2:
                 screen.blit(self.queen2Img, piece_render_pos)
 
-    def render(self, screen, game):
-        screen.fill([255,255,255])
+    def tile_rect(self, pos):
+        # returns the screen rectangle of a tile
+        return pygame.Rect(pos[0]*self.tile_width, pos[1]*self.tile_height, self.tile_width, self.tile_height)
+
+    def invalidate(self):
+        # forces the next frame to redraw the whole screen
+        self.previous_frame_key = None
+        self.previous_tiles = None
 
+    def render(self, screen, game):
+        # redraws the tiles that changed since the previous frame and updates only them in the screen,
+        # returning the updated rectangles
         glowing_tiles = game.glowing_tiles
+        frame_key = (game.checkers.position_key(), tuple(glowing_tiles))
+        if frame_key == self.previous_frame_key: # nothing changed
+            return []
+
+        tiles = {}
         for i in range(self.board_shape[0]):
             for j in range(self.board_shape[1]):
                 pos = (i,j)
-                self.draw_tile_rect(screen, pos, glowing_tiles)
-                self.draw_piece_img(screen, pos, game.checkers.player_in_pos(pos), game.checkers.rank_in_pos(pos))
+                tiles[pos] = (game.checkers.player_in_pos(pos), game.checkers.rank_in_pos(pos), pos in glowing_tiles)
 
-        pygame.display.flip()
-        pygame.display.update()
\ No newline at end of file
+        if self.previous_tiles is None: # first frame, draw the whole screen
+            screen.blit(self.background, (0, 0))
+            changed_tiles = list(tiles)
+        else:
+            changed_tiles = [pos for pos in tiles if tiles[pos] != self.previous_tiles[pos]]
+
+        dirty_rects = []
+        for pos in changed_tiles:
+            player, rank, glowing = tiles[pos]
+            rect = self.tile_rect(pos)
+            if glowing:
+                self.draw_tile_rect(screen, pos, glowing_tiles)
+            else:
+                screen.blit(self.background, rect, rect)
+            self.draw_piece_img(screen, pos, player, rank)
+            dirty_rects.append(rect)
+
+        if self.previous_tiles is None:
+            pygame.display.flip()
+        elif dirty_rects != []:
+            pygame.display.update(dirty_rects)
+        self.previous_frame_key = frame_key
+        self.previous_tiles = tiles
+        return dirty_rects
@@ -0,0 +1,85 @@
+import argparse
+import sys
+import time
+from checkers import Checkers, BOARD_BACKENDS
+from board import fen_to_tiles
+from pdn import read_games, find_move
+
+# REPLAY ------------------------------------------------------------------------------------------
+
+def initial_checkers(game, backend='bitboard'):
+    # returns a Checkers object at the start of the first turn of a PdnGame
+    # (in the position of its FEN tag, if it has one)
+    if 'FEN' in game.tags:
+        initial_tiles, player = fen_to_tiles(game.tags['FEN'], game.board_shape)
+        checkers = Checkers(game.board_shape, initial_tiles, backend)
+        checkers.round = 0 if player == 1 else 1
+    else:
+        checkers = Checkers(game.board_shape, backend=backend)
+    checkers.update_moves()
+    checkers.advance_round()
+    return checkers
+
+def replay_game(game, backend='bitboard'):
+    # replays a PdnGame from its first position, checking every step of every turn with the
+    # Checkers.make_move rules, and the game's result (a win, or a draw by the rules of Checkers.is_draw).
+    # Returns the number of replayed turns and the error found (None if the game is valid)
+    checkers = initial_checkers(game, backend)
+    for turns, text in enumerate(game.moves):
+        if checkers.legal_moves() == [] or checkers.is_draw():
+            return turns, "move %s after the end of the game" % text
+        move = find_move(checkers, text)
+        if move is None:
+            return turns, "move %s is not legal in round %d" % (text, checkers.round)
+        steps = move.steps()
+        for step, (selected_pos, released_pos) in enumerate(steps):
+            if (selected_pos, released_pos) not in checkers.legal_moves():
+                return turns, "step %s -> %s of move %s is not legal in round %d" % (selected_pos, released_pos, text, checkers.round)
+            ended_turn = checkers.make_move(selected_pos, released_pos)
+            if ended_turn != (step == len(steps)-1):
+                return turns, "move %s doesn't end the turn in round %d" % (text, checkers.round)
+        checkers.update_moves()
+        checkers.advance_round()
+    if checkers.legal_moves() == [] and game.winner != checkers.turn_oponent(): # the player with the turn lost
+        return len(game.moves), "result %s, but the game was won by player %d" % (game.result, checkers.turn_oponent())
+    if game.winner == 0 and not checkers.is_draw(): # the game is a draw by repetition or by the rounds without progress
+        return len(game.moves), "result %s, but the game isn't a draw" % game.result
+    return len(game.moves), None
+
+def replay_files(paths, backend='bitboard'):
+    # yields the (game number, PdnGame, replayed turns, error) of every game of the PDN files
+    number = 0
+    for path in paths:
+        with open(path) as pdn_file:
+            for game in read_games(pdn_file):
+                number += 1
+                turns, error = replay_game(game, backend)
+                yield number, game, turns, error
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Replays the games of PDN files, checking every move.")
+    parser.add_argument('paths', nargs='+', help="PDN files")
+    parser.add_argument('--backend', default='bitboard', choices=list(BOARD_BACKENDS))
+    parser.add_argument('--max-errors', type=int, default=20, help="number of invalid games printed")
+    return parser.parse_args(args)
+
+if __name__ == '__main__':
+    args = parse_args()
+    games, turns, invalid_games = 0, 0, 0
+    start_time = time.time()
+    for number, game, replayed_turns, error in replay_files(args.paths, args.backend):
+        games += 1
+        turns += replayed_turns
+        if error is not None:
+            invalid_games += 1
+            if invalid_games <= args.max_errors:
+                print("game %d (%s): %s" % (number, game.tags.get('Event', "?"), error))
+    elapsed_time = time.time() - start_time
+    print("games:       %d in %.2fs" % (games, elapsed_time))
+    print("invalid:     %d" % invalid_games)
+    print("games/sec:   %.2f" % (games/max(elapsed_time, 1e-9)))
+    print("turns/sec:   %.2f" % (turns/max(elapsed_time, 1e-9)))
+    if invalid_games > 0:
+        sys.exit(1)
@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import json
+from checkers import Checkers, BOARD_BACKENDS, DRAW_ROUNDS
+from board import board_to_fen
+
+# GAME SERVER -------------------------------------------------------------------------------------
+# A TCP server of many independent games. The clients and the server exchange JSON objects,
+# one per line. The requests of a client are:
+#   {"op": "new", "solo": false}          starts a game and plays white in it (or both players, if solo)
+#   {"op": "join", "game": 3}             plays black in a game started by another client
+#   {"op": "move", "from": [i, j], "to": [i, j]}
+#                                         moves a piece, like a mouse press in the tile 'from' dragged to 'to'
+#   {"op": "state"}                       asks for the state of the game
+#   {"op": "leave"}                       leaves the game
+# Every request is answered with {"ok": true, ...the state of the game} or {"ok": false, "error": "..."},
+# and the other client of a game receives {"event": "state", ...the state of the game} after every move.
+# The state of a game is its id, the players of the client, the round, the player with the turn,
+# the FEN text of the position, the legal moves of the round (as [from, to] steps) and the winner
+# (0 for a draw, by repetition or by the rounds without a capture or a man move, see Checkers.is_draw).
+
+class GameSession:
+    """
+    GAME SESSION
+    ------------
+    This object is a game of the server, backed by a Checkers object,
+    and the clients playing it.
+
+    The moves follow the same round flow as the GameWrapper states machine,
+    but they come from the clients' (from, to) tile pairs instead of the mouse.
+    Since the server doesn't take back moves, the undo information of the
+    finished turns (and the positions that can't be repeated anymore)
+    is forgotten, so a session stays small along the game.
+    """
+
+    def __init__(self, game_id, board_shape, backend='bitboard', draw_rounds=DRAW_ROUNDS):
+        self.game_id = game_id  # the id the clients use to join the game
+        self.checkers = Checkers(board_shape, backend=backend, draw_rounds=draw_rounds)
+        self.clients = {}       # player -> Connection object of the client playing it
+        self.winner = None      # the winner, once the game is over (0 for a draw)
+        self.checkers.update_moves()
+        self.checkers.advance_round()
+
+    def make_move(self, player, selected_pos, released_pos):
+        # makes a move of a player, returning the reason it is refused (or None if it was made)
+        if self.winner is not None:
+            return "the game is over"
+        if player != self.checkers.player_turn():
+            return "it is not the turn of player %d" % player
+        if (selected_pos, released_pos) not in self.checkers.legal_moves():
+            return "illegal move"
+        if self.checkers.make_move(selected_pos, released_pos): # the turn ended, so a new round starts
+            self.checkers.update_moves()
+            self.checkers.advance_round()
+            self.checkers.forget_history()
+            if self.checkers.legal_moves() == []: # game over, the player that made the last move wins
+                self.winner = self.checkers.turn_oponent()
+            elif self.checkers.is_draw():
+                self.winner = 0
+        return None
+
+    def state(self, connection=None):
+        # returns the state of the game, as seen by the client of a connection
+        checkers = self.checkers
+        return {
+            'game': self.game_id,
+            'players': connection.players if connection is not None else [],
+            'round': checkers.round,
+            'turn': checkers.player_turn(),
+            'fen': board_to_fen(checkers.board, checkers.player_turn()),
+            'moves': [[list(selected_pos), list(released_pos)] for selected_pos, released_pos in checkers.legal_moves()],
+            'winner': self.winner,
+        }
+
+class Connection:
+    """
+    CONNECTION
+    ----------
+    This object is a client connected to the server:
+    the stream it writes to, and the game and players it plays.
+    """
+
+    __slots__ = ['writer', 'session', 'players']
+
+    def __init__(self, writer):
+        self.writer = writer    # the asyncio StreamWriter of the client
+        self.session = None     # the GameSession the client plays
+        self.players = []       # the players of the game the client plays
+
+    def send(self, message):
+        # writes a message to the client (without waiting for it to be sent)
+        self.writer.write(json.dumps(message).encode() + b'\n')
+
+    async def drain(self):
+        # waits until the messages written to the client are sent (or its buffer is below the limit),
+        # so the messages to a slow client don't pile up in memory; a client that is gone is left to its own handler
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+class GameServer:
+    """
+    GAME SERVER
+    -----------
+    This object serves the games of many clients at once,
+    in a single asyncio event loop.
+
+    The moves are handled as soon as they are read, without any blocking
+    call, so a slow client never holds up the others. Only the opponent of
+    a client that doesn't read its messages waits (until the buffer of that
+    client is below the limit of its stream), instead of the messages
+    piling up in the memory of the server.
+    """
+
+    def __init__(self, board_shape=(8,8), backend='bitboard', draw_rounds=DRAW_ROUNDS):
+        self.board_shape = board_shape
+        self.backend = backend
+        self.draw_rounds = draw_rounds  # the rounds without a capture or a man move after which a game is a draw
+        self.sessions = {}      # game id -> GameSession object
+        self.next_game_id = 1
+
+    def new_session(self):
+        # starts a new game
+        session = GameSession(self.next_game_id, self.board_shape, self.backend, self.draw_rounds)
+        self.sessions[session.game_id] = session
+        self.next_game_id += 1
+        return session
+
+    def leave(self, connection):
+        # takes the client out of its game, and ends the game if nobody is playing it anymore
+        session = connection.session
+        if session is None:
+            return
+        for player in connection.players:
+            del session.clients[player]
+        if session.clients == {}:
+            del self.sessions[session.game_id]
+        connection.session, connection.players = None, []
+
+    def handle_request(self, connection, request):
+        # handles a request of a client, returning its answer
+        # and the other clients that were sent the new state of the game
+        op = request.get('op')
+        if op == 'new':
+            self.leave(connection)
+            session = self.new_session()
+            connection.session = session
+            connection.players = [1, 2] if request.get('solo', False) else [1]
+            for player in connection.players:
+                session.clients[player] = connection
+        elif op == 'join':
+            session = self.sessions.get(request.get('game'))
+            if session is None or 2 in session.clients:
+                return {'ok': False, 'error': "there is no game %s to join" % request.get('game')}, []
+            self.leave(connection)
+            connection.session, connection.players = session, [2]
+            session.clients[2] = connection
+        elif op == 'leave':
+            self.leave(connection)
+            return {'ok': True}, []
+        elif op not in ['move', 'state']:
+            return {'ok': False, 'error': "unknown op %s" % op}, []
+        session = connection.session
+        if session is None:
+            return {'ok': False, 'error': "not in a game"}, []
+        if op == 'move':
+            selected_pos, released_pos = tuple(request['from']), tuple(request['to'])
+            if session.checkers.player_turn() not in connection.players:
+                return {'ok': False, 'error': "it is not your turn"}, []
+            error = session.make_move(session.checkers.player_turn(), selected_pos, released_pos)
+            if error is not None:
+                return {'ok': False, 'error': error}, []
+            others = [other for other in set(session.clients.values()) if other is not connection]
+            for other in others:
+                other.send(dict(session.state(other), event='state'))
+            return dict(session.state(connection), ok=True), others
+        return dict(session.state(connection), ok=True), []
+
+    async def handle_client(self, reader, writer):
+        # reads the requests of a client until it disconnects, answering each one
+        connection = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    answer, others = self.handle_request(connection, json.loads(line))
+                except (ValueError, KeyError, TypeError) as error:
+                    answer, others = {'ok': False, 'error': "bad request: %s" % error}, []
+                connection.send(answer)
+                await writer.drain()
+                for other in others:
+                    await other.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(connection)
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8765):
+        # starts listening to the clients, returning the asyncio server
+        return await asyncio.start_server(self.handle_client, host, port)
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Serves many checkers games to TCP clients, with a JSON object per line.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--board-size', type=int, nargs=2, default=[8, 8], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--backend', default='bitboard', choices=list(BOARD_BACKENDS))
+    parser.add_argument('--draw-rounds', type=int, default=DRAW_ROUNDS, help="rounds without a capture or a man move after which a game is a draw")
+    return parser.parse_args(args)
+
+async def serve(args):
+    server = await GameServer(tuple(args.board_size), args.backend, args.draw_rounds).start(args.host, args.port)
+    print("serving on %s:%d" % (args.host, args.port))
+    async with server:
+        await server.serve_forever()
+
+if __name__ == '__main__':
+    asyncio.run(serve(parse_args()))
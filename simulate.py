@@ -0,0 +1,109 @@
+import argparse
+import multiprocessing
+import time
+from checkers import Checkers, BOARD_BACKENDS, DRAW_ROUNDS
+from policies import make_policy
+
+# HEADLESS GAMES ----------------------------------------------------------------------------------
+
+def play_game(board_shape, policies, backend='tiles', max_rounds=500, initial_arrangement=[], draw_rounds=DRAW_ROUNDS):
+    # plays a full game through the Checkers object, following the same round flow
+    # as the GameWrapper states machine, but asking the players' policies for the moves.
+    # Returns the winner (0 for a draw, by the draw rules or when the game reaches max_rounds) and the number of plies
+    checkers = Checkers(board_shape, initial_arrangement, backend, draw_rounds)
+    plies = 0
+    while checkers.round < max_rounds:
+        # new round
+        checkers.update_moves()
+        checkers.advance_round()
+        policy = policies[checkers.player_turn()]
+        legal_moves = checkers.legal_moves()
+        if legal_moves == []: # game over, the player that made the last move wins
+            return checkers.turn_oponent(), plies
+        if checkers.is_draw():
+            return 0, plies
+        # a ply may take several moves, for the captures with continuations
+        while True:
+            selected_pos, released_pos = policy.choose_move(checkers, legal_moves)
+            if checkers.make_move(selected_pos, released_pos):
+                break
+            legal_moves = checkers.legal_moves()
+        plies += 1
+    return 0, plies
+
+def play_game_job(job):
+    # plays one game of a batch (this function runs inside the pool's worker processes)
+    game_index, settings = job
+    seed = settings['seed'] + 2*game_index if settings['seed'] is not None else None
+    policies = {
+        1: make_policy(settings['policy1'], seed, settings['script1'], settings['depth']),
+        2: make_policy(settings['policy2'], seed + 1 if seed is not None else None, settings['script2'], settings['depth']),
+    }
+    return play_game(settings['board_shape'], policies, settings['backend'], settings['max_rounds'], draw_rounds=settings['draw_rounds'])
+
+def simulate(games, settings, workers=None):
+    # plays a batch of games spread across a pool of processes,
+    # returning the outcomes (winner and plies of each game) and the elapsed time
+    jobs = [(game_index, settings) for game_index in range(games)]
+    start_time = time.perf_counter()
+    if workers == 1:
+        outcomes = [play_game_job(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            outcomes = list(pool.imap_unordered(play_game_job, jobs, chunksize=max(1, games//64)))
+    return outcomes, time.perf_counter() - start_time
+
+def report(outcomes, elapsed_time):
+    # returns the throughput and the outcomes distribution of a batch as text
+    games = len(outcomes)
+    plies = sum(game_plies for _, game_plies in outcomes)
+    winners = [winner for winner, _ in outcomes]
+    lines = [
+        "games:       %d in %.2fs" % (games, elapsed_time),
+        "games/sec:   %.2f" % (games/elapsed_time),
+        "plies/sec:   %.2f" % (plies/elapsed_time),
+        "plies/game:  %.2f" % (plies/max(games, 1)),
+    ]
+    for name, winner in [("white wins", 1), ("black wins", 2), ("draws", 0)]:
+        count = winners.count(winner)
+        lines.append("%-12s %d (%.1f%%)" % (name+":", count, 100*count/max(games, 1)))
+    return "\n".join(lines)
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Plays batches of checkers games without the game screen.")
+    parser.add_argument('-n', '--games', type=int, default=100, help="number of games to play")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="number of processes (defaults to the number of cpus)")
+    parser.add_argument('--board-size', type=int, nargs=2, default=[8, 8], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--backend', default='tiles', choices=list(BOARD_BACKENDS))
+    parser.add_argument('--policy1', default='random', choices=['random', 'first', 'scripted', 'engine'], help="white's policy")
+    parser.add_argument('--policy2', default='random', choices=['random', 'first', 'scripted', 'engine'], help="black's policy")
+    parser.add_argument('--script1', default=None, help="moves file of white's scripted policy")
+    parser.add_argument('--script2', default=None, help="moves file of black's scripted policy")
+    parser.add_argument('--depth', type=int, default=4, help="search depth of the engine policy")
+    parser.add_argument('--max-rounds', type=int, default=500, help="rounds after which a game is a draw")
+    parser.add_argument('--draw-rounds', type=int, default=DRAW_ROUNDS, help="rounds without a capture or a man move after which a game is a draw")
+    parser.add_argument('--seed', type=int, default=None, help="seed of the random policies")
+    parsed_args = parser.parse_args(args)
+    for player in [1, 2]:
+        if getattr(parsed_args, 'policy%d' % player) == 'scripted' and getattr(parsed_args, 'script%d' % player) is None:
+            parser.error("--policy%d scripted requires --script%d" % (player, player))
+    return parsed_args
+
+if __name__ == '__main__':
+    args = parse_args()
+    settings = {
+        'board_shape': tuple(args.board_size),
+        'backend': args.backend,
+        'policy1': args.policy1,
+        'policy2': args.policy2,
+        'script1': args.script1,
+        'script2': args.script2,
+        'max_rounds': args.max_rounds,
+        'draw_rounds': args.draw_rounds,
+        'seed': args.seed,
+        'depth': args.depth,
+    }
+    outcomes, elapsed_time = simulate(args.games, settings, args.workers)
+    print(report(outcomes, elapsed_time))
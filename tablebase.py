@@ -0,0 +1,242 @@
+import argparse
+import itertools
+import mmap
+import struct
+import time
+import numpy as np
+from board import empty_tiles
+from piece import Piece
+from checkers import Checkers, BOARD_BACKENDS
+
+# The results of a position, from the point of view of the player with the turn
+# (0 is kept for the indexes that aren't positions, like two pieces in the same tile)
+WIN, LOSS, DRAW = 1, 2, 3
+
+KINDS = [(1, 1), (1, 2), (2, 1), (2, 2)] # the (player, rank) kinds of pieces
+
+MAGIC = b'CKTB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHHI')  # magic, version, board width, board height, max pieces, number of materials
+ENTRY_SIZE = 2                      # the result and the distance (in turns) of a position
+
+# POSITIONS INDEXING ----------------------------------------------------------------------------
+# A material is the sorted tuple of the (player, rank) kinds of the pieces of a position.
+# The positions of a material are indexed by the dark tiles of its pieces (in the material's order,
+# as the digits of a number in base 'number of dark tiles') and by the player with the turn.
+# Pieces of the same kind are indexed in increasing tile order, so every position has a single index.
+
+def dark_tiles(board_shape):
+    # returns the tiles where the pieces can be, in a fixed order
+    return [(i, j) for j in range(board_shape[1]) for i in range(board_shape[0]) if (i+j)%2 == 1]
+
+def materials(board_shape, max_pieces):
+    # returns every material with up to max_pieces pieces, in the order they must be solved:
+    # captures lead to materials with less pieces, and promotions to materials with less rank1 pieces
+    all_materials = []
+    for pieces_count in range(1, max_pieces+1):
+        all_materials += list(itertools.combinations_with_replacement(KINDS, pieces_count))
+    return sorted(all_materials, key=lambda material: (len(material), sum(rank == 1 for _, rank in material)))
+
+def material_entries(squares, material):
+    # returns the number of indexes of a material, given the number of dark tiles of the board
+    return 2 * squares**len(material)
+
+def position_index(squares, material, tiles_indexes, player):
+    # returns the index of a position given the number of dark tiles of the board,
+    # the dark tile index of every piece and the player with the turn
+    index = 0
+    for tile_index in reversed(tiles_indexes):
+        index = index*squares + tile_index
+    return 2*index + (player-1)
+
+def is_valid_position(material, tiles):
+    # returns if the pieces of a material can be in the given dark tiles indexes
+    # (one piece per tile, and same kind pieces in increasing order)
+    if len(set(tiles)) != len(tiles):
+        return False
+    for slot, (player, rank) in enumerate(material):
+        if slot > 0 and material[slot-1] == (player, rank) and tiles[slot-1] >= tiles[slot]:
+            return False
+    return True
+
+def describe(board, dark_indexes):
+    # returns the material and the dark tile indexes of the pieces of a board
+    pieces = []
+    for player in [1, 2]:
+        for pos in board.pieces_pos(player):
+            pieces.append(((player, board.rank_at(pos)), dark_indexes[pos]))
+    pieces.sort()
+    return tuple(kind for kind, _ in pieces), [tile_index for _, tile_index in pieces]
+
+def arrangement(board_shape, material, tiles):
+    # returns the tiles matrix of the pieces of a material in the given tiles
+    initial_tiles = empty_tiles(board_shape)
+    for (player, rank), pos in zip(material, tiles):
+        initial_tiles[pos] = Piece(player=player, rank=rank)
+    return initial_tiles
+
+def turn_start(board_shape, initial_arrangement, player, backend='bitboard'):
+    # returns a Checkers object at the start of a turn of the given player
+    checkers = Checkers(board_shape, initial_arrangement, backend)
+    checkers.round = 0 if player == 1 else 1
+    checkers.update_moves()
+    checkers.advance_round()
+    return checkers
+
+# GENERATION ------------------------------------------------------------------------------------
+
+def solve_material(board_shape, material, solved, backend='bitboard'):
+    # returns the result and distance arrays of every index of a material,
+    # given the arrays of the materials its positions can turn into (solved)
+    tiles = dark_tiles(board_shape)
+    dark_indexes = {pos: tile_index for tile_index, pos in enumerate(tiles)}
+    squares = len(tiles)
+    entries = material_entries(squares, material)
+    results = np.zeros(entries, dtype=np.uint8)
+    distances = np.zeros(entries, dtype=np.uint8)
+
+    predecessors = {}           # index -> indexes of the positions (of this material) that can turn into it
+    unresolved = {}             # index -> number of turns not yet known to lose (to be won by the oponent)
+    external_losses = {}        # distance -> indexes with a turn into a position of another material lost in that distance
+    external_wins = {}          # distance -> indexes with a turn into a position of another material won in that distance
+    for tiles_indexes in itertools.product(range(len(tiles)), repeat=len(material)):
+        if not is_valid_position(material, tiles_indexes):
+            continue
+        positions = [tiles[tile_index] for tile_index in tiles_indexes]
+        if any(rank == 1 and pos[1] == (0 if piece_player == 1 else board_shape[1]-1)
+               for (piece_player, rank), pos in zip(material, positions)): # a rank1 piece would have been promoted
+            continue
+        for player in [1, 2]:
+            index = position_index(squares, material, tiles_indexes, player)
+            checkers = turn_start(board_shape, arrangement(board_shape, material, positions), player, backend)
+            moves = checkers.generate_moves()
+            if moves == []: # the player with the turn can't move, so it lost
+                results[index], distances[index] = LOSS, 0
+                continue
+            unresolved[index] = len(moves)
+            for move in moves:
+                checkers.push(move)
+                next_material, next_tiles_indexes = describe(checkers.board, dark_indexes)
+                next_index = position_index(squares, next_material, next_tiles_indexes, checkers.player_turn())
+                checkers.pop()
+                if next_material == material:
+                    predecessors.setdefault(next_index, []).append(index)
+                else:
+                    next_results, next_distances = solved[next_material]
+                    next_distance = int(next_distances[next_index])
+                    if next_results[next_index] == LOSS:
+                        external_losses.setdefault(next_distance, []).append(index)
+                    elif next_results[next_index] == WIN:
+                        external_wins.setdefault(next_distance, []).append(index)
+
+    # a position is won in n turns if a turn leads to a position lost in n-1 turns,
+    # and it is lost in n turns if every turn leads to a position won (by the oponent) in at most n-1 turns
+    last_losses = np.flatnonzero(results == LOSS).tolist()
+    last_wins = []
+    last_external_distance = max(list(external_losses) + list(external_wins) + [0])
+    distance = 1
+    while last_losses != [] or last_wins != [] or distance <= last_external_distance + 1:
+        new_wins, new_losses = [], []
+        for index in [predecessor for lost in last_losses for predecessor in predecessors.get(lost, [])] + external_losses.get(distance-1, []):
+            if results[index] == 0:
+                results[index], distances[index] = WIN, min(distance, 255)
+                new_wins.append(index)
+        for index in [predecessor for won in last_wins for predecessor in predecessors.get(won, [])] + external_wins.get(distance-1, []):
+            unresolved[index] -= 1
+            if unresolved[index] == 0 and results[index] == 0:
+                results[index], distances[index] = LOSS, min(distance, 255)
+                new_losses.append(index)
+        last_losses, last_wins = new_losses, new_wins
+        distance += 1
+    # the remaining positions can't be won by any player
+    for index in unresolved:
+        if results[index] == 0:
+            results[index] = DRAW
+    return results, distances
+
+def generate(path, board_shape, max_pieces, backend='bitboard', verbose=False):
+    # solves every position with up to max_pieces pieces and writes the tablebase file
+    solved = {}
+    for material in materials(board_shape, max_pieces):
+        start_time = time.time()
+        solved[material] = solve_material(board_shape, material, solved, backend)
+        if verbose:
+            results, distances = solved[material]
+            print("%-40s wins: %-8d losses: %-8d draws: %-8d longest win: %-4d %.2fs" % (
+                material, (results == WIN).sum(), (results == LOSS).sum(), (results == DRAW).sum(),
+                distances[results == WIN].max(initial=0), time.time() - start_time))
+
+    index_entry = struct.Struct('<B%dsQI' % (2*max_pieces))  # pieces count, kinds, data offset, entries
+    offset = HEADER.size + index_entry.size*len(solved)
+    with open(path, 'wb') as tablebase_file:
+        tablebase_file.write(HEADER.pack(MAGIC, VERSION, board_shape[0], board_shape[1], max_pieces, len(solved)))
+        for material, (results, _) in solved.items():
+            kinds = bytes(value for kind in material for value in kind)
+            tablebase_file.write(index_entry.pack(len(material), kinds, offset, len(results)))
+            offset += ENTRY_SIZE*len(results)
+        for results, distances in solved.values():
+            tablebase_file.write(np.stack([results, distances], axis=1).tobytes())
+
+# PROBING ---------------------------------------------------------------------------------------
+
+class Tablebase:
+    """
+    TABLEBASE
+    ---------
+    This object looks up the result of a position in a tablebase file
+    (written by the generate function), that is, if the player with the turn
+    wins, loses or draws with a perfect play, and in how many turns.
+
+    The file is memory mapped, so only the looked up entries are read
+    from the disk, and the lookup doesn't search anything.
+    """
+
+    def __init__(self, path):
+        self.path = path    # the path of the tablebase file
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height, self.max_pieces, materials_count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a tablebase file" % path)
+        self.board_shape = (width, height)  # the board shape of the positions
+        self.dark_indexes = {pos: tile_index for tile_index, pos in enumerate(dark_tiles(self.board_shape))}
+        self.squares = len(self.dark_indexes)   # the number of dark tiles, the base of the positions indexes
+        self.offsets = {}   # material -> offset of its entries in the file
+        index_entry = struct.Struct('<B%dsQI' % (2*self.max_pieces))
+        for material_index in range(materials_count):
+            pieces_count, kinds, offset, _ = index_entry.unpack_from(self.data, HEADER.size + material_index*index_entry.size)
+            material = tuple((kinds[2*piece], kinds[2*piece+1]) for piece in range(pieces_count))
+            self.offsets[material] = offset
+
+    def probe(self, checkers):
+        # returns the (result, distance in turns) of the position, from the point of view of the player
+        # with the turn, or None if the position isn't in the tablebase
+        if checkers.mid_move_piece != None or checkers.board.shape != self.board_shape:
+            return None
+        material, tiles_indexes = describe(checkers.board, self.dark_indexes)
+        if material not in self.offsets:
+            return None
+        index = position_index(self.squares, material, tiles_indexes, checkers.player_turn())
+        offset = self.offsets[material] + ENTRY_SIZE*index
+        result, distance = self.data[offset], self.data[offset+1]
+        if result == 0:
+            return None
+        return result, distance
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+# COMMAND LINE ----------------------------------------------------------------------------------
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Solves every position with a few pieces and writes them to a tablebase file.")
+    parser.add_argument('-k', '--pieces', type=int, default=3, help="maximum number of pieces of the positions")
+    parser.add_argument('-o', '--output', default='tablebase.bin', help="path of the tablebase file")
+    parser.add_argument('--board-size', type=int, nargs=2, default=[8, 8], metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--backend', default='bitboard', choices=list(BOARD_BACKENDS))
+    return parser.parse_args(args)
+
+if __name__ == '__main__':
+    args = parse_args()
+    generate(args.output, tuple(args.board_size), args.pieces, args.backend, verbose=True)
@@ -1,8 +1,38 @@
 import pygame
 from game_wrapper import GameWrapper
 from renderer import Renderer
-from board import empty_tiles, tile_is_empty
+from harness import NullRenderer, headless_screen, drive, settle, play_turns, move_inputs, drag_inputs
+from profiling import Profiler
+from server import GameServer, GameSession
+from loadtest import request, load_test, session_memory
+import asyncio
+from analyze import analyze, pdn_files
+from env import CheckersEnv, encode_action, decode_action, action_tables, WHITE_MEN, BLACK_MEN, WHITE_TURN, MID_MOVE
+import json
+from board import Board, empty_tiles, tile_is_empty, initial_tiles, diagonal_rays, board_to_fen, board_to_bytes, position_size, fen_to_tiles
+from compact_board import encode_tiles, decode_tiles, save_positions, load_positions
+from batch_moves import stack_boards, batch_compute_moves, batch_has_legal_moves, mask_moves
 from piece import Piece
+from checkers import Checkers, checkers_from_state, DRAW_ROUNDS
+from simulate import play_game, simulate, parse_args as simulate_args
+from policies import RandomPolicy, ScriptedPolicy
+from engine import Engine, BackgroundSearch, tablebase_score, WIN_SCORE
+from evaluation import evaluate, batch_evaluate, piece_square_tables
+from compact_board import board_codes
+from pdn import append_game, turns_of_history, read_games, PdnGame
+from replay import replay_game
+from tablebase import generate, Tablebase, turn_start, DRAW
+from perft import start_position, perft, perft_steps, divide, reference_count
+import contextlib
+import io
+import multiprocessing
+import random
+import signal
+import sys
+import numpy as np
+import time
+import os
+import tempfile
 
 # ----------------------------------------------------------------------------------- Tests utils
 
@@ -33,8 +63,9 @@ def unpress_at(game, renderer, pos):
     for _ in range(5):
         update_game(game, renderer, mouse_did_pressdown, mouse_did_pressup, mouse_tile_pos)
 
-def wait(game, renderer, pos, n=200):
+def wait(game, renderer, pos, n=None):
     # wait a few iterations (mostly for visible test purposes)
+    n = WAIT_FRAMES if n is None else n
     mouse_did_pressdown = False
     mouse_did_pressup = False
     mouse_tile_pos = pos
@@ -54,16 +85,28 @@ def make_move(game, renderer, from_pos, to_pos):
 
 # ----------------------------------------------------------------------------------- Tests initiation
 
-pygame.init()
+# The tests run without a window (in SDL's dummy video driver, and rendering with a NullRenderer),
+# unless they are run with the --visible argument
+VISIBLE = '--visible' in sys.argv
+WAIT_FRAMES = 200 if VISIBLE else 2 # the frames waited after each click (so the moves can be seen)
 
 # Game screen
 screen_shape = (800, 720)
-screen = pygame.display.set_mode(screen_shape)
+if VISIBLE:
+    pygame.init()
+    screen = pygame.display.set_mode(screen_shape)
+    # Screen title and icon
+    pygame.display.set_caption("Jogo de Damas - testes")
+    icon = pygame.image.load('assets/icon.png')
+    pygame.display.set_icon(icon)
+else:
+    screen = headless_screen(screen_shape)
 
-# Screen title and icon
-pygame.display.set_caption("Jogo de Damas - testes")
-icon = pygame.image.load('assets/icon.png')
-pygame.display.set_icon(icon)
+def make_renderer(board_shape):
+    # returns the render objects of the tests
+    if VISIBLE:
+        return Renderer(screen_shape, board_shape)
+    return NullRenderer(screen_shape, board_shape)
 
 # ----------------------------------------------------------------------------------- Tests cases
 
@@ -74,7 +117,7 @@ def move_test_case():
     board_shape = (8,8)
 
     game = GameWrapper(board_shape) # game state machine
-    renderer = Renderer(screen_shape, board_shape) # render objects
+    renderer = make_renderer(board_shape) # render objects
 
     # GAME LOOP
 
@@ -101,7 +144,7 @@ def capture_test_case():
     initial_tiles[5, 2] = Piece(player=2)
 
     game = GameWrapper(board_shape, initial_tiles) # game state machine
-    renderer = Renderer(screen_shape, board_shape) # render objects
+    renderer = make_renderer(board_shape) # render objects
 
     # GAME LOOP
 
@@ -129,7 +172,7 @@ def capture_continuation_test_case():
     initial_tiles[4, 1] = Piece(player=2)
 
     game = GameWrapper(board_shape, initial_tiles) # game state machine
-    renderer = Renderer(screen_shape, board_shape) # render objects
+    renderer = make_renderer(board_shape) # render objects
 
     # GAME LOOP
 
@@ -164,7 +207,7 @@ def complex_test_case():
     initial_tiles[3, 4] = Piece(player=2)
 
     game = GameWrapper(board_shape, initial_tiles) # game state machine
-    renderer = Renderer(screen_shape, board_shape) # render objects
+    renderer = make_renderer(board_shape) # render objects
 
     # GAME LOOP
 
@@ -188,9 +231,979 @@ def complex_test_case():
     # assert white (player 1) won
     assert(game.winner == 1)
 
+def bitboard_test_case():
+    # Tests if the bitboard backend finds the same moves as the tiles backend along random games
+
+    random.seed(0)
+    for board_shape in [(8,8), (10,10)]:
+        for _ in range(5):
+            tiles_game = Checkers(board_shape, backend='tiles')
+            bit_game = Checkers(board_shape, backend='bitboard')
+            for _ in range(200):
+                tiles_game.update_moves()
+                bit_game.update_moves()
+                tiles_game.advance_round()
+                bit_game.advance_round()
+                ended_turn = False
+                while not ended_turn:
+                    # assert every piece has the same moves in both backends
+                    for i in range(board_shape[0]):
+                        for j in range(board_shape[1]):
+                            tiles_piece = tiles_game.piece_in_pos((i,j))
+                            bit_piece = bit_game.piece_in_pos((i,j))
+                            assert((tiles_piece.player, tiles_piece.rank) == (bit_piece.player, bit_piece.rank))
+                            if tiles_piece.player != 0:
+                                assert(tiles_piece.no_capture_moves == bit_piece.no_capture_moves)
+                                assert(tiles_piece.capture_moves == bit_piece.capture_moves)
+                                assert(tiles_piece.captured_capture_moves == bit_piece.captured_capture_moves)
+                    for player in [1, 2]:
+                        assert(tiles_game.board.has_legal_moves(player) == bit_game.board.has_legal_moves(player))
+                    # assert the Zobrist keys are kept up to date and are the same in both backends
+                    assert(tiles_game.position_key() == bit_game.position_key())
+                    assert(tiles_game.board.zobrist_key == tiles_game.board.compute_zobrist_key())
+                    assert(bit_game.board.zobrist_key == bit_game.board.compute_zobrist_key())
+                    moves = [(pos, move) for pos in tiles_game.movable_pieces_pos() for move in tiles_game.get_piece_legal_moves(pos, concat=True)]
+                    if moves == []:
+                        break
+                    selected_pos, released_pos = random.choice(moves)
+                    ended_turn = tiles_game.make_move(selected_pos, released_pos)
+                    assert(bit_game.make_move(selected_pos, released_pos) == ended_turn)
+                if moves == []:
+                    break
+
+def incremental_moves_test_case():
+    # Tests if the moves recomputed only around the changed tiles are the same as the ones of a full computation
+
+    random.seed(1)
+    board_shape = (8,8)
+    game = Checkers(board_shape)
+    for _ in range(100):
+        game.update_moves()
+        game.advance_round()
+        moves = [(pos, move) for pos in game.movable_pieces_pos() for move in game.get_piece_legal_moves(pos, concat=True)]
+        if moves == []:
+            break
+        game.make_move(*random.choice(moves))
+        game.update_moves()
+        # compare every piece's moves with the ones of a full computation
+        full_game = Checkers(board_shape)
+        for i in range(board_shape[0]):
+            for j in range(board_shape[1]):
+                full_game.board.tiles[i, j] = Piece(game.player_in_pos((i,j)), game.rank_in_pos((i,j)))
+        full_game.update_moves()
+        for pos in game.board.pieces_pos(1) + game.board.pieces_pos(2):
+            assert(game.piece_in_pos(pos).no_capture_moves == full_game.piece_in_pos(pos).no_capture_moves)
+            assert(game.piece_in_pos(pos).capture_moves == full_game.piece_in_pos(pos).capture_moves)
+            assert(game.piece_in_pos(pos).captured_capture_moves == full_game.piece_in_pos(pos).captured_capture_moves)
+    # assert most of the pieces kept their moves
+    assert(game.board.reused_pieces > game.board.recomputed_pieces)
+
+def simulation_test_case():
+    # Tests if headless games end and are played the same way by both backends
+
+    board_shape = (8,8)
+    for seed in range(3):
+        outcomes = []
+        for backend in ['tiles', 'bitboard', 'int8']:
+            policies = {1: RandomPolicy(seed), 2: RandomPolicy(seed+100)}
+            outcomes.append(play_game(board_shape, policies, backend))
+        assert(outcomes[0] == outcomes[1] == outcomes[2])
+        assert(outcomes[0][0] in [0, 1, 2])
+    # assert a scripted policy plays its moves
+    policies = {1: ScriptedPolicy([((0,5), (1,4))]), 2: ScriptedPolicy([((1,2), (0,3))])}
+    winner, plies = play_game(board_shape, policies, max_rounds=2)
+    assert((winner, plies) == (0, 2))
+    # assert a scripted policy needs its script in the command line
+    assert(simulate_args(['--policy2', 'scripted', '--script2', 'moves.txt']).script2 == 'moves.txt')
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            simulate_args(['--policy1', 'scripted'])
+            assert(False)
+        except SystemExit:
+            pass
+
+def engine_test_case():
+    # Tests if the computer player finds a double capture and plays it as one turn
+
+    # Game loop objects
+    board_shape = (8,8)
+
+    # initial tiles
+    initial_tiles = empty_tiles(board_shape)
+    initial_tiles[7, 2] = Piece(player=1)
+    initial_tiles[6, 1] = Piece(player=2)
+    initial_tiles[4, 1] = Piece(player=2)
+    initial_tiles[0, 1] = Piece(player=2)
+
+    game = GameWrapper(board_shape, initial_tiles, computer_players={1: Engine(depth=3)}) # game state machine
+    renderer = make_renderer(board_shape) # render objects
+
+    # GAME LOOP
+
+    # let the computer play
+    wait(game, renderer, (0,0), n=5)
+    # assert the two pieces were captured in the same turn
+    assert(game.checkers.board.has_piece_in(pos=(3,2), player=1))
+    assert(tile_is_empty(game.checkers.piece_in_pos((6,1))))
+    assert(tile_is_empty(game.checkers.piece_in_pos((4,1))))
+    assert(game.checkers.player_turn() == 2)
+    # a won position found in the transposition table at another ply keeps its distance to the win
+    won_tiles = empty_tiles(board_shape)
+    won_tiles[7, 2] = Piece(player=1)
+    won_tiles[6, 1] = Piece(player=2)
+    won_tiles[4, 1] = Piece(player=2)
+    checkers = turn_start(board_shape, won_tiles, 1, 'bitboard')
+    engine = Engine()
+    assert(engine.negamax(checkers, 3, -WIN_SCORE-1, WIN_SCORE+1, 0) == WIN_SCORE - 1) # the double capture wins
+    for ply in [2, 5]:
+        assert(engine.negamax(checkers, 3, -WIN_SCORE-1, WIN_SCORE+1, ply) == Engine().negamax(checkers, 3, -WIN_SCORE-1, WIN_SCORE+1, ply) == WIN_SCORE - (ply+1))
+
+def zobrist_test_case():
+    # Tests if the same position reached by different move orders has the same key, and if popping the moves restores the keys
+
+    board_shape = (8,8)
+    white_moves = [((0,5), (1,4)), ((6,5), (7,4))]
+    black_moves = [((1,2), (0,3)), ((5,2), (4,3))]
+    for backend in ['tiles', 'bitboard', 'int8']:
+        keys = []
+        for order in [0, 1]:
+            game = start_position(board_shape, backend=backend)
+            for white_move, black_move in zip(white_moves[::1-2*order], black_moves[::1-2*order]):
+                assert(white_move in game.legal_moves())
+                game.push(white_move)
+                assert(black_move in game.legal_moves())
+                game.push(black_move)
+            assert(game.board.zobrist_key == game.board.compute_zobrist_key())
+            keys.append(game.position_key())
+        assert(keys[0] == keys[1])
+        # the same pieces with the other player to move have another key
+        game.round += 1
+        assert(game.position_key() != keys[0])
+        game.round -= 1
+        # popping the moves of random games restores every key
+        random.seed(5)
+        game = start_position(board_shape, backend=backend)
+        keys = []
+        for _ in range(40):
+            moves = game.legal_moves()
+            if moves == []:
+                break
+            keys.append(game.position_key())
+            game.push(random.choice(moves))
+        while keys != []:
+            game.pop()
+            assert(game.position_key() == keys.pop())
+            assert(game.board.zobrist_key == game.board.compute_zobrist_key())
+
+def push_pop_test_case():
+    # Tests if popping the pushed moves restores the exact same positions
+
+    random.seed(2)
+    board_shape = (8,8)
+    for backend in ['tiles', 'bitboard', 'int8']:
+        game = Checkers(board_shape, backend=backend)
+        game.update_moves()
+        game.advance_round()
+        states = []
+        for _ in range(150):
+            state = (game.position_key(), game.round, game.mid_move_piece,
+                     [(game.player_in_pos(pos), game.rank_in_pos(pos), game.get_piece_legal_moves(pos)) for pos in game.movable_pieces_pos()])
+            moves = game.legal_moves()
+            if moves == []:
+                break
+            states.append(state)
+            game.push(random.choice(moves))
+        # assert every pop goes back to the previous position
+        while states != []:
+            game.pop()
+            state = (game.position_key(), game.round, game.mid_move_piece,
+                     [(game.player_in_pos(pos), game.rank_in_pos(pos), game.get_piece_legal_moves(pos)) for pos in game.movable_pieces_pos()])
+            assert(state == states.pop())
+        assert(game.board.zobrist_key == game.board.compute_zobrist_key())
+
+def takeback_test_case():
+    # Tests if a move can be taken back
+
+    # Game loop objects
+    board_shape = (8,8)
+
+    game = GameWrapper(board_shape) # game state machine
+    renderer = make_renderer(board_shape) # render objects
+
+    # GAME LOOP
+
+    # make the white move from (0,5) -> (1,4)
+    make_move(game, renderer, (0,5), (1,4))
+    # take it back
+    game.takeback()
+    wait(game, renderer, (0,0), n=5)
+    # assert the piece is back and it is white's turn again
+    assert(game.checkers.board.has_piece_in(pos=(0,5), player=1))
+    assert(tile_is_empty(game.checkers.piece_in_pos((1,4))))
+    assert(game.checkers.player_turn() == 1)
+    # assert the game goes on
+    make_move(game, renderer, (2,5), (3,4))
+    assert(game.checkers.board.has_piece_in(pos=(3,4), player=1))
+    assert(game.checkers.player_turn() == 2)
+
+def step_sequences(game):
+    # returns every turn of the player with the turn as lists of steps, exploring them step by step
+    sequences = []
+    for move in game.legal_moves():
+        if game.push(move):
+            sequences.append([move])
+        else:
+            sequences += [[move] + steps for steps in step_sequences(game)]
+        game.pop()
+    return sequences
+
+def whole_moves_test_case():
+    # Tests if the whole moves (with all the capture continuations) are the same as the step by step ones
+
+    random.seed(3)
+    board_shape = (8,8)
+    for backend in ['tiles', 'bitboard', 'int8']:
+        for _ in range(3):
+            game = Checkers(board_shape, backend=backend)
+            game.update_moves()
+            game.advance_round()
+            for _ in range(150):
+                moves = game.generate_moves()
+                assert(sorted(move.steps() for move in moves) == sorted(step_sequences(game)))
+                if moves == []:
+                    break
+                # assert a whole move reaches the same position as its steps
+                move = random.choice(moves)
+                for step in move.steps():
+                    game.push(step)
+                position_key = game.position_key()
+                for step in move.steps():
+                    game.pop()
+                game.push(move)
+                assert(game.position_key() == position_key)
+    # assert the majority capture rule only keeps the moves with the most captures
+    initial_tiles = empty_tiles(board_shape)
+    initial_tiles[7, 2] = Piece(player=1)
+    initial_tiles[6, 1] = Piece(player=2)
+    initial_tiles[4, 1] = Piece(player=2)
+    initial_tiles[0, 5] = Piece(player=1)
+    initial_tiles[1, 4] = Piece(player=2)
+    game = Checkers(board_shape, initial_tiles)
+    game.update_moves()
+    game.advance_round()
+    assert(len(game.generate_moves()) == 2)
+    moves = game.generate_moves(majority_capture=True)
+    assert(len(moves) == 1 and moves[0].captures == ((6,1), (4,1)))
+
+def turn_cache_test_case():
+    # Tests if the legal moves are computed once per round and forgotten when a move is made
+
+    board_shape = (8,8)
+    game = GameWrapper(board_shape) # game state machine
+    renderer = make_renderer(board_shape) # render objects
+
+    # GAME LOOP
+
+    # select a piece and render a few frames
+    press_at(game, renderer, (0,5))
+    unpress_at(game, renderer, (0,5))
+    turn_cache = game.checkers.turn_legal_moves()
+    wait(game, renderer, (0,5), n=5)
+    # assert the frames used the same legal moves and the glowing tiles are right
+    assert(game.checkers.turn_legal_moves() is turn_cache)
+    assert(game.glowing_tiles == [(1,4)])
+    # make the move and assert the legal moves changed with it
+    press_at(game, renderer, (1,4))
+    unpress_at(game, renderer, (1,4))
+    assert(game.checkers.turn_legal_moves() is not turn_cache)
+    assert(game.checkers.player_turn() == 2)
+    assert((1,2) in game.checkers.movable_pieces_pos())
+
+def dirty_rendering_test_case():
+    # Tests if only the changed tiles are redrawn
+
+    board_shape = (8,8)
+    game = GameWrapper(board_shape) # game state machine
+    renderer = Renderer(screen_shape, board_shape) # render objects (the real ones, also without a window)
+
+    # GAME LOOP
+
+    wait(game, renderer, (0,0), n=5)
+    # assert nothing is redrawn while nothing changes
+    assert(renderer.render(screen, game) == [])
+    # select a piece and assert only its legal move tile is redrawn
+    game.take_inputs(True, False, (0,5))
+    game.update()
+    game.take_inputs(False, True, (0,5))
+    game.update()
+    assert(renderer.render(screen, game) == [renderer.tile_rect((1,4))])
+    # make the move and assert only the two tiles are redrawn
+    game.take_inputs(True, False, (1,4))
+    game.update()
+    assert(sorted(renderer.render(screen, game)) == sorted([renderer.tile_rect((0,5)), renderer.tile_rect((1,4))]))
+    # assert a full redraw can be forced
+    renderer.invalidate()
+    assert(len(renderer.render(screen, game)) == board_shape[0]*board_shape[1])
+
 # ----------------------------------------------------------------------------------- Tests executions    
 
+def compact_board_test_case():
+    # Tests if the int8 backend finds the same moves as the tiles backend, and if its copies are independent
+
+    random.seed(4)
+    for board_shape in [(8,8), (10,10)]:
+        for _ in range(3):
+            tiles_game = Checkers(board_shape, backend='tiles')
+            compact_game = Checkers(board_shape, backend='int8')
+            for _ in range(200):
+                for game in [tiles_game, compact_game]:
+                    game.update_moves()
+                    game.advance_round()
+                moves = tiles_game.legal_moves()
+                # assert both backends have the same moves, pieces and keys
+                assert(moves == compact_game.legal_moves())
+                assert((encode_tiles(tiles_game.board.tiles) == compact_game.board.tiles).all())
+                assert(tiles_game.position_key() == compact_game.position_key())
+                assert(compact_game.board.zobrist_key == compact_game.board.compute_zobrist_key())
+                for player in [1, 2]:
+                    assert(tiles_game.board.has_legal_moves(player) == compact_game.board.has_legal_moves(player))
+                if moves == []:
+                    break
+                # assert a copy isn't changed by the moves of the original board
+                copy = compact_game.board.copy()
+                key = copy.key()
+                selected_pos, released_pos = random.choice(moves)
+                tiles_game.make_move(selected_pos, released_pos)
+                compact_game.make_move(selected_pos, released_pos)
+                assert(copy.key() == key)
+                while tiles_game.mid_move_piece != None:
+                    moves = tiles_game.legal_moves()
+                    assert(moves == compact_game.legal_moves())
+                    selected_pos, released_pos = random.choice(moves)
+                    tiles_game.make_move(selected_pos, released_pos)
+                    compact_game.make_move(selected_pos, released_pos)
+    # assert the int8 codes are converted back to the same pieces
+    tiles = initial_tiles((8,8))
+    decoded_tiles = decode_tiles(encode_tiles(tiles))
+    assert(all((tiles[i, j].player, tiles[i, j].rank) == (decoded_tiles[i, j].player, decoded_tiles[i, j].rank) for i in range(8) for j in range(8)))
+
+def batch_moves_test_case():
+    # Tests if the moves found for a whole stack of boards at once are the same as the ones found board by board
+
+    random.seed(5)
+    for board_shape in [(8,8), (10,10)]:
+        boards = []
+        for _ in range(3):
+            game = Checkers(board_shape, backend='int8')
+            for _ in range(150):
+                game.update_moves()
+                game.advance_round()
+                boards.append(game.board.copy())
+                moves = game.legal_moves()
+                if moves == []:
+                    break
+                while not game.make_move(*random.choice(moves)):
+                    moves = game.legal_moves()
+        codes = stack_boards(boards)
+        no_capture_masks, capture_masks = batch_compute_moves(codes)
+        for b, board in enumerate(boards):
+            for pos in board.pieces_pos(1) + board.pieces_pos(2):
+                piece = board.piece_at(pos)
+                assert(mask_moves(no_capture_masks, b, pos) == piece.no_capture_moves)
+                assert(mask_moves(capture_masks, b, pos) == piece.capture_moves)
+            for player in [1, 2]:
+                has_moves = batch_has_legal_moves(codes, no_capture_masks, capture_masks, player)
+                assert((has_moves[0][b], has_moves[1][b]) == board.has_legal_moves(player))
+
+def perft_test_case():
+    # Tests if every backend counts the reference numbers of positions, also step by step
+    # and from the middle of a capture continuation
+
+    for board_shape in [(8,8), (10,10)]:
+        for backend in ['tiles', 'bitboard', 'int8']:
+            game = start_position(board_shape, backend=backend)
+            for depth in range(4):
+                assert(perft(game, depth) == perft_steps(game, depth) == reference_count(board_shape, depth))
+    # a double capture, stopped after its first step
+    initial_tiles = empty_tiles((8,8))
+    initial_tiles[7, 2] = Piece(player=1)
+    initial_tiles[6, 1] = Piece(player=2)
+    initial_tiles[4, 1] = Piece(player=2)
+    initial_tiles[0, 1] = Piece(player=2)
+    game = start_position((8,8), initial_tiles, moves=[((7,2), (5,0))])
+    assert(game.mid_move_piece == [(5,0)])
+    assert(perft(game, 3) == perft_steps(game, 3) == sum(count for _, count in divide(game, 3)))
+    # the counts from a FEN position (with black to move) are the ones of the same position reached by the moves
+    for backend in ['tiles', 'bitboard', 'int8']:
+        game = start_position((8,8), backend=backend, moves=[((0,5), (1,4))])
+        initial_tiles, player = fen_to_tiles(board_to_fen(game.board, game.player_turn()), (8,8))
+        fen_game = start_position((8,8), initial_tiles, backend, player=player)
+        assert(fen_game.player_turn() == player == 2)
+        assert(perft(fen_game, 3) == perft(game, 3))
+
+def diagonal_rays_test_case():
+    # Tests if the diagonal rays are shared by the boards of a shape, and if the moves found with them are the same
+    # as the ones found by the bitboard backend on a bigger board
+
+    board_shape = (12,12)
+    assert(Board(board_shape).rays is Board(board_shape).rays)
+    for i in range(board_shape[0]):
+        for j in range(board_shape[1]):
+            for di, dj, ray in diagonal_rays(board_shape)[i][j]:
+                assert(list(ray) == [(i+di*dist, j+dj*dist) for dist in range(1, len(ray)+1)])
+                assert(not Board(board_shape).is_in_bounds((i+di*(len(ray)+1), j+dj*(len(ray)+1))))
+    for depth in range(4):
+        assert(perft(start_position(board_shape), depth) == perft(start_position(board_shape, backend='bitboard'), depth))
+
+def tablebase_test_case():
+    # Tests if the tablebase results are the same as the ones found by the computer player's search,
+    # and if the computer player finds the same scores looking them up
+
+    board_shape = (6,6)
+    path = os.path.join(tempfile.mkdtemp(), 'tablebase.bin')
+    generate(path, board_shape, 2)
+    tablebase = Tablebase(path)
+    # a queen against a normal piece
+    for king_pos, man_pos, player in [((1,0), (4,3), 2), ((2,5), (1,2), 1), ((0,5), (5,0), 2)]:
+        initial_tiles = empty_tiles(board_shape)
+        initial_tiles[king_pos] = Piece(player=1, rank=2)
+        initial_tiles[man_pos] = Piece(player=2)
+        game = turn_start(board_shape, initial_tiles, player)
+        result, distance = tablebase.probe(game)
+        if result != DRAW:
+            _, score = Engine(depth=distance+1).search(game)
+            assert(score == tablebase_score(result, distance, 0))
+        _, score = Engine(depth=1, tablebase=tablebase).search(game)
+        assert(score == tablebase_score(result, distance, 0))
+    tablebase.close()
+
+def parallel_search_test_case():
+    # Tests if the compact states rebuild the same positions, and if the root search split across
+    # processes finds the same scores as the search in a single process
+
+    random.seed(6)
+    for backend in ['tiles', 'bitboard', 'int8']:
+        game = Checkers((8,8), backend=backend)
+        game.update_moves()
+        game.advance_round()
+        for _ in range(60):
+            copy = checkers_from_state(game.compact_state())
+            assert(copy.position_key() == game.position_key())
+            assert(copy.legal_moves() == game.legal_moves())
+            if game.legal_moves() == []:
+                break
+            game.push(random.choice(game.legal_moves()))
+    parallel_engine = Engine(depth=4, workers=2)
+    for _ in range(3):
+        game = Checkers((8,8), backend='bitboard')
+        game.update_moves()
+        game.advance_round()
+        for _ in range(random.randrange(4, 12)):
+            game.push(random.choice(game.generate_moves()))
+        _, score = Engine(depth=4).search(game)
+        move, parallel_score = parallel_engine.search(game)
+        assert(parallel_score == score)
+        assert(move in game.generate_moves())
+    parallel_engine.close()
+
+def background_search_test_case():
+    # Tests if a computer player with a time budget thinks without stopping the game loop,
+    # and answers within its time budget
+
+    # Game loop objects
+    board_shape = (8,8)
+    time_budget = 0.5
+    game = GameWrapper(board_shape, backend='bitboard', computer_players={2: Engine(depth=30, time_budget=time_budget)}) # game state machine
+    renderer = make_renderer(board_shape) # render objects
+
+    # GAME LOOP
+
+    # make white's move, so the computer starts thinking
+    press_at(game, renderer, (0,5))
+    unpress_at(game, renderer, (0,5))
+    press_at(game, renderer, (1,4))
+    unpress_at(game, renderer, (1,4))
+    wait(game, renderer, (0,0), n=3)
+    assert(game.game_state == game.computer_thinking)
+    # assert every frame is quick while the computer thinks, and that it answers in time
+    started_at = time.time()
+    while game.game_state == game.computer_thinking:
+        frame_started_at = time.time()
+        update_game(game, renderer, False, False, (0,0))
+        assert(time.time() - frame_started_at < 0.1)
+        time.sleep(0.01)
+    assert(time.time() - started_at < time_budget + 0.1)
+    wait(game, renderer, (0,0), n=2)
+    assert(game.checkers.player_turn() == 1)
+    # assert the iterative deepening searched more than the first depth
+    engine = Engine(depth=30)
+    depths = [depth for depth, _, _ in engine.iterative_search(game.checkers, time_budget=0.3)]
+    assert(len(depths) > 1 and depths == list(range(1, len(depths)+1)))
+    # assert a search stopped while thinking (like by a takeback) ends right away, by SIGTERM,
+    # even though it was forked from this process, where pygame handles SIGTERM
+    search = BackgroundSearch(Engine(depth=30, time_budget=5), game.checkers)
+    time.sleep(0.3)
+    started_at = time.time()
+    search.stop()
+    assert(time.time() - started_at < 0.5 and search.process.exitcode == -signal.SIGTERM)
+
+def pdn_test_case():
+    # Tests if the recorded games are written and read back in PDN, and if the replays find their illegal moves
+
+    path = os.path.join(tempfile.mkdtemp(), 'games.pdn')
+    # a game played by computer players, in which white captures both black pieces in one turn
+    board_shape = (8,8)
+    initial_tiles = empty_tiles(board_shape)
+    initial_tiles[7, 2] = Piece(player=1)
+    initial_tiles[6, 1] = Piece(player=2)
+    initial_tiles[4, 1] = Piece(player=2)
+    game = GameWrapper(board_shape, initial_tiles, computer_players={1: Engine(depth=2), 2: Engine(depth=2)}, record_path=path)
+    renderer = make_renderer(board_shape)
+    wait(game, renderer, (0,0), n=5)
+    assert(game.winner == 1)
+    game.save_record()
+    # random games
+    random.seed(7)
+    for _ in range(5):
+        checkers = Checkers(board_shape)
+        checkers.update_moves()
+        checkers.advance_round()
+        for _ in range(60):
+            moves = checkers.generate_moves()
+            if moves == []:
+                break
+            checkers.push(random.choice(moves))
+        winner = checkers.turn_oponent() if checkers.legal_moves() == [] else None
+        append_game(path, turns_of_history(checkers.moves_history), board_shape, winner, {'Event': "random"})
+    with open(path) as pdn_file:
+        games = list(read_games(pdn_file))
+    assert(len(games) == 6)
+    assert(games[0].moves == ['12x3x10'] and games[0].winner == 1)
+    assert(games[0].tags['FEN'] == "W:W12:B7,8")
+    assert(all(replay_game(game)[1] is None for game in games))
+    # a game with an illegal move, and a game with a wrong result
+    assert(replay_game(PdnGame({}, ['22-18', '11-20'], "*"))[1] is not None)
+    assert(replay_game(PdnGame(games[0].tags, games[0].moves, "0-1"))[1] is not None)
+
+def position_formats_test_case():
+    # Tests if the positions written as FEN texts and packed bytes are read back the same,
+    # also when many packed positions are loaded at once
+
+    random.seed(8)
+    for board_shape in [(8,8), (10,10)]:
+        codes, players = [], []
+        game = Checkers(board_shape, backend='int8')
+        game.update_moves()
+        game.advance_round()
+        for _ in range(100):
+            fen = board_to_fen(game.board, game.player_turn())
+            data = board_to_bytes(game.board, game.player_turn())
+            assert(Board.from_fen(fen, board_shape).to_fen(game.player_turn()) == fen)
+            assert(Board.from_bytes(data, board_shape).to_fen(game.player_turn()) == fen)
+            assert(len(data) == position_size(board_shape))
+            codes.append(game.board.tiles.copy())
+            players.append(game.player_turn())
+            moves = game.generate_moves()
+            if moves == []:
+                break
+            game.push(random.choice(moves))
+        path = os.path.join(tempfile.mkdtemp(), 'positions.bin')
+        save_positions(path, np.array(codes), players)
+        loaded_codes, loaded_players = load_positions(path, board_shape)
+        assert((loaded_codes == np.array(codes)).all() and list(loaded_players) == players)
+    # a position written as a FEN text is played like one built piece by piece
+    board = Board.from_fen("W:W12:B7,8")
+    assert(board.player_at((7,2)) == 1 and board.player_at((6,1)) == 2 and board.player_at((4,1)) == 2)
+    game = Checkers((8,8), board.tiles)
+    game.update_moves()
+    game.advance_round()
+    assert([move.steps() for move in game.generate_moves()] == [[((7,2), (5,0)), ((5,0), (3,2))]])
+
+def headless_harness_test_case():
+    # Tests if the games are played through the synthetic mouse inputs of the harness
+
+    board_shape = (8,8)
+    # the turns of a random game
+    random.seed(11)
+    checkers = Checkers(board_shape)
+    checkers.update_moves()
+    checkers.advance_round()
+    turns = []
+    for _ in range(30):
+        moves = checkers.generate_moves()
+        if moves == []:
+            break
+        turns.append(random.choice(moves))
+        checkers.push(turns[-1])
+    # the same turns played by clicks in the game states machine
+    game = GameWrapper(board_shape, backend='bitboard')
+    renderer = NullRenderer(screen_shape, board_shape)
+    frames = play_turns(game, renderer, screen, turns)
+    assert(renderer.frames == frames)
+    assert(game.checkers.board.zobrist_key == checkers.board.zobrist_key)
+    assert(game.checkers.round == checkers.round)
+    # a move by dragging the piece
+    game = GameWrapper(board_shape)
+    settle(game, renderer, screen)
+    drive(game, renderer, screen, drag_inputs((0,5), (1,4)))
+    settle(game, renderer, screen)
+    assert(game.checkers.board.has_piece_in(pos=(1,4), player=1))
+    assert(game.checkers.player_turn() == 2)
+    # a click in a tile with no movable piece doesn't select anything
+    drive(game, renderer, screen, move_inputs((0,5), (1,4)))
+    assert(game.checkers.player_turn() == 2)
+
+def profiling_test_case():
+    # Tests if the profiler records the game states, the moves computation and the frames
+
+    board_shape = (8,8)
+    # the turns of a random game
+    random.seed(5)
+    checkers = Checkers(board_shape)
+    checkers.update_moves()
+    checkers.advance_round()
+    turns = []
+    for _ in range(10):
+        turns.append(random.choice(checkers.generate_moves()))
+        checkers.push(turns[-1])
+    # the same turns played by clicks in the game states machine, while profiled
+    original_update = GameWrapper.update
+    with Profiler() as profiler:
+        game = GameWrapper(board_shape)
+        renderer = Renderer(screen_shape, board_shape)
+        frames = play_turns(game, renderer, screen, turns)
+    # assert the original functions are back
+    assert(GameWrapper.update is original_update)
+    # assert every state, move computation and frame was recorded
+    assert(profiler.calls['Renderer.render'] == frames)
+    assert(profiler.calls['GameWrapper.new_game'] == 1)
+    assert(profiler.calls['GameWrapper.new_round'] == len(turns)+1)
+    assert(profiler.calls['GameWrapper.click_and_place'] >= len(turns))
+    for name in ['Board.compute_all_moves', 'Board.has_legal_moves', 'Checkers.movable_pieces_pos']:
+        assert(profiler.calls[name] > 0)
+    # assert the folded stacks split the time of the outer calls
+    assert('GameWrapper.new_round;Board.compute_all_moves' in profiler.stacks)
+    outer_time = sum(profiler.times[name] for name in profiler.times if name.startswith('GameWrapper.') or name == 'Renderer.render')
+    assert(abs(sum(profiler.stacks.values()) - outer_time) < 1e-6)
+    # assert the exported files
+    path = os.path.join(tempfile.mkdtemp(), 'profile')
+    profiler.save_json(path + '.json')
+    profiler.save_folded(path + '.folded')
+    with open(path + '.json') as json_file:
+        assert(json.load(json_file)['Renderer.render']['calls'] == frames)
+    with open(path + '.folded') as folded_file:
+        lines = folded_file.read().splitlines()
+    assert(len(lines) == len(profiler.stacks))
+    assert(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+def game_server_test_case():
+    # Tests if two clients play a game through the game server, and if many clients play at once
+
+    async def play():
+        server = await GameServer().start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        white = await asyncio.open_connection('127.0.0.1', port)
+        black = await asyncio.open_connection('127.0.0.1', port)
+        # white starts a game and black joins it
+        state = await request(*white, {'op': 'new'})
+        assert(state['ok'] and state['players'] == [1] and state['turn'] == 1)
+        assert([[0,5], [1,4]] in state['moves'])
+        state = await request(*black, {'op': 'join', 'game': state['game']})
+        assert(state['ok'] and state['players'] == [2])
+        # black can't move in white's turn, and white can't make an illegal move
+        assert(not (await request(*black, {'op': 'move', 'from': [1,2], 'to': [0,3]}))['ok'])
+        assert(not (await request(*white, {'op': 'move', 'from': [0,5], 'to': [0,4]}))['ok'])
+        # white moves, and black receives the new state
+        state = await request(*white, {'op': 'move', 'from': [0,5], 'to': [1,4]})
+        assert(state['ok'] and state['turn'] == 2 and state['round'] == 2)
+        event = json.loads(await black[0].readline())
+        assert(event['event'] == 'state' and event['fen'] == state['fen'])
+        state = await request(*black, {'op': 'move', 'from': [1,2], 'to': [0,3]})
+        assert(state['ok'] and state['turn'] == 1)
+        assert(not (await request(*white, {'op': 'dance'}))['ok'])
+        for reader, writer in [white, black]:
+            writer.close()
+            await writer.wait_closed()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(play())
+    # a game session ends when the player with the turn can't move
+    board_shape = (8,8)
+    session = GameSession(1, board_shape)
+    initial_tiles = empty_tiles(board_shape)
+    initial_tiles[3, 4] = Piece(player=1)
+    initial_tiles[4, 3] = Piece(player=2)
+    session.checkers = turn_start(board_shape, initial_tiles, 1)
+    assert(session.make_move(1, (3,4), (5,2)) is None)
+    assert(session.winner == 1)
+    assert(session.make_move(2, (5,2), (4,1)) is not None)
+    # many clients at once, in a server of its own process (that is stopped after the test)
+    latencies, moves, _ = asyncio.run(load_test(clients=20, games=1, max_rounds=30))
+    assert(len(latencies) == moves and moves > 20*20)
+    assert(multiprocessing.active_children() == [])
+    assert(session_memory(GameServer(), 10, 20) > 0)
+
+def evaluation_test_case():
+    # Tests if the batch evaluation scores the positions like the evaluation of each one,
+    # and if the engine's batch scoring of the leaves finds the same scores as searching them one by one
+
+    board_shape = (8,8)
+    # the initial position is even, for both players
+    for backend in ['tiles', 'bitboard', 'int8']:
+        checkers = Checkers(board_shape, backend=backend)
+        checkers.update_moves()
+        checkers.advance_round()
+        assert(evaluate(checkers) == 0)
+    # a king is worth more than a man, and an advanced man more than a man in its home line
+    tables = piece_square_tables(board_shape)
+    assert(tables[2+2, 3, 4] > tables[1+2, 3, 4] > tables[1+2, 4, 7] > 0)
+    assert(tables[-1+2, 3, 4] == -tables[1+2, 3, 3]) # black's table is white's one upside down
+    # the positions of random games, scored at once and one by one
+    random.seed(13)
+    checkers = Checkers(board_shape, backend='bitboard')
+    checkers.update_moves()
+    checkers.advance_round()
+    codes, players, scores = [], [], []
+    for _ in range(40):
+        moves = checkers.generate_moves()
+        if moves == []:
+            break
+        checkers.push(random.choice(moves))
+        codes.append(board_codes(checkers.board))
+        players.append(checkers.player_turn())
+        scores.append(evaluate(checkers))
+        # the same position with the colors swapped (and the board turned around) has the oponent's score
+        swapped = -board_codes(checkers.board)[::-1, ::-1]
+        assert(batch_evaluate(swapped[None], [3 - checkers.player_turn()])[0] == scores[-1])
+    assert(batch_evaluate(np.stack(codes), players).tolist() == scores)
+    # the leaves scored in a batch have the scores of the leaves searched one by one
+    engine = Engine(depth=3)
+    for checkers in [Checkers(board_shape, backend=backend) for backend in ['tiles', 'int8']]:
+        checkers.update_moves()
+        checkers.advance_round()
+        turns = engine.turns(checkers)
+        best_score, best_index = engine.score_leaves(checkers, turns, 0)
+        searched_scores = [engine.search_turn(checkers, move, 0, -WIN_SCORE-1, WIN_SCORE+1, 1) for move in turns]
+        assert(best_score == max(searched_scores) and searched_scores[best_index] == best_score)
+
+def environment_test_case():
+    # Tests if the vectorized environment plays its games with the action indexes, writing the observations in its buffer
+
+    board_shape = (8,8)
+    env = CheckersEnv(8, board_shape, seed=3)
+    observations, _ = env.reset()
+    assert(observations.shape == (8, 6, 8, 8))
+    assert((observations[:, WHITE_MEN].sum(axis=(1, 2)) == 12).all() and (observations[:, BLACK_MEN].sum(axis=(1, 2)) == 12).all())
+    assert((observations[:, WHITE_TURN] == 1).all())
+    # every step has its own action index
+    _, _, indexes = action_tables(board_shape)
+    assert(len(set(indexes.values())) == env.num_actions)
+    assert(decode_action(board_shape, encode_action(board_shape, (0,5), (1,4))) == ((0,5), (1,4)))
+    # random games, with the buffers matching the games after every step
+    ended = 0
+    for _ in range(300):
+        observations, rewards, terminated, truncated, infos = env.step(env.sample_actions())
+        assert(observations is env.observations)
+        for index, checkers in enumerate(env.games):
+            legal_actions = sorted(encode_action(board_shape, *step) for step in checkers.legal_moves())
+            assert(np.flatnonzero(env.action_masks[index]).tolist() == legal_actions)
+            assert(np.array_equal(observations[index, WHITE_MEN] == 1, board_codes(checkers.board) == 1))
+            assert(observations[index, WHITE_TURN, 0, 0] == (checkers.player_turn() == 1))
+            if checkers.mid_move_piece is not None:
+                assert(observations[(index, MID_MOVE) + checkers.mid_move_piece[0]] == 1)
+            assert(all(round == checkers.round for *_, round in checkers.moves_history)) # only the undo information of the turn being made
+            if terminated[index]:
+                ended += 1
+                assert(rewards[index] == 1 and infos[index]['winner'] in [1, 2])
+                assert(checkers.round == 1) # the game started again
+    assert(ended > 0)
+    # an illegal step (a man moving back) loses the game
+    env.reset()
+    _, rewards, terminated, _, infos = env.step([encode_action(board_shape, (0,5), (1,6))] + env.sample_actions()[1:])
+    assert(rewards[0] == -1 and terminated[0] and infos[0]['illegal'])
+    assert(not terminated[1:].any())
+
+def analysis_test_case():
+    # Tests if the recorded games are analyzed in a pool of processes, and if a stopped analysis is resumed
+
+    board_shape = (8,8)
+    # a whole capture turn that ends in the tile it started is undone in every backend
+    initial_tiles = empty_tiles(board_shape)
+    initial_tiles[3, 4] = Piece(player=1)
+    for pos in [(4,3), (4,1), (2,1), (2,3)]:
+        initial_tiles[pos] = Piece(player=2)
+    for backend in ['tiles', 'bitboard', 'int8']:
+        checkers = turn_start(board_shape, initial_tiles, 1, backend)
+        fen, legal_moves = board_to_fen(checkers.board), checkers.legal_moves()
+        for move in checkers.generate_moves(): # (both ways around)
+            assert(move.from_pos == move.to_pos and len(move.captures) == 4)
+            checkers.push(move)
+            checkers.pop()
+            assert(board_to_fen(checkers.board) == fen and checkers.legal_moves() == legal_moves)
+    # a directory of random games
+    directory = tempfile.mkdtemp()
+    os.mkdir(os.path.join(directory, 'more'))
+    random.seed(17)
+    for path in [os.path.join(directory, 'games.pdn'), os.path.join(directory, 'more', 'games.pdn')]:
+        for _ in range(2):
+            checkers = Checkers(board_shape)
+            checkers.update_moves()
+            checkers.advance_round()
+            for _ in range(16):
+                checkers.push(random.choice(checkers.generate_moves()))
+            append_game(path, turns_of_history(checkers.moves_history), board_shape)
+    paths = pdn_files(directory)
+    assert(len(paths) == 2)
+    output_path = os.path.join(directory, 'analysis.jsonl')
+    # the analysis is stopped after the first game, with half of the next line written
+    analyses = analyze(paths, output_path, depth=2, workers=1)
+    first = next(analyses)
+    analyses.close()
+    with open(output_path, 'a') as output_file:
+        output_file.write('{"file": ')
+    # and resumed in a pool of processes
+    analyses = [first] + list(analyze(paths, output_path, depth=2, workers=2))
+    assert(sorted((analysis['file'], analysis['game']) for analysis in analyses) == [(path, number) for path in paths for number in range(2)])
+    with open(output_path) as output_file: # the unfinished line was cut off
+        assert(sorted(output_file.read().splitlines()) == sorted(json.dumps(analysis) for analysis in analyses))
+    for analysis in analyses:
+        assert(analysis['error'] is None and analysis['turns'] == 16)
+        for blunder in analysis['blunders']:
+            assert(blunder['best_score'] - blunder['score'] > 100)
+    assert(sum(len(analysis['blunders']) for analysis in analyses) > 0)
+    assert(list(analyze(paths, output_path, depth=2, workers=1)) == []) # nothing left to analyze
+
+def draw_test_case():
+    # Tests if the games end in a draw by repetition and by the rounds without a capture or a man move
+
+    board_shape = (8,8)
+    # (the pieces are moved in the tiles given to the 'tiles' backend, so every game gets a copy)
+    initial_tiles = empty_tiles(board_shape)
+    initial_tiles[0, 7] = Piece(player=1, rank=2)
+    initial_tiles[7, 2] = Piece(player=2, rank=2)
+    initial_tiles[6, 7] = Piece(player=1)
+    cycle = [((0,7), (1,6)), ((7,2), (6,3)), ((1,6), (0,7)), ((6,3), (7,2))] # the kings go and come back
+    for backend in ['tiles', 'bitboard', 'int8']:
+        checkers = turn_start(board_shape, initial_tiles.copy(), 1, backend)
+        assert((checkers.repetitions(), checkers.quiet_rounds()) == (1, 0))
+        for rounds in range(1, 9):
+            assert(cycle[(rounds-1)%4] in checkers.legal_moves())
+            checkers.push(cycle[(rounds-1)%4])
+            assert(checkers.quiet_rounds() == rounds)
+            assert(checkers.repetitions() == 1 + rounds//4)
+            assert(checkers.is_draw() == (rounds == 8)) # the third time the position happens
+        checkers.pop()
+        assert(not checkers.is_draw() and checkers.quiet_rounds() == 7)
+        checkers.push(cycle[3])
+        assert(checkers.is_draw())
+        # a man move starts the count again
+        checkers.push(((6,7), (5,6)))
+        assert((checkers.repetitions(), checkers.quiet_rounds()) == (1, 0) and not checkers.is_draw())
+        # a shorter limit of rounds without a capture or a man move
+        checkers = turn_start(board_shape, initial_tiles.copy(), 1, backend)
+        checkers.draw_rounds = 6
+        for rounds in range(1, 7):
+            checkers.push(cycle[(rounds-1)%4])
+            assert(checkers.is_draw() == (rounds == 6))
+    # the GameWrapper ends the game in a draw (with the kings only)
+    initial_tiles = empty_tiles(board_shape)
+    initial_tiles[0, 7] = Piece(player=1, rank=2)
+    initial_tiles[7, 2] = Piece(player=2, rank=2)
+    path = os.path.join(tempfile.mkdtemp(), 'games.pdn')
+    game = GameWrapper(board_shape, initial_tiles.copy(), record_path=path)
+    renderer = NullRenderer(screen_shape, board_shape)
+    for selected_pos, released_pos in cycle + cycle:
+        settle(game, renderer, screen)
+        drive(game, renderer, screen, drag_inputs(selected_pos, released_pos))
+    settle(game, renderer, screen)
+    assert(game.game_state == game.end_game)
+    assert(game.draw and game.winner == 0 and game.checkers.is_draw())
+    game.save_record()
+    # the recorded draw is replayed, and a draw result is only valid for a game that is a draw
+    with open(path) as pdn_file:
+        [recorded_game] = list(read_games(pdn_file))
+    assert(recorded_game.winner == 0 and replay_game(recorded_game) == (8, None))
+    assert(replay_game(PdnGame(recorded_game.tags, recorded_game.moves[:-1], "1/2-1/2"))[1] is not None)
+    assert(replay_game(PdnGame(recorded_game.tags, recorded_game.moves + recorded_game.moves[:1], "*"))[1] is not None) # a move after the draw
+    # a takeback after the draw is over lets the game go on, and the continuation is what gets recorded
+    takeback_path = os.path.join(tempfile.mkdtemp(), 'games.pdn')
+    game = GameWrapper(board_shape, initial_tiles.copy(), record_path=takeback_path)
+    for selected_pos, released_pos in cycle + cycle:
+        settle(game, renderer, screen)
+        drive(game, renderer, screen, drag_inputs(selected_pos, released_pos))
+    settle(game, renderer, screen)
+    assert(game.game_state == game.end_game)
+    game.takeback()
+    assert(not game.draw and game.winner is None and not game.checkers.is_draw())
+    settle(game, renderer, screen)
+    drive(game, renderer, screen, drag_inputs((6,3), (5,4)))
+    settle(game, renderer, screen)
+    assert(game.game_state != game.end_game)
+    game.save_record()
+    with open(takeback_path) as pdn_file:
+        [continued_game] = list(read_games(pdn_file))
+    assert(continued_game.winner is None and replay_game(continued_game) == (8, None))
+    assert(continued_game.moves[:7] == recorded_game.moves[:7] and continued_game.moves[7] != recorded_game.moves[7])
+    # the headless games end in a draw
+    for backend in ['tiles', 'bitboard', 'int8']:
+        for draw_rounds, plies in [(DRAW_ROUNDS, 8), (6, 6)]:
+            policies = {1: ScriptedPolicy([cycle[0], cycle[2]]*2), 2: ScriptedPolicy([cycle[1], cycle[3]]*2)}
+            outcome = play_game(board_shape, policies, backend, max_rounds=10000, initial_arrangement=initial_tiles.copy(), draw_rounds=draw_rounds)
+            assert(outcome == (0, plies))
+    # the batches of games pass the rounds limit to every game
+    for draw_rounds in [DRAW_ROUNDS, 1]:
+        settings = {'board_shape': board_shape, 'backend': 'bitboard', 'policy1': 'random', 'policy2': 'random', 'script1': None,
+                    'script2': None, 'max_rounds': 500, 'draw_rounds': draw_rounds, 'seed': 5, 'depth': 1}
+        outcomes, _ = simulate(4, settings, workers=1)
+        assert(outcomes == [play_game(board_shape, {1: RandomPolicy(5 + 2*game), 2: RandomPolicy(6 + 2*game)}, 'bitboard', draw_rounds=draw_rounds) for game in range(4)])
+        assert((0 in [winner for winner, _ in outcomes]) == (draw_rounds == 1)) # (a single king move is a draw)
+    # the server's game ends in a draw, keeping only the positions that can happen again
+    session = GameSession(1, board_shape)
+    session.checkers = turn_start(board_shape, initial_tiles.copy(), 1, 'bitboard')
+    for rounds in range(1, 9):
+        assert(session.winner is None)
+        assert(session.make_move(session.checkers.player_turn(), *cycle[(rounds-1)%4]) is None)
+        assert(session.checkers.moves_history == [] and len(session.checkers.position_history) == rounds+1)
+    assert(session.winner == 0 and session.state()['winner'] == 0)
+    assert(session.make_move(1, *cycle[0]) == "the game is over")
+    # the environment ends the game in a draw
+    env = CheckersEnv(1)
+    env.reset(seed=0)
+    env.games[0] = turn_start(board_shape, initial_tiles.copy(), 1, 'int8')
+    env.update_game(0)
+    for rounds in range(1, 9):
+        _, rewards, terminated, truncated, infos = env.step([encode_action(board_shape, *cycle[(rounds-1)%4])])
+        assert(terminated[0] == (rounds == 8) and not truncated[0] and rewards[0] == 0)
+    assert(infos[0]['winner'] == 0 and infos[0]['draw'])
+
 move_test_case()
 capture_test_case()
 capture_continuation_test_case()
-complex_test_case()
\ No newline at end of file
+complex_test_case()
+bitboard_test_case()
+incremental_moves_test_case()
+simulation_test_case()
+engine_test_case()
+zobrist_test_case()
+push_pop_test_case()
+takeback_test_case()
+whole_moves_test_case()
+turn_cache_test_case()
+dirty_rendering_test_case()
+compact_board_test_case()
+batch_moves_test_case()
+perft_test_case()
+diagonal_rays_test_case()
+tablebase_test_case()
+parallel_search_test_case()
+background_search_test_case()
+pdn_test_case()
+position_formats_test_case()
+headless_harness_test_case()
+profiling_test_case()
+game_server_test_case()
+evaluation_test_case()
+environment_test_case()
+analysis_test_case()
+draw_test_case()
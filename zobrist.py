@@ -0,0 +1,42 @@
+import random
+
+ZOBRIST_SEED = 20201 # fixed, so every process finds the same keys for the same positions
+
+class ZobristTable:
+    """
+    ZOBRIST TABLE
+    -------------
+    This object holds the random 64 bits keys of the Zobrist hashing
+    of a board shape: one key for every (tile, player, rank) combination,
+    one key for the second player's turn, and one key for every tile
+    of a piece in the middle of a capture continuation.
+
+    A position's key is the XOR of the keys of its parts, so it can be
+    updated by XORing only the keys of the parts that a move changes.
+    """
+
+    def __init__(self, board_shape):
+        generator = random.Random(ZOBRIST_SEED + 1000*board_shape[0] + board_shape[1])
+        self.piece_keys = [[{(player, rank): generator.getrandbits(64) for player in [1, 2] for rank in [1, 2]}
+                            for j in range(board_shape[1])] for i in range(board_shape[0])]
+        self.second_player_key = generator.getrandbits(64)
+        self.mid_move_keys = [[generator.getrandbits(64) for j in range(board_shape[1])] for i in range(board_shape[0])]
+
+    def piece_key(self, pos, player, rank):
+        # returns the key of a piece of a given player and rank in a given position (0 for empty tiles)
+        if player == 0:
+            return 0
+        return self.piece_keys[pos[0]][pos[1]][(player, rank)]
+
+    def __deepcopy__(self, memo):
+        # the keys never change, so the copies of a board can share them
+        return self
+
+_zobrist_tables = {}
+
+def zobrist_table(board_shape):
+    # returns the ZobristTable of a board shape (creating it only once per shape)
+    board_shape = tuple(board_shape)
+    if board_shape not in _zobrist_tables:
+        _zobrist_tables[board_shape] = ZobristTable(board_shape)
+    return _zobrist_tables[board_shape]